@@ -0,0 +1,144 @@
+"""
+Times each line backend (with and without the coarse to fine pyramid) against
+the others on real log pages and checks how close their lines come to what
+plain skimage finds.
+
+    python benchmark_line_backends.py                  # pages from labeled_sets
+    python benchmark_line_backends.py some.pdf 3 4 5   # specific pages of a pdf
+
+For every page it reports how long the orientation guess and the table line
+detection took with each setup, how far each orientation guess is from the one
+skimage's Hough makes, how many lines came out, and how many of plain
+skimage's lines have a match within a few pixels.
+"""
+
+import sys
+import time
+from statistics import mean
+import fitz
+from labeled_sets import page_dict
+from xplorer_tools.get_image_from_page import get_image_from_page
+from xplorer_tools.fix_orientation import find_orientation_fix, straighten_page
+from xplorer_tools.segment_operations import Segment
+from line_detection.detect_lines import detect_lines
+
+# What coarse to fine gets tried at. LinePyramidScale in config.ini is 1 (off)
+# until this shows it matches on your pages
+PYRAMID_SCALES = [2, 4]
+
+# (backend, pyramid scale). The first one is what everything gets compared to
+SETUPS = [
+    ('skimage', 1),
+    *[('skimage', scale) for scale in PYRAMID_SCALES],
+    ('opencv_hough', 1),
+    *[('opencv_hough', scale) for scale in PYRAMID_SCALES],
+    ('morphology', 1)
+]
+# 'profile' is the projection profile deskew, the rest are Hough backends
+ORIENTATION_BACKENDS = ['skimage', 'opencv_hough', 'profile']
+
+# How far (degrees) an orientation guess can be from skimage's before it gets
+# flagged. skimage's own guesses wander about this much from run to run
+ORIENTATION_TOLERANCE = 0.1
+
+# How many pages to take out of labeled_sets when none are given
+DEFAULT_PAGE_COUNT = 12
+
+# Two lines are "the same" if both ends are within this many pixels
+MATCH_DISTANCE = 8
+
+
+def pick_pages() -> list[tuple[str, int]]:
+
+    if len(sys.argv) > 2:
+        return [(sys.argv[1], int(p)) for p in sys.argv[2:]]
+
+    pages: list[tuple[str, int]] = []
+    for file_path, groups in page_dict.items():
+        for group in groups:
+            pages.extend((file_path, p) for p in group)
+
+    return pages[:DEFAULT_PAGE_COUNT]
+
+def count_matches(reference: list[Segment], found: list[Segment]) -> int:
+
+    matched = 0
+    for r in reference:
+        for f in found:
+            forward = (abs(r.pt_1['x'] - f.pt_1['x']) < MATCH_DISTANCE and abs(r.pt_1['y'] - f.pt_1['y']) < MATCH_DISTANCE and
+                       abs(r.pt_2['x'] - f.pt_2['x']) < MATCH_DISTANCE and abs(r.pt_2['y'] - f.pt_2['y']) < MATCH_DISTANCE)
+            backward = (abs(r.pt_1['x'] - f.pt_2['x']) < MATCH_DISTANCE and abs(r.pt_1['y'] - f.pt_2['y']) < MATCH_DISTANCE and
+                        abs(r.pt_2['x'] - f.pt_1['x']) < MATCH_DISTANCE and abs(r.pt_2['y'] - f.pt_1['y']) < MATCH_DISTANCE)
+            if forward or backward:
+                matched += 1
+                break
+
+    return matched
+
+def main() -> None:
+
+    pages = pick_pages()
+    if len(pages) == 0:
+        print('No pages to benchmark')
+        return
+
+    timings: dict[tuple[str, int], list[float]] = {s: [] for s in SETUPS}
+    orientation_timings: dict[str, list[float]] = {b: [] for b in ORIENTATION_BACKENDS}
+
+    documents: dict[str, fitz.Document] = {}
+
+    for file_path, page_num in pages:
+        if file_path not in documents:
+            documents[file_path] = fitz.open(file_path)
+
+        gray, color = get_image_from_page(documents[file_path], page_num)
+        print(f'{file_path} page {page_num}')
+
+        rotations: dict[str, float] = {}
+        for backend in ORIENTATION_BACKENDS:
+            start = time.perf_counter()
+            if backend == 'profile':
+                rotations[backend] = find_orientation_fix(gray, method='profile')
+            else:
+                rotations[backend] = find_orientation_fix(gray, assess_count=6, line_backend=backend)
+            orientation_timings[backend].append(time.perf_counter() - start)
+
+            off_by = rotations[backend] - rotations['skimage']
+            flag = '' if abs(off_by) <= ORIENTATION_TOLERANCE else '  <-- off'
+            print(f'  orientation {backend:>13}: {orientation_timings[backend][-1]:6.2f}s  '
+                  f'turn {rotations[backend]:+.3f} degrees ({off_by:+.3f}){flag}')
+
+        # Everyone gets the same straightened page so only the line finding differs
+        gray_array, color_array, _ = straighten_page(gray, color, rotations['skimage'])
+
+        reference: tuple[list[Segment], list[Segment]] | None = None
+        for setup in SETUPS:
+            backend, scale = setup
+            start = time.perf_counter()
+            horizontals, verticals = detect_lines(gray_array, color_array, line_backend=backend, pyramid_scale=scale)
+            timings[setup].append(time.perf_counter() - start)
+
+            if reference == None:
+                reference = (horizontals, verticals)
+
+            h_match = count_matches(reference[0], horizontals)
+            v_match = count_matches(reference[1], verticals)
+            print(f'  tables {backend:>13} x{scale}: {timings[setup][-1]:6.2f}s  '
+                  f'{len(horizontals):3} h ({h_match}/{len(reference[0])} match)  '
+                  f'{len(verticals):3} v ({v_match}/{len(reference[1])} match)')
+
+    for document in documents.values():
+        document.close()
+
+    print()
+    print(f'Average over {len(pages)} pages')
+    for backend in ORIENTATION_BACKENDS:
+        speedup = mean(orientation_timings['skimage']) / max(mean(orientation_timings[backend]), 1e-9)
+        print(f'  orientation {backend:>13}: {mean(orientation_timings[backend]):6.2f}s  ({speedup:.1f}x)')
+    for setup in SETUPS:
+        speedup = mean(timings[SETUPS[0]]) / max(mean(timings[setup]), 1e-9)
+        print(f'  tables {setup[0]:>13} x{setup[1]}: {mean(timings[setup]):6.2f}s  ({speedup:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
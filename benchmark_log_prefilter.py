@@ -0,0 +1,75 @@
+"""
+How many real logs the page prefilter (see find_logs/prefilter.py) would throw
+out, and how many other pages it would save an OCR pass on. Run this on your
+own PDFs before turning `LogPrefilterThreshold` on.
+
+    python benchmark_log_prefilter.py              # PDFs from labeled_sets
+    python benchmark_log_prefilter.py a.pdf b.pdf  # every page of these is scored,
+                                                   # but there's nothing to check against
+
+Pages listed in labeled_sets' page_dict are the logs, everything else in
+those PDFs isn't.
+"""
+
+import sys
+import time
+from statistics import mean
+import fitz
+from labeled_sets import page_dict
+from find_logs.prefilter import score_page_for_log
+
+THRESHOLDS = [0.2, 0.4, 0.6, 0.8, 1.0]
+
+
+def main() -> None:
+
+    if len(sys.argv) > 1:
+        labeled: dict[str, set[int] | None] = {path: None for path in sys.argv[1:]}
+    else:
+        labeled = {path: {p for group in groups for p in group} for path, groups in page_dict.items()}
+
+    log_scores: list[float] = []
+    other_scores: list[float] = []
+    timings: list[float] = []
+    missed: list[tuple[str, int, float]] = []
+
+    for file_path, log_pages in labeled.items():
+        with fitz.open(file_path) as document:
+            for page_num in range(document.page_count):
+                start = time.perf_counter()
+                score = score_page_for_log(document.load_page(page_num))
+                timings.append(time.perf_counter() - start)
+
+                if log_pages == None:
+                    print(f'{file_path} page {page_num}: {score:.2f}')
+                elif page_num in log_pages:
+                    log_scores.append(score)
+                    if score < 1.0:
+                        missed.append((file_path, page_num, score))
+                else:
+                    other_scores.append(score)
+
+    if len(timings) == 0:
+        print('No pages to score')
+        return
+
+    print(f'Scored {len(timings)} pages, {mean(timings) * 1000:.0f} ms a page on average')
+    if len(log_scores) == 0:
+        return
+
+    print(f'{len(log_scores)} log pages, {len(other_scores)} other pages')
+    for threshold in THRESHOLDS:
+        kept = sum(s >= threshold for s in log_scores)
+        skipped = sum(s < threshold for s in other_scores)
+        print(f'  threshold {threshold:.1f}: keeps {kept}/{len(log_scores)} logs ({kept / len(log_scores):.1%}), '
+              f'skips OCR on {skipped}/{len(other_scores)} other pages')
+
+    if len(missed) > 0:
+        print()
+        print('Logs that scored under 1')
+        for file_path, page_num, score in missed:
+            print(f'  {file_path} page {page_num}: {score:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,10 @@
 import logging
-import os
-import pickle
 from xplorer_tools.segment_operations import Segment
 from detect_structure.helpers.table_structure.table_structure import Table_Structure
 from detect_structure.helpers.table_structure.table_structure_half import Table_Structure_Half
 from xplorer_tools.types import *
+from xplorer_tools.result_cache import get_result_cache
+from xplorer_tools.find_content_hash import find_content_hash_cached
 from numpy import ndarray
 from typing import Any, Literal
 
@@ -19,61 +19,30 @@ from typing import Any, Literal
 # For right now, I'm gonna focus on the "BBS 137 Rev. 8-99" and "BBS 138 Rev.
 # 8-99" version
 
-CACHE_LOCATION = './ProcessingReports/detect_structure/structure_cache.pkl'
-struct_cache: dict[str, dict[str, (Table_Structure | Table_Structure_Half)]] = {}
-cache_read = False
+# Bump this whenever the table structure code changes what it would find for
+# the same lines. Old cache entries stop getting used once it changes
+STRUCTURE_VERSION = '2'
 
 logger = logging.getLogger(__name__)
 
 
-def check_cache(key: str, page_num: int) -> (Table_Structure | Table_Structure_Half) | Literal[False]:
+def check_cache(path: str, page_num: int, version: str) -> (Table_Structure | Table_Structure_Half) | Literal[False]:
 
-    logger.debug(f'Checking with key {key} and page {page_num}')
-    
-    global struct_cache, cache_read
-
-    page = str(page_num)
-    
-    if not cache_read:
-        if os.path.exists(CACHE_LOCATION):
-            with open(CACHE_LOCATION, 'rb') as p:
-                logger.debug('Reading struct cache file')
-                struct_cache = pickle.load(p)
-        else:
-            logger.debug('No cache file found, creating empty cache array')
-            struct_cache = {}
-            return False
-        
-        cache_read = True
+    logger.debug(f'Checking struct cache for {path} page {page_num}')
 
-    logger.debug('Checking struct cache')
-    
-    if key in struct_cache and page in struct_cache[key]:
-        logger.debug('Using cached version')
-        ret = struct_cache[key][page]
-        ret.refresh_all_segments()
-        return ret
-    else:
+    ret = get_result_cache().get('structure', find_content_hash_cached(path), page_num, version)
+    if ret == None:
         return False
 
+    logger.debug('Using cached version')
+    ret.refresh_all_segments()
+    return ret
 
-def update_cache(key_str: str, page_num: int, value: Table_Structure | Table_Structure_Half) -> None:
-
-    page = str(page_num)
-
-    if not cache_read:
-        check_cache('', 0)
-    
-    if key_str not in struct_cache:
-        struct_cache[key_str] = {}
-        
-    struct_cache[key_str][page] = value
 
-    logger.debug('Writing cache, wait...')
-    with open(CACHE_LOCATION, 'wb') as p:
-        pickle.dump(struct_cache, p)
+def update_cache(path: str, page_num: int, version: str, value: Table_Structure | Table_Structure_Half) -> None:
 
-    logger.debug('Done')
+    get_result_cache().put('structure', find_content_hash_cached(path), page_num, version, value)
+    logger.debug('Struct cache updated')
 
 def detect_structure(horizontals: list[Segment],
                      verticals: list[Segment],
@@ -83,7 +52,8 @@ def detect_structure(horizontals: list[Segment],
                      path='',
                      page=-1, 
                      draw_visuals=False,
-                     visuals_folder='visuals'
+                     visuals_folder='visuals',
+                     cache_tag=''
                     ) -> Table_Structure|Table_Structure_Half:
 
     # A page is made up of 2 (or 1) vertical sections. Each vertical section is
@@ -99,9 +69,11 @@ def detect_structure(horizontals: list[Segment],
     # to find the table top is to check to see if it intersects with the longer
     # middle lines
 
-    # Check the cache
+    # Check the cache. The structure is only as good as the lines that went
+    # into it, so `cache_tag` should say how those were found
+    version = f'{STRUCTURE_VERSION}-{cache_tag}'
     if use_cache:
-        hit = check_cache(path, page)
+        hit = check_cache(path, page, version)
         if hit:
             return hit
         
@@ -114,7 +86,7 @@ def detect_structure(horizontals: list[Segment],
 
     # Update cache
     if use_cache:
-        update_cache(path, page, ret)
+        update_cache(path, page, version, ret)
     
     return ret
 
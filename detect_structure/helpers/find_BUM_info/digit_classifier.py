@@ -0,0 +1,259 @@
+"""
+Blow counts are almost always just a number or two, and sending every one of
+them through the full PaddleOCR recognizer is a lot of work for reading "7".
+This is a much smaller reader that only knows digits. A cell gets split up into
+its glyphs, each glyph gets shrunk down to a little square, and it's whatever
+digit the closest glyphs it was trained on are (k nearest neighbors).
+
+Anything it isn't sure about (W.O.H., slashes, inch marks, smudges, digits
+that don't look like anything it's seen) gets left for PaddleOCR like before.
+It also learns what slashes and letters look like from cells PaddleOCR read
+without any digits, and a glyph that looks most like one of those is left for
+PaddleOCR too. Inch marks are too short to be glyphs, so a cell with a short
+mark up at the top of its text is left alone no matter what.
+
+Which reader gets used is picked with `DigitClassifier` in config.ini
+
+'paddle'
+    Everything goes to PaddleOCR, same as always.
+
+'knn'
+    The digit reader goes first, PaddleOCR only gets what it wasn't sure about.
+    Needs a model, see train_digit_classifier.py.
+
+'collect'
+    Everything goes to PaddleOCR, but every cell it reads with high confidence
+    gets saved as a training sample for the digit reader. The ones that aren't
+    plain numbers are saved too, see REJECT_LABEL and MIXED_LABEL.
+"""
+
+from __future__ import annotations
+import hashlib
+import logging
+import os
+from functools import cache
+from typing import Literal
+import numpy as np
+from xplorer_tools.types import simple_result
+
+logger = logging.getLogger(__name__)
+
+Digit_Classifier_Name = Literal['paddle', 'knn', 'collect']
+
+MODEL_LOCATION = './ProcessingReports/digit_classifier/knn_model.npz'
+SAMPLES_FOLDER = './ProcessingReports/digit_classifier/samples'
+
+# Glyphs get shrunk to GLYPH_SIZE x GLYPH_SIZE
+GLYPH_SIZE = 16
+
+# Anything smaller than this (in pixels) is a speck, not part of a digit
+MIN_GLYPH_AREA = 12
+
+# Bits shorter than this much of the tallest glyph in the cell are dots, commas
+# and specks
+MIN_GLYPH_HEIGHT_RATIO = 0.4
+
+K_NEIGHBORS = 5
+
+# How many of the K neighbors have to agree, and how far away (1 - cosine
+# similarity) the closest one can be before the glyph is left for PaddleOCR
+MIN_AGREEMENT = 0.8
+MAX_DISTANCE = 0.15
+
+# PaddleOCR has to be at least this sure of a cell for it to be a sample
+MIN_SAMPLE_CONFIDENCE = 0.98
+
+# What the samples that aren't plain numbers are labeled (the start of the file
+# name). REJECT_LABEL cells have no digits at all (/, W.O.H.) and their glyphs
+# get trained as REJECT_GLYPH. MIXED_LABEL cells have digits and something
+# else (6", 50/3") so their glyphs can't be lined up with anything. Those are
+# only for checking that the reader leaves them for PaddleOCR
+REJECT_LABEL = 'x'
+MIXED_LABEL = 'm'
+
+# The class glyphs from REJECT_LABEL cells get. Digits are 0 to 9
+REJECT_GLYPH = 10
+
+
+def split_glyphs(cell: np.ndarray) -> list[np.ndarray]:
+    """
+    The glyphs in a cell, left to right, as GLYPH_SIZE x GLYPH_SIZE float
+    arrays. The cell is inverted like everything else in the blows column
+    (ink is bright)
+    """
+    return split_cell(cell)[0]
+
+def split_cell(cell: np.ndarray) -> tuple[list[np.ndarray], bool]:
+    """
+    split_glyphs, plus whether any of the short marks that got dropped sit up
+    in the top half of the text. Dots and commas are down at the bottom, inch
+    marks and apostrophes are up top
+    """
+    import cv2
+
+    gray = cell if len(cell.shape) == 2 else cell.mean(axis=2)
+    ink = (gray > 128).astype(np.uint8)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+
+    boxes: list[list[int]] = []
+    for label in range(1, count):
+        x, y, w, h, area = stats[label]
+        if area >= MIN_GLYPH_AREA:
+            boxes.append([x, y, x + w, y + h])
+
+    if len(boxes) == 0:
+        return [], False
+
+    # Broken up digits (a 5 with its top off) overlap left to right, those are
+    # one glyph
+    boxes.sort()
+    merged: list[list[int]] = [boxes[0]]
+    for box in boxes[1:]:
+        last = merged[-1]
+        if box[0] < last[2]:
+            merged[-1] = [min(last[0], box[0]), min(last[1], box[1]), max(last[2], box[2]), max(last[3], box[3])]
+        else:
+            merged.append(box)
+
+    tallest = max(b[3] - b[1] for b in merged)
+    short = [b for b in merged if b[3] - b[1] < tallest * MIN_GLYPH_HEIGHT_RATIO]
+    merged = [b for b in merged if b[3] - b[1] >= tallest * MIN_GLYPH_HEIGHT_RATIO]
+
+    middle = (min(b[1] for b in merged) + max(b[3] for b in merged)) / 2
+    raised = any(b[3] <= middle for b in short)
+
+    glyphs: list[np.ndarray] = []
+    for x1, y1, x2, y2 in merged:
+        glyph = ink[y1:y2, x1:x2].astype(np.float32)
+
+        # Centered on a square so skinny 1's don't get stretched out
+        side = max(glyph.shape)
+        square = np.zeros((side, side), dtype=np.float32)
+        top = (side - glyph.shape[0]) // 2
+        left = (side - glyph.shape[1]) // 2
+        square[top:top + glyph.shape[0], left:left + glyph.shape[1]] = glyph
+
+        glyphs.append(cv2.resize(square, (GLYPH_SIZE, GLYPH_SIZE), interpolation=cv2.INTER_AREA))
+
+    return glyphs, raised
+
+def glyph_features(glyphs: list[np.ndarray]) -> np.ndarray:
+    """
+    (N, GLYPH_SIZE^2), every row scaled to length 1
+    """
+
+    if len(glyphs) == 0:
+        return np.empty((0, GLYPH_SIZE * GLYPH_SIZE), dtype=np.float32)
+
+    features = np.stack(glyphs).reshape(len(glyphs), -1)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, 1e-6)
+
+
+class KNN_Digit_Classifier:
+
+    def __init__(self, features: np.ndarray, labels: np.ndarray, version='') -> None:
+        self.features = features.astype(np.float32)
+        self.labels = labels.astype(np.int64)
+        self.version = version
+
+    @staticmethod
+    def load(location=MODEL_LOCATION) -> KNN_Digit_Classifier | None:
+
+        if not os.path.exists(location):
+            logger.warning(f'No digit classifier model at {location}, everything is going to PaddleOCR')
+            return None
+
+        with open(location, 'rb') as file:
+            data = file.read()
+
+        with np.load(location) as model:
+            return KNN_Digit_Classifier(model['features'], model['labels'], hashlib.sha256(data).hexdigest()[:16])
+
+    def save(self, location=MODEL_LOCATION) -> None:
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        np.savez_compressed(location, features=self.features, labels=self.labels)
+
+    def classify(self, cells: list[np.ndarray]) -> list[simple_result | None]:
+        """
+        What's in each cell and how sure it is, or None if it isn't sure
+        enough about every glyph in it (or it has an inch mark). All of the
+        glyphs from every cell get compared at once
+        """
+
+        glyph_counts: list[int] = []
+        all_glyphs: list[np.ndarray] = []
+        for cell in cells:
+            glyphs, raised = split_cell(cell) if cell.shape[0] > 0 and cell.shape[1] > 0 else ([], False)
+            if raised:
+                # Not a plain number, so none of its glyphs need comparing
+                glyphs = []
+            glyph_counts.append(len(glyphs))
+            all_glyphs.extend(glyphs)
+
+        ret: list[simple_result | None] = []
+        if len(all_glyphs) == 0 or len(self.labels) < K_NEIGHBORS:
+            return [None for _ in cells]
+
+        distances = 1 - glyph_features(all_glyphs) @ self.features.T
+        nearest = np.argpartition(distances, K_NEIGHBORS - 1, axis=1)[:, :K_NEIGHBORS]
+        nearest_labels = self.labels[nearest]
+        closest = np.take_along_axis(distances, nearest, axis=1).min(axis=1)
+
+        votes = np.stack([(nearest_labels == d).sum(axis=1) for d in range(REJECT_GLYPH + 1)], axis=1)
+        digits = votes.argmax(axis=1)
+        agreement = votes.max(axis=1) / K_NEIGHBORS
+        sure = (agreement >= MIN_AGREEMENT) & (closest <= MAX_DISTANCE) & (digits != REJECT_GLYPH)
+
+        position = 0
+        for count in glyph_counts:
+            span = slice(position, position + count)
+            position += count
+
+            # Blow counts don't go past 3 digits
+            if count == 0 or count > 3 or not sure[span].all():
+                ret.append(None)
+                continue
+
+            text = ''.join(str(d) for d in digits[span])
+            ret.append((text, float(agreement[span].min())))
+
+        return ret
+
+
+# Only gets read off the disk once per process
+@cache
+def load_digit_classifier(name: Digit_Classifier_Name) -> KNN_Digit_Classifier | None:
+    if name == 'knn':
+        return KNN_Digit_Classifier.load()
+    return None
+
+def save_digit_samples(cells: list[np.ndarray], readings: list[simple_result]) -> None:
+    """
+    Keeps every cell PaddleOCR was really sure of. Plain numbers are labeled
+    with the number, everything else with REJECT_LABEL or MIXED_LABEL. The
+    label goes in the file name, so any number of processes can be saving at
+    once
+    """
+    import cv2
+
+    os.makedirs(SAMPLES_FOLDER, exist_ok=True)
+
+    for cell, (text, confidence) in zip(cells, readings):
+        text = text.strip()
+        if confidence < MIN_SAMPLE_CONFIDENCE or len(text) == 0:
+            continue
+
+        if text.isdigit():
+            if len(text) > 3:
+                continue
+            label = text
+        elif any(c.isdigit() for c in text):
+            label = MIXED_LABEL
+        else:
+            label = REJECT_LABEL
+
+        gray = cell if len(cell.shape) == 2 else cell.mean(axis=2).astype(np.uint8)
+        name = hashlib.sha1(gray.tobytes()).hexdigest()[:16]
+        cv2.imwrite(os.path.join(SAMPLES_FOLDER, f'{label}_{name}.png'), gray)
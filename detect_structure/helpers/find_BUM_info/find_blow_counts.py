@@ -19,10 +19,26 @@ from line_detection.helpers.draw_visuals import draw_segment_visuals, draw_on_im
 from detect_structure.helpers.find_BUM_info.BUM_pair import Pair
 from detect_structure.helpers.find_BUM_info.blowcount import BlowCount
 import detect_structure.helpers.find_BUM_info.simple_stuff as simple_stuff
+from detect_structure.helpers.find_BUM_info.digit_classifier import KNN_Digit_Classifier
 from xplorer_tools.cleanup_side import clean_side
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever a change here (or in simple_stuff) would read the blow counts
+# differently. See Stage_Memo
+BLOW_COUNTS_VERSION = '3'
+
+class Blow_Count_Job(TypedDict):
+    """
+    Everything about one side of a page that's needed to read its blow counts
+    """
+    pairs: list[Pair]
+    blow_bounds: list[float]
+    colored_blows: np.ndarray
+    soil_ruler: Soil_Depth_Ruler
+    cells: dict[tuple[int, int], np.ndarray]
+    readings: simple_stuff.cell_readings | None
+
 def find_blow_counts(color_image: np.ndarray,
                      gray_image: np.ndarray,
                      table: Table_Structure|Table_Structure_Half,
@@ -30,9 +46,59 @@ def find_blow_counts(color_image: np.ndarray,
                      document_agenda: Document_Agenda,
                      ocr_cls_true: PaddleOCR,
                      draw_visuals=False,
-                     visuals_folder='visuals') -> list[BlowCount]:
+                     visuals_folder='visuals',
+                     pyramid_scale=1) -> list[BlowCount]:
     """
     Right now this is just geared for the BBS_137_REV_8_99 format
+
+    For more than one side or page, use prepare_blow_counts on all of them,
+    then read_blow_count_cells once, then finish_blow_counts on each. That
+    way all of the cells get read together
+    """
+
+    job = prepare_blow_counts(color_image, gray_image, table, side, draw_visuals=draw_visuals, visuals_folder=visuals_folder, pyramid_scale=pyramid_scale)
+    if job == None:
+        return []
+
+    read_blow_count_cells([job], ocr_cls_true)
+    return finish_blow_counts(job, document_agenda, ocr_cls_true)
+
+def read_blow_count_cells(jobs: list[Blow_Count_Job],
+                          ocr_cls_true: PaddleOCR,
+                          digit_classifier: KNN_Digit_Classifier | None = None,
+                          collect_samples=False) -> None:
+    """
+    One recognizer call for every cell in every job. See read_cells for the
+    `digit_classifier` and `collect_samples`
+    """
+
+    all_readings = simple_stuff.read_cells([j['cells'] for j in jobs], ocr_cls_true, digit_classifier, collect_samples)
+    for job, readings in zip(jobs, all_readings):
+        job['readings'] = readings
+
+def finish_blow_counts(job: Blow_Count_Job, document_agenda: Document_Agenda, ocr_cls_true: PaddleOCR) -> list[BlowCount]:
+    """
+    Anything that didn't get read ahead of time gets read here, one at a time
+    """
+
+    return simple_stuff.analyze_pairs(job['pairs'],
+                                      job['blow_bounds'],
+                                      job['colored_blows'],
+                                      job['soil_ruler'],
+                                      document_agenda,
+                                      ocr_cls_true,
+                                      readings=job['readings'])
+
+def prepare_blow_counts(color_image: np.ndarray,
+                        gray_image: np.ndarray,
+                        table: Table_Structure|Table_Structure_Half,
+                        side: Literal['l', 'r'],
+                        draw_visuals=False,
+                        visuals_folder='visuals',
+                        pyramid_scale=1) -> Blow_Count_Job | None:
+    """
+    Finds the BUM pairs on one side of the page and cuts out the cells that
+    need reading. None if there aren't any
     """
     
     # First crop image to correct side and find the soil_ruler
@@ -68,9 +134,9 @@ def find_blow_counts(color_image: np.ndarray,
 
     # Now scan for horizontal lines
 
-    blows_info = _get_column_lines(blows['gray'], col_width, soil_ruler, blows['top_offset'])
-    ucs_info = _get_column_lines(ucs['gray'], col_width, soil_ruler, ucs['top_offset'])
-    moist_info = _get_column_lines(moist['gray'], col_width, soil_ruler, moist['top_offset'])
+    blows_info = _get_column_lines(blows['gray'], col_width, soil_ruler, blows['top_offset'], pyramid_scale)
+    ucs_info = _get_column_lines(ucs['gray'], col_width, soil_ruler, ucs['top_offset'], pyramid_scale)
+    moist_info = _get_column_lines(moist['gray'], col_width, soil_ruler, moist['top_offset'], pyramid_scale)
 
     if draw_visuals:
         _draw_visuals(visuals_folder, ucs['gray'], ucs['color'], [b[0] for b in ucs_info])
@@ -91,7 +157,7 @@ def find_blow_counts(color_image: np.ndarray,
         likely_bum_bounds = likely_bum_bounds[1:]
 
     if len(likely_bum_bounds) == 0:
-        return []
+        return None
 
     # In attempt to try to rid of extra lines, narrow the blows just a little bit
     adjustment: Vector = {'x': 3, 'y': 0}
@@ -103,7 +169,7 @@ def find_blow_counts(color_image: np.ndarray,
 
     if not pairs:
         # No BUM pairs were found
-        return []
+        return None
 
     # _analyze_pairs(pairs, [b[1] for b in blows_info], 255-_crop_to_segment(*crop_between, color_image), soil_ruler)
     blow_bounds = [b[1] for b in blows_info]
@@ -115,9 +181,15 @@ def find_blow_counts(color_image: np.ndarray,
     blow_bounds = [b[1] for b in blows_info]
     colored_blows = (255-_crop_to_segment(*crop_between, color_image))
     colored_blows = clean_side(colored_blows, leeway=6)
-    ret = simple_stuff.analyze_pairs(pairs, blow_bounds, colored_blows, soil_ruler, document_agenda, ocr_cls_true)
 
-    return ret
+    return {
+        'pairs': pairs,
+        'blow_bounds': blow_bounds,
+        'colored_blows': colored_blows,
+        'soil_ruler': soil_ruler,
+        'cells': simple_stuff.find_cells(pairs, blow_bounds, colored_blows, soil_ruler),
+        'readings': None
+    }
 
 def _crop_to_segment(left: Segment, right: Segment, image: np.ndarray) -> np.ndarray:
     l = int_ify_segment(left)
@@ -136,7 +208,7 @@ def _draw_visuals(visuals_folder: str, cropped_gray: np.ndarray, cropped_color:
     text_on_me = draw_on_image(cropped_color, horizontals, [], return_as_array=True)
     imsave(os.path.join(visuals_folder, 'BUM_on_BUM.png'), text_on_me)
 
-def _get_column_lines(gray_image: np.ndarray, width: float, soil_ruler: Soil_Depth_Ruler, column_offset: float) -> list[tuple[Segment, float]]:
+def _get_column_lines(gray_image: np.ndarray, width: float, soil_ruler: Soil_Depth_Ruler, column_offset: float, pyramid_scale: int) -> list[tuple[Segment, float]]:
     combined_horizontal: list[Segment]
     _, combined_horizontal = get_line_segments(
         gray_image,
@@ -147,7 +219,8 @@ def _get_column_lines(gray_image: np.ndarray, width: float, soil_ruler: Soil_Dep
         max_angle_difference=np.pi/5,
         compress_maximum=35,
         angle_threshold=pi/18,
-        project_onto='h')
+        project_onto='h',
+        pyramid_scale=pyramid_scale)
 
     ret = [(s, soil_ruler.ask_for_depth(s.average_y, column_offset)) for s in combined_horizontal if s.length > width * 2/3]
     return ret
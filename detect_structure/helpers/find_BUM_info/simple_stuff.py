@@ -10,20 +10,22 @@ from document_agenda.document_agenda import Document_Agenda
 from xplorer_tools.types import simple_result
 from detect_structure.helpers.find_descriptions.ocr_operations import possible_mistakes
 from xplorer_tools.cleanup_side import clean_side
+from xplorer_tools.batched_ocr import recognize
+from detect_structure.helpers.find_BUM_info.digit_classifier import KNN_Digit_Classifier, save_digit_samples
 
 logger = logging.getLogger(__name__)
 save_count = 0
 
-def _look_for_texts(colored_blows: np.ndarray, pair: Pair, ocr_instance: PaddleOCR, soil_ruler: Soil_Depth_Ruler, fail_count=0) -> list[int]:
+# What got read out of each cell of the blows column, by its (top, bottom) in
+# pixels. None if there was nothing to read
+cell_readings = dict[tuple[int, int], list[simple_result] | None]
+
+def _find_sections(pair: Pair, soil_ruler: Soil_Depth_Ruler) -> list[tuple[int, int]]:
     """
-    `fail_count` is to specify the amount of times that ocr can return no
-    results
+    Top and bottom (pixels) of each half foot cell in the pair that has a
+    number worth reading in it
     """
 
-    global save_count
-
-    logger.debug(f'Looking between {pair.top_bound} and {pair.low_bound}')
-
     sections: list[tuple[int, int]]
     topper = floor(soil_ruler.ask_for_pixels(pair.top_bound))
     lower = floor(soil_ruler.ask_for_pixels(pair.low_bound))
@@ -53,20 +55,119 @@ def _look_for_texts(colored_blows: np.ndarray, pair: Pair, ocr_instance: PaddleO
     else:
         raise Exception('Unhandled pair span')
 
+    return sections
+
+def _crop_cell(colored_blows: np.ndarray, a: int, b: int) -> np.ndarray:
+    logger.debug(f'Cropping between {a} and {b}')
+    cropped = colored_blows[a:b]
+    # imsave(f'logs/last_simple{logger_num}.png', cropped)
+    
+    # Cut out the gunk around the edges
+    cropped = clean_side(cropped, leeway=5, ratio=0.65)
+    cropped = clean_side(cropped, side=4, leeway=7, ratio=0.7)
+    cropped = clean_side(cropped, side=2, leeway=7, ratio=0.7)
+    # imsave(f'simple_texts/last_simple{save_count}.png', cropped)
+
+    return cropped
+
+def _pair_to_read(pair: Pair, blow_bounds: list[float]) -> Pair:
+    """
+    The pair analyze_pairs is going to end up reading for `pair`. Has to match
+    what the top pair case in there does
+    """
+
+    if pair.imaginary or pair.span != 1.0 or not pair.top_pair:
+        return pair
+
+    bounds = sorted(blow_bounds)
+    if len(bounds) < 2 or bounds[1] != pair.low_bound + 0.5:
+        return pair
+
+    return Pair(pair.top_bound, bounds[1])
+
+def find_cells(pairs: list[Pair], blow_bounds: list[float], colored_blows: np.ndarray, soil_ruler: Soil_Depth_Ruler) -> dict[tuple[int, int], np.ndarray]:
+    """
+    Every cell analyze_pairs might want read, cropped and cleaned up, so they
+    can all be read in one go beforehand
+    """
+
+    cells: dict[tuple[int, int], np.ndarray] = {}
+    for pair in pairs:
+        try:
+            sections = _find_sections(_pair_to_read(pair, blow_bounds), soil_ruler)
+        except Exception:
+            # analyze_pairs will run into the same thing and complain then
+            continue
+
+        for a, b in sections:
+            if (a, b) not in cells:
+                cells[(a, b)] = _crop_cell(colored_blows, a, b)
+
+    return cells
+
+def read_cells(all_cells: list[dict[tuple[int, int], np.ndarray]],
+               ocr_instance: PaddleOCR,
+               digit_classifier: KNN_Digit_Classifier | None = None,
+               collect_samples=False) -> list[cell_readings]:
+    """
+    Reads the cells from any number of columns (both sides of a page, every
+    page of a group) in one recognizer call. With a `digit_classifier`, only
+    the cells it isn't sure about go to PaddleOCR. With `collect_samples`,
+    whatever PaddleOCR reads gets saved for training one
+    """
+
+    crops: list[np.ndarray] = []
+    for cells in all_cells:
+        crops.extend(c for c in cells.values() if c.shape[0] > 0 and c.shape[1] > 0)
+
+    read: list[simple_result | None] = [None for _ in crops]
+    if digit_classifier != None:
+        read = digit_classifier.classify(crops)
+
+    leftovers = [i for i, r in enumerate(read) if r == None]
+    paddle_read = recognize(ocr_instance, [crops[i] for i in leftovers], cls=False)
+    for i, r in zip(leftovers, paddle_read):
+        read[i] = r
+
+    logger.debug(f'Read {len(read)} blow count cells at once, {len(leftovers)} of them with PaddleOCR')
+
+    if collect_samples:
+        save_digit_samples([crops[i] for i in leftovers], paddle_read)
+
+    ret: list[cell_readings] = []
+    position = 0
+    for cells in all_cells:
+        readings: cell_readings = {}
+        for key, crop in cells.items():
+            if crop.shape[0] > 0 and crop.shape[1] > 0:
+                readings[key] = [read[position]] # type: ignore
+                position += 1
+            else:
+                readings[key] = None
+        ret.append(readings)
+
+    return ret
+
+def _look_for_texts(colored_blows: np.ndarray, pair: Pair, ocr_instance: PaddleOCR, soil_ruler: Soil_Depth_Ruler, fail_count=0, readings: cell_readings | None = None) -> list[int]:
+    """
+    `fail_count` is to specify the amount of times that ocr can return no
+    results. Cells that are already in `readings` don't get read again
+    """
+
+    global save_count
+
+    logger.debug(f'Looking between {pair.top_bound} and {pair.low_bound}')
+
+    sections = _find_sections(pair, soil_ruler)
+
     ret: list[int] = []
     logger.debug(f'Looking for text in sections {sections}')
     for a, b in sections:
-        logger.debug(f'Cropping between {a} and {b}')
-        cropped = colored_blows[a:b]
-        # imsave(f'logs/last_simple{logger_num}.png', cropped)
-        
-        # Cut out the gunk around the edges
-        cropped = clean_side(cropped, leeway=5, ratio=0.65)
-        cropped = clean_side(cropped, side=4, leeway=7, ratio=0.7)
-        cropped = clean_side(cropped, side=2, leeway=7, ratio=0.7)
-        # imsave(f'simple_texts/last_simple{save_count}.png', cropped)
-        
-        results = ocr_instance.ocr(cropped, cls=False, det=False)[0]
+        if readings != None and (a, b) in readings:
+            results = readings[(a, b)]
+        else:
+            cropped = _crop_cell(colored_blows, a, b)
+            results = ocr_instance.ocr(cropped, cls=False, det=False)[0]
 
         if results == None:
             fail_count -= 1
@@ -206,7 +307,11 @@ def analyze_pairs(pairs: list[Pair],
                   colored_blows: np.ndarray,
                   soil_ruler: Soil_Depth_Ruler,
                   document_agenda: Document_Agenda,
-                  ocr_analyze_pairs: PaddleOCR) -> list[BlowCount]:
+                  ocr_analyze_pairs: PaddleOCR,
+                  readings: cell_readings | None = None) -> list[BlowCount]:
+    """
+    Pass in the `readings` from read_cells to skip reading cells one at a time
+    """
 
     ret: list[BlowCount] = []
 
@@ -215,14 +320,14 @@ def analyze_pairs(pairs: list[Pair],
         
         if pair.imaginary:
 
-            numbers = _look_for_texts(colored_blows, pair, ocr_analyze_pairs, soil_ruler, fail_count=1)
+            numbers = _look_for_texts(colored_blows, pair, ocr_analyze_pairs, soil_ruler, fail_count=1, readings=readings)
 
             if len(numbers) > 0:
                 ret.append(BlowCount(pair, numbers, document_agenda))
             
         elif pair.span == 0.5 and pair.might_extend_more:
 
-            numbers = _look_for_texts(colored_blows, pair, ocr_analyze_pairs, soil_ruler, fail_count=1)
+            numbers = _look_for_texts(colored_blows, pair, ocr_analyze_pairs, soil_ruler, fail_count=1, readings=readings)
 
             if len(numbers) == 0:
                 raise Exception('Pair was expected to have at least 1 number')
@@ -232,7 +337,7 @@ def analyze_pairs(pairs: list[Pair],
         elif pair.span == 1.0 and not pair.top_pair:
             # Normal case: pair spans 1 foot and is in the middle
             
-            numbers = _look_for_texts(colored_blows, pair, ocr_analyze_pairs, soil_ruler)
+            numbers = _look_for_texts(colored_blows, pair, ocr_analyze_pairs, soil_ruler, readings=readings)
 
             if len(numbers) == 1 and numbers[0] == 100:
                 logger.debug('Pair unexpectedly had 100 blows in under 6 inches')
@@ -255,14 +360,14 @@ def analyze_pairs(pairs: list[Pair],
                 logger.warning(f'Pair low bound : {pair.low_bound}')
                 logger.warning('Top bound does not follow normal format')
                 new_pair = pair
-                numbers = _look_for_texts(colored_blows, new_pair, ocr_analyze_pairs, soil_ruler)
+                numbers = _look_for_texts(colored_blows, new_pair, ocr_analyze_pairs, soil_ruler, readings=readings)
                 if len(numbers) == 1 or len(numbers) == 2 and numbers[1] == 0:
                     logger.warning('Pair just had a depth marker after')
                     new_pair = Pair(pair.top_bound, pair.low_bound - 0.5)
                     new_pair.incomplete = True
             else:
                 new_pair = Pair(pair.top_bound, blow_bounds[1])
-                numbers = _look_for_texts(colored_blows, new_pair, ocr_analyze_pairs, soil_ruler)
+                numbers = _look_for_texts(colored_blows, new_pair, ocr_analyze_pairs, soil_ruler, readings=readings)
             
             ret.append(BlowCount(new_pair, numbers, document_agenda))
 
@@ -270,7 +375,7 @@ def analyze_pairs(pairs: list[Pair],
             # Incomplete case: top/bottom entry that extends to the prev/next
             # column
             
-            numbers = _look_for_texts(colored_blows, pair, ocr_analyze_pairs, soil_ruler)
+            numbers = _look_for_texts(colored_blows, pair, ocr_analyze_pairs, soil_ruler, readings=readings)
 
             if len(numbers) != 1:
                 raise Exception(f'Pair expected to have one number: {numbers}')
@@ -281,7 +386,7 @@ def analyze_pairs(pairs: list[Pair],
         elif pair.span < 1.0:
             # Last entry: some last entries appear as incomplete
 
-            numbers = _look_for_texts(colored_blows, pair, ocr_analyze_pairs, soil_ruler)
+            numbers = _look_for_texts(colored_blows, pair, ocr_analyze_pairs, soil_ruler, readings=readings)
 
             if len(numbers) != 1:
                 raise Exception(f'Pair expected to have one number: {numbers}')
@@ -139,4 +139,27 @@ def join_vertical_blocks(results: list[ocr_analysis], threshold=40.0) -> list[oc
         else:
             index += 1
 
-    return blocks
\ No newline at end of file
+    return blocks
+
+def blocks_in_region(blocks: list[ocr_analysis], top: float, bottom: float, left: float, right: float) -> list[ocr_analysis]:
+    """
+    Blocks whose center is inside the region, moved so that their coordinates
+    are relative to the region's top left corner. Same as if the region had
+    been cropped out and OCR'd on its own.
+    """
+
+    ret: list[ocr_analysis] = []
+    for b in blocks:
+        cx, cy = center_ocr_coords(b['coords_group'])
+        if not (top <= cy < bottom and left <= cx < right):
+            continue
+
+        c = b['coords_group']
+        ret.append({
+            'coords_group': tuple((p[0] - left, p[1] - top) for p in c), # type: ignore
+            'text': b['text'],
+            'confidence': b['confidence'],
+            'page_offset': b['page_offset']
+        })
+
+    return ret
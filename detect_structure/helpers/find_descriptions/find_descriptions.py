@@ -19,7 +19,7 @@ import logging
 from math import floor, pi
 import os
 from pathlib import Path
-from typing import Literal
+from typing import Literal, TypedDict
 from paddleocr import PaddleOCR
 from skimage.io import imsave
 from xplorer_tools.stringify_types import str_segment
@@ -33,24 +33,67 @@ from line_detection.helpers.get_line_segments import get_line_segments
 from line_detection.helpers.draw_visuals import draw_segment_visuals, draw_on_image
 from line_detection.detect_lines import horizontals
 from detect_structure.helpers.find_descriptions.block_operations import *
-from detect_structure.helpers.find_descriptions.ocr_operations import find_text_blobs, group_words
+from detect_structure.helpers.find_descriptions.ocr_operations import submit_text_blobs, collect_text_blobs, group_words, Text_Blob_Request
+from xplorer_tools.ocr_batcher import OCR_Batcher
 from detect_structure.helpers.draw_ocr_text_bounds import draw_ocr_text_bounds
 from xplorer_tools.cleanup_side import clean_side
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever a change here (or in ocr_operations) would read the
+# descriptions differently. See Stage_Memo
+DESCRIPTIONS_VERSION = '3'
+
+class Description_Job(TypedDict):
+    """
+    One side of one page that's waiting on its OCR. See prepare_descriptions
+    """
+    request: Text_Blob_Request
+    actual_depths: list[float]
+    soil_ruler: Soil_Depth_Ruler
+    partial_description_width: float
+    side: Literal['l', 'r']
+    # Only kept around for the visuals
+    cropped_color: np.ndarray | None
+    visuals_folder: str
+
 def find_descriptions(color_image: np.ndarray,
                       gray_image: np.ndarray,
                       table: Table_Structure|Table_Structure_Half,
                       side: Literal['l', 'r'],
                       ocr_cls_false: PaddleOCR,
                       draw_visuals=False,
-                      visuals_folder='visuals') -> list[Lithology_Formation]:
+                      visuals_folder='visuals',
+                      pyramid_scale=1) -> list[Lithology_Formation]:
     """
     Right now this is just geared for the BBS_137_REV_8_99 format
     """
 
+    job = prepare_descriptions(color_image,
+                               gray_image,
+                               table,
+                               side,
+                               OCR_Batcher(ocr_cls_false),
+                               draw_visuals=draw_visuals,
+                               visuals_folder=visuals_folder,
+                               pyramid_scale=pyramid_scale)
+    return finish_descriptions(job)
+
+def prepare_descriptions(color_image: np.ndarray,
+                         gray_image: np.ndarray,
+                         table: Table_Structure|Table_Structure_Half,
+                         side: Literal['l', 'r'],
+                         batcher: OCR_Batcher,
+                         draw_visuals=False,
+                         visuals_folder='visuals',
+                         pyramid_scale=1) -> Description_Job:
+    """
+    Everything find_descriptions does up to the OCR. The column's text gets
+    handed to `batcher`, so the descriptions of a whole page group can go
+    through OCR together. Get the descriptions with finish_descriptions
+    """
+
     # First crop image to correct side and find the soil_ruler
     soil_ruler: Soil_Depth_Ruler
     left: Segment
@@ -87,7 +130,8 @@ def find_descriptions(color_image: np.ndarray,
         max_angle_difference=np.pi/5,
         compress_maximum=35,
         angle_threshold=pi/18,
-        project_onto='h')
+        project_onto='h',
+        pyramid_scale=pyramid_scale)
 
 
     if draw_visuals:
@@ -114,16 +158,37 @@ def find_descriptions(color_image: np.ndarray,
     # Get rid of borders
     cropped_color = clean_side(cropped_color, leeway=5)
     
-    # Get a list of ocr analyses
-    text_blobs = find_text_blobs(
+    # Get a list of ocr analyses (eventually)
+    request = submit_text_blobs(
         depth_lines,
         top_depth,
         bottom_depth,
         cropped_color,
         page_offset_point,
-        ocr_cls_false)
-
-    if draw_visuals:
+        batcher)
+
+    return {
+        'request': request,
+        'actual_depths': actual_depths,
+        'soil_ruler': soil_ruler,
+        'partial_description_width': partial_description_width,
+        'side': side,
+        'cropped_color': cropped_color if draw_visuals else None,
+        'visuals_folder': visuals_folder
+    }
+
+def finish_descriptions(job: Description_Job) -> list[Lithology_Formation]:
+
+    actual_depths = job['actual_depths']
+    soil_ruler = job['soil_ruler']
+    partial_description_width = job['partial_description_width']
+    cropped_color = job['cropped_color']
+    visuals_folder = job['visuals_folder']
+    side = job['side']
+
+    text_blobs = collect_text_blobs(job['request'])
+
+    if cropped_color is not None:
         # Draw boundaries of all of the text recognized inside of
         # find_text_blobs. We have to do some messy converting to get them from
         # the ocr_analysis format to the ocr_result, but it works
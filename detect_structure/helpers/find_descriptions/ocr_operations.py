@@ -1,56 +1,154 @@
 import logging
+from typing import TypedDict
 from xplorer_tools.types import ocr_coords, Coordinate, ocr_analysis, ocr_result
 from detect_structure.helpers.find_descriptions.block_operations import *
 from xplorer_tools.cleanup_side import clean_side
 from paddleocr import PaddleOCR
 from math import floor
+from bisect import bisect_right
+from xplorer_tools.ocr_batcher import OCR_Batcher, OCR_Future
 import re
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
-temp_number = 0
+# The text detector shrinks any image with a side longer than this, and small
+# print doesn't survive that. Bands get packed together into chunks no taller
+# than this so that doesn't happen
+DETECTION_CHUNK_HEIGHT = 960
 
-def __look_for_texts(color_image: np.ndarray, top_bar: float, low_bar: float, ocr_instance: PaddleOCR, page_offset: Coordinate) -> list[ocr_analysis]:
-    global temp_number
+# Blank rows between bands in a chunk so text from two bands never looks like
+# one box to the detector
+BAND_GAP = 8
 
-    logger.debug(f'Analyzing between {top_bar} and {low_bar}')
+def __pack_bands(band_images: list[np.ndarray]) -> list[list[int]]:
+    """
+    Splits the bands (by index) into runs that fit in one detection chunk. A
+    band that's too tall by itself gets a chunk to itself, same as before
+    """
 
-    y1 = floor(top_bar)
-    y2 = floor(low_bar)
-    cropped = color_image[y1:y2]
-    cropped = clean_side(cropped, leeway=5, ratio=0.4)
+    chunks: list[list[int]] = []
+    height = 0
+    for index, band in enumerate(band_images):
+        if len(chunks) == 0 or height + BAND_GAP + band.shape[0] > DETECTION_CHUNK_HEIGHT:
+            chunks.append([])
+            height = 0
+        chunks[-1].append(index)
+        height += band.shape[0] + BAND_GAP
 
-    # imsave(f'simple_texts/lith_block{temp_number}.png', cropped)
-    temp_number += 1
+    return chunks
 
-    ocr_results = ocr_instance.ocr(cropped, cls=True)
+class Text_Blob_Request(TypedDict):
+    """
+    Chunks of a column that were handed to an OCR_Batcher and haven't been
+    looked at yet. See submit_text_blobs
+    """
+    bands: list[tuple[float, float]]
+    chunks: list[list[int]]
+    chunk_starts: list[list[int]]
+    futures: list[OCR_Future]
+    page_offset: Coordinate
 
-    logger.debug(f'Found results {ocr_results}')
+def __submit_texts(color_image: np.ndarray, bands: list[tuple[float, float]], batcher: OCR_Batcher, page_offset: Coordinate) -> Text_Blob_Request:
+    """
+    What used to be one .ocr() per band. The bands get cleaned up one at a
+    time like before, then stacked into a few chunks that go to the batcher.
+    Everything the detector finds in them gets read in one batch (along with
+    whatever else the batcher was given in the meantime).
+    """
 
-    if ocr_results[0] == None:
-        logger.debug('Found end of table?')
-        return []
-    else:
-        results = ocr_results[0]
-    
-    logger.debug('Results:')
-    logger.debug(results)
+    band_images: list[np.ndarray] = []
+    for top_bar, low_bar in bands:
+        logger.debug(f'Analyzing between {top_bar} and {low_bar}')
+        cropped = color_image[floor(top_bar):floor(low_bar)]
+        band_images.append(clean_side(cropped, leeway=5, ratio=0.4))
+
+    chunks = __pack_bands(band_images)
+
+    chunk_images: list[np.ndarray] = []
+    # Where each band starts inside its chunk
+    chunk_starts: list[list[int]] = []
+    for chunk in chunks:
+        pieces: list[np.ndarray] = []
+        starts: list[int] = []
+        y = 0
+        for index in chunk:
+            if len(pieces) > 0:
+                # The images are inverted, so the background is 0
+                pieces.append(np.zeros((BAND_GAP, *band_images[index].shape[1:]), dtype=band_images[index].dtype))
+                y += BAND_GAP
+            starts.append(y)
+            pieces.append(band_images[index])
+            y += band_images[index].shape[0]
+
+        chunk_images.append(np.concatenate(pieces, axis=0))
+        chunk_starts.append(starts)
+
+    return {
+        'bands': bands,
+        'chunks': chunks,
+        'chunk_starts': chunk_starts,
+        'futures': [batcher.submit(c, det=True, cls=True) for c in chunk_images],
+        'page_offset': page_offset
+    }
+
+def collect_text_blobs(request: Text_Blob_Request) -> list[list[ocr_analysis]]:
+    """
+    The text in each band of a submitted column. Boxes go back to whichever
+    band their middle is in.
+    """
+
+    bands = request['bands']
+    page_offset = request['page_offset']
+    chunk_results = [f.result() for f in request['futures']]
+    logger.debug(f'Found results {chunk_results}')
+
+    ret: list[list[ocr_analysis]] = [[] for _ in bands]
+    for chunk, starts, results in zip(request['chunks'], request['chunk_starts'], chunk_results):
+        for r in results:
+            middle_y = sum(c[1] for c in r[0]) / len(r[0])
+            position = max(bisect_right(starts, middle_y) - 1, 0)
+            band = chunk[position]
+
+            # From chunk coordinates back to the same ones a lone band would
+            # have given
+            shift = bands[band][0] - starts[position]
+            corrected_coords: ocr_coords = tuple((c[0], c[1]+shift) for c in r[0]) # type: ignore
+            a: ocr_analysis = {
+                # 'coords_group': r[0],
+                'coords_group': corrected_coords,
+                'text': r[1][0],
+                'confidence': r[1][1],
+                'page_offset': page_offset
+            }
+            ret[band].append(a)
+
+    for index, blob in enumerate(ret):
+        if len(blob) == 0:
+            logger.debug(f'Nothing in band {index}, found end of table?')
 
-    ret: list[ocr_analysis] = []
-    for r in results:
-        corrected_coords: ocr_coords = tuple((c[0], c[1]+top_bar) for c in r[0]) # type: ignore
-        a: ocr_analysis = {
-            # 'coords_group': r[0],
-            'coords_group': corrected_coords,
-            'text': r[1][0],
-            'confidence': r[1][1],
-            'page_offset': page_offset
-        }
-        ret.append(a)
-    
     return ret
 
+def submit_text_blobs(depth_lines: list[float],
+                      top_depth: float,
+                      bottom_depth: float,
+                      colored_area,
+                      offset: Coordinate,
+                      batcher: OCR_Batcher) -> Text_Blob_Request:
+    """
+    Hands the column to `batcher` and comes back right away. Get the text out
+    of it with collect_text_blobs once everything else that could go in the
+    same batch has been submitted
+    """
+
+    # "top_depth" and "bottom_depth" are honorary depth_lines. If no depth
+    # lines were recognized in this column, it's just the one band between
+    # the top and bottom
+    bars = [top_depth, *depth_lines, bottom_depth]
+    bands = list(zip(bars[:-1], bars[1:]))
+
+    return __submit_texts(colored_area, bands, batcher, offset)
+
 def find_text_blobs(depth_lines: list[float],
                     top_depth: float,
                     bottom_depth: float,
@@ -58,26 +156,8 @@ def find_text_blobs(depth_lines: list[float],
                     offset: Coordinate,
                     ocr_text_blobs: PaddleOCR) -> list[list[ocr_analysis]]:
 
-    text_blobs: list[list[ocr_analysis]] = []
-
-    # "top_depth" and "bottom_depth" are honorary depth_lines
-
-    if len(depth_lines) > 0:
-        first = __look_for_texts(colored_area, top_depth, depth_lines[0], ocr_text_blobs, offset)
-        last  = __look_for_texts(colored_area, depth_lines[-1], bottom_depth, ocr_text_blobs, offset)
-        text_blobs.append(first)
-
-        if len(depth_lines) > 1:
-            for i in range(len(depth_lines) - 1):
-                t = __look_for_texts(colored_area, depth_lines[i], depth_lines[i+1], ocr_text_blobs, offset)
-                text_blobs.append(t)
-        text_blobs.append(last)
-    else:
-        # No depth lines were recognized in this column. Just look between the top and bottom
-        one_blob = __look_for_texts(colored_area, top_depth, bottom_depth, ocr_text_blobs, offset)
-        text_blobs.append(one_blob)
-    
-    return text_blobs
+    request = submit_text_blobs(depth_lines, top_depth, bottom_depth, colored_area, offset, OCR_Batcher(ocr_text_blobs))
+    return collect_text_blobs(request)
 
 def group_words(text_blobs: list[list[ocr_analysis]], partial_description_width: float) -> list[tuple[list[ocr_analysis], list[ocr_analysis]]]:
     """
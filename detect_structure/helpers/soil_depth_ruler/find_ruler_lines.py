@@ -14,7 +14,7 @@ from line_detection.detect_lines import horizontals
 
 logger = logging.getLogger(__name__)
 
-def detect_ruler_lines(gray_image: ndarray[Any, Any], draw_visuals=False, visuals_folder='visuals') -> list[Segment]:
+def detect_ruler_lines(gray_image: ndarray[Any, Any], draw_visuals=False, visuals_folder='visuals', pyramid_scale=1) -> list[Segment]:
 
     # This is the image that we are specifically going to analyze for lines.
     analyze_me = (255 - gray_image)
@@ -32,7 +32,8 @@ def detect_ruler_lines(gray_image: ndarray[Any, Any], draw_visuals=False, visual
         max_angle_difference=np.pi/5,
         compress_maximum=35,
         angle_threshold=pi/18,
-        project_onto='h')
+        project_onto='h',
+        pyramid_scale=pyramid_scale)
     
     # Limit the horizontals down to stuff that is completely horizontal
     b = len(combined_horizontal)
@@ -15,6 +15,9 @@ import statistics
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever a change here would read the rulers differently. See Stage_Memo
+RULERS_VERSION = '1'
+
 class _Tick_Number(TypedDict):
     depth: float
     pixels: float
@@ -62,7 +65,8 @@ class Soil_Depth_Ruler:
             format: form_types=form_types.Empty,
             draw_visuals=False,
             side: Literal['l','r']='l',
-            visuals_folder='visuals') -> None:
+            visuals_folder='visuals',
+            pyramid_scale=1) -> None:
 
         self.starting_depth = starting_depth
         self.ending_depth = ending_depth
@@ -84,7 +88,7 @@ class Soil_Depth_Ruler:
             imsave(os.path.join(visuals_folder, f'ruler_base_{side}.png'), ruler_image)
 
         # Analyze the ruler for all ticks
-        ruler_ticks = detect_ruler_lines(ruler_image, draw_visuals=draw_visuals)
+        ruler_ticks = detect_ruler_lines(ruler_image, draw_visuals=draw_visuals, pyramid_scale=pyramid_scale)
 
         # Do we have enough data?
         not_enough_data = len(ruler_ticks) == 0 or len(ruler_ticks) == 1 and not starting_depth == None
@@ -1,7 +1,8 @@
 import logging
 import os
 from pathlib import Path
-from xplorer_tools.segment_operations import Segment, find_lines_that_intersect, segment_add, segment_subtract
+from xplorer_tools.segment_array import Segment_Array
+from xplorer_tools.segment_operations import Segment, segment_add, segment_subtract
 from xplorer_tools.vector_operations import int_ify_vector, vector_add, vector_subtract
 from xplorer_tools.stringify_types import str_segment
 from xplorer_tools.types import Coordinate, Vector
@@ -185,21 +186,24 @@ class Table_Structure:
                     right_ends: tuple[float, float],
                     color_image: np.ndarray,
                     gray_image: np.ndarray,
-                    draw_visuals=False) -> None:
+                    draw_visuals=False,
+                    pyramid_scale=1) -> None:
         self.left_soil_depth_ruler  = Soil_Depth_Ruler(gray_image,
                                                        color_image,
                                                        self.left_half['ruler'],
                                                        self.table_top.average_y,
                                                        *left_ends,
                                                        draw_visuals=draw_visuals,
-                                                       side='l')
+                                                       side='l',
+                                                       pyramid_scale=pyramid_scale)
         self.right_soil_depth_ruler = Soil_Depth_Ruler(gray_image,
                                                        color_image,
                                                        self.right_half['ruler'],
                                                        self.table_top.average_y,
                                                        *right_ends,
                                                        draw_visuals=draw_visuals,
-                                                       side='r')
+                                                       side='r',
+                                                       pyramid_scale=pyramid_scale)
 
     def refresh_all_segments(self) -> None:
         self.table_top.compare_fails = []
@@ -281,20 +285,23 @@ class Table_Structure:
         valid_verticals.sort(key=lambda v: v.average_x)
         valid_verticals = valid_verticals[1:-1]
 
-        # Limit horizontals based on threshold
-        valid_horizontals = [h for h in horizontals if h.length > width_min]
+        # Limit horizontals based on threshold. Done on an array since there
+        # can be a lot of horizontals and they all get checked against every
+        # vertical
+        horizontal_array = Segment_Array.from_segments(horizontals)
+        keep = horizontal_array.lengths > width_min
 
         logger.debug('Limiting verticals')
         for v in valid_verticals:
             logger.debug(str_segment(v))
-            valid_horizontals = find_lines_that_intersect(v, valid_horizontals)
+            keep &= horizontal_array.intersects(v)
 
-        if len(valid_horizontals) == 0:
+        if not keep.any():
             raise Exception('length of table headers is 0')
 
-        valid_horizontals.sort(key=lambda h: h.average_y)
-
-        return valid_horizontals[0]
+        # argmin picks the first of any ties same as the stable sort did
+        candidates = np.flatnonzero(keep)
+        return horizontals[candidates[np.argmin(horizontal_array.average_y[candidates])]]
 
     @staticmethod
     def __find_header_top(horizontals: list[Segment], verticals: list[Segment], center_x: int|float, height: int, width: int, table_top: Segment) -> Segment:
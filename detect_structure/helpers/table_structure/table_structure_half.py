@@ -2,7 +2,8 @@ from copy import deepcopy
 import logging
 import os
 from pathlib import Path
-from xplorer_tools.segment_operations import Segment, find_lines_that_intersect, segment_add
+from xplorer_tools.segment_array import Segment_Array
+from xplorer_tools.segment_operations import Segment, segment_add
 from xplorer_tools.vector_operations import int_ify_vector, vector_add
 from xplorer_tools.types import Coordinate
 from line_detection.helpers.draw_visuals import draw_segment_on_image, draw_on_image
@@ -146,7 +147,8 @@ class Table_Structure_Half:
                     right_ends: tuple[float, float],
                     color_image: np.ndarray,
                     gray_image: np.ndarray,
-                    draw_visuals=False) -> None:
+                    draw_visuals=False,
+                    pyramid_scale=1) -> None:
         # right_ends is not used, but is there for symmetry with a full table
         self.left_soil_depth_ruler = Soil_Depth_Ruler(gray_image,
                                                       color_image,
@@ -154,7 +156,8 @@ class Table_Structure_Half:
                                                       self.table_top.average_y,
                                                       *left_ends,
                                                       draw_visuals=draw_visuals,
-                                                      side='l')
+                                                      side='l',
+                                                      pyramid_scale=pyramid_scale)
 
     def draw_structure(self, color_image: np.ndarray, visuals_folder='visuals') -> None:
         Path(visuals_folder).mkdir(parents=True, exist_ok=True)
@@ -217,20 +220,24 @@ class Table_Structure_Half:
         # Limit by height and pick top 4
         valid_verticals = [v for v in verticals if v.length > height/2][:4]
 
-        # Limit horizontals based on threshold
-        valid_horizontals = [h for h in horizontals if h.length > width_min]
+        # Limit horizontals based on threshold. Done on an array since there
+        # can be a lot of horizontals and they all get checked against every
+        # vertical
+        horizontal_array = Segment_Array.from_segments(horizontals)
+        keep = horizontal_array.lengths > width_min
 
         logger.debug('Limiting by verticals')
         for v in valid_verticals:
             logger.debug(v)
-            valid_horizontals = find_lines_that_intersect(v, valid_horizontals)
+            keep &= horizontal_array.intersects(v)
 
-        if len(valid_horizontals) == 0:
+        if not keep.any():
             raise Exception('length of table headers is 0')
 
-        # Grab the topmost horizontal line
-        valid_horizontals.sort(key=lambda h: h.average_y)
-        return valid_horizontals[0]
+        # Grab the topmost horizontal line. argmin picks the first of any ties
+        # same as the stable sort did
+        candidates = np.flatnonzero(keep)
+        return horizontals[candidates[np.argmin(horizontal_array.average_y[candidates])]]
 
     @staticmethod
     def __find_header_top(horizontals: list[Segment], verticals: list[Segment], center_x: int|float, height: int, width: int, table_top: Segment) -> Segment:
@@ -8,23 +8,59 @@ from skimage.io import imsave
 from paddleocr import PaddleOCR
 from detect_structure.helpers.find_descriptions.block_operations import join_horizontal_blocks
 from detect_structure.helpers.draw_ocr_text_bounds import draw_ocr_text_bounds
+from find_logs.prefilter import page_might_be_log
+from xplorer_tools.page_raster_cache import Page_Raster_Cache
+from xplorer_tools.ocr_batcher import OCR_Batcher, OCR_Future
+from find_logs.text_layer import can_use_text_layer, page_has_images, text_layer_says_log
 from PIL import Image
 from difflib import SequenceMatcher
 import fitz
 
 logger = logging.getLogger(__name__)
 
+HEAD_DPI = 150
+FULL_DPI = 300
+MIN_HEAD_DPI = 96
+HEAD_FRACTION = 0.13
+LETTER_SHORT_SIDE = 612 # points
+
+# Bump whenever a change here would find different log pages. See Stage_Memo
+LOG_PAGES_VERSION = '1'
+
 
 # Identification information should be in the top 30%
 def find_bbs_137_rev_8_99_log_pages(file_path: str,
                               ocr_bbs_texts: PaddleOCR,
                               draw_visuals=False,
                               visuals_folder='visuals',
-                            ) -> list[int]:
+                              use_text_layer=True,
+                              prefilter_threshold=0.0,
+                              document: fitz.Document | None = None,
+                              raster_cache: Page_Raster_Cache | None = None
+                            ) -> tuple[list[int], set[int]]:
     """
     Look at all the pages of a document and look for all soil boring logs. Some
     documents contain more than one boring log so return a list of a list of all
     the pages in an individual log.
+
+    Pages with a text layer get checked using that first. OCR only happens when
+    the text layer can't settle it, which is when there isn't one or when the
+    page has scanned images on it that might have the log in them. Also returns
+    the log pages that were found through the text layer, since their header
+    info can be read the same way.
+
+    Before a page gets OCR'd, a cheap look at a tiny render of it throws out
+    the pages that obviously don't have a log table. `prefilter_threshold` is
+    how sure that look needs to be (0 to 1, 0 turns it off).
+
+    Pass in the open `document` and a `raster_cache` to have the pages that OCR
+    says are logs rendered at full resolution and kept around for the analysis.
+    The heads always get rendered on their own, most pages aren't logs and
+    rendering all of them at full size just to look at the top is a waste.
+
+    Page heads get handed to an OCR_Batcher as they're rendered and only get
+    looked at once the batcher has run them, so a bunch of heads get read in
+    the same recognizer call.
     """
 
     
@@ -32,57 +68,136 @@ def find_bbs_137_rev_8_99_log_pages(file_path: str,
         Path(os.path.join(visuals_folder, 'page_heads')).mkdir(parents=True, exist_ok=True)
     
     ret: list[int] = []
+    text_layer_pages: set[int] = set()
+    ocr_calls_saved = 0
+
+    batcher = OCR_Batcher(ocr_bbs_texts)
+    # page_num, what the head OCR will come up with, the head (only kept for
+    # the visuals), and the head DPI
+    waiting: list[tuple[int, OCR_Future, np.ndarray | None, int]] = []
+
+    def settle(everything: bool) -> None:
+        """
+        Looks at the heads the batcher has already run (or all of them if
+        `everything`). They get run in the order they were submitted, so it's
+        always the front of `waiting` that's done. Log pages go into the
+        raster cache as soon as we know
+        """
+
+        while len(waiting) > 0 and (everything or waiting[0][1].done()):
+            page_num, future, head_image, head_dpi = waiting.pop(0)
+            is_soil_log_page: bool = __test_page_for_log(future.result(),
+                                                         head_image,
+                                                         page_num,
+                                                         create_copy_of_image=True,
+                                                         draw_visuals=draw_visuals,
+                                                         visuals_folder=visuals_folder,
+                                                         dpi_scale=head_dpi / HEAD_DPI)
+
+            if is_soil_log_page:
+                ret.append(page_num)
+                if raster_cache != None:
+                    raster_cache.get_pixmap(pdf, page_num, FULL_DPI)
     
     # Look at text in the top of each page. Combine text that needs to be
     # combined and then look for "soil boring log"
     logger.info('Searching through page heads')
 
-    with fitz.open(file_path) as pdf:
-
+    pdf = document if document != None else fitz.open(file_path)
+    try:
         logger.info(f'There are {pdf.page_count} pages in document')
         
         for page_num in range(pdf.page_count):
             page = pdf.load_page(page_num)
-            colo_pixmap = page.get_pixmap(dpi=150)
+            head_clip = find_head_clip(page)
+
+            if use_text_layer and can_use_text_layer(page):
+                if text_layer_says_log(page, head_clip, similar):
+                    logger.debug(f'Page {page_num} is a log according to its text layer')
+                    ret.append(page_num)
+                    text_layer_pages.add(page_num)
+                    continue
+
+                if not page_has_images(page):
+                    logger.debug(f'Page {page_num} is all text and not a log')
+                    continue
+
+            if not page_might_be_log(page, prefilter_threshold):
+                logger.debug(f'Page {page_num} does not look like a log, skipping OCR')
+                ocr_calls_saved += 1
+                continue
+
+            head_dpi = find_head_dpi(page)
+            colo_pixmap: fitz.Pixmap | None = page.get_pixmap(dpi=head_dpi, clip=head_clip)
+            # Copied, the batcher holds onto it for longer than the pixmap is
+            # around
+            color_image: np.ndarray | None = np.frombuffer(colo_pixmap.samples_mv, dtype=np.uint8).reshape(colo_pixmap.height, colo_pixmap.width, 3).copy()
             page = None
 
-            color_image = Image.frombytes('RGB', size=(colo_pixmap.width, floor(colo_pixmap.height*0.13)), data=colo_pixmap.samples)
-            colo_pixmap = None
-
-            if color_image.width > color_image.height:
-                color_image = color_image.crop((0, 0, 2500, color_image.height))
-
-            is_soil_log_page: bool = __test_page_for_log(np.array(color_image),
-                                                         ocr_bbs_texts,
-                                                         page_num,
-                                                         create_copy_of_image=False,
-                                                         draw_visuals=draw_visuals,
-                                                         visuals_folder=visuals_folder,)
+            future = batcher.submit(color_image, det=True, cls=False)
+            waiting.append((page_num, future, color_image if draw_visuals else None, head_dpi))
 
             color_image = None
+            colo_pixmap = None
 
-            if is_soil_log_page:
-                ret.append(page_num)
+            settle(everything=False)
 
             fitz.TOOLS.store_shrink(100)
 
-    logger.info(f'File has {len(ret)} BBS_137_REV_8_99 soil boring logs')
-    return ret
+        settle(everything=True)
+    finally:
+        if document == None:
+            pdf.close()
+
+    # The text layer ones got added as they came up
+    ret.sort()
+
+    logger.debug(f'Page heads went through OCR in {batcher.batches} batches')
+    logger.info(f'File has {len(ret)} BBS_137_REV_8_99 soil boring logs ({len(text_layer_pages)} from the text layer)')
+    logger.info(f'Prefilter saved {ocr_calls_saved} page head OCR calls')
+    return ret, text_layer_pages
     
     # For testing purposes, just return the pre-labeled stuff
     # return page_dict[file_path]
 
+def find_head_clip(page: fitz.Page) -> fitz.Rect:
+    """
+    The part of the page the title lives in. That's the top 13%, and nothing
+    past what would have been 2500 pixels over at the full head DPI.
+    """
+
+    rect = page.rect
+    width = min(rect.width, 2500 * 72 / HEAD_DPI)
+    return fitz.Rect(rect.x0, rect.y0, rect.x0 + width, rect.y0 + rect.height * HEAD_FRACTION)
+
+def find_head_dpi(page: fitz.Page) -> int:
+    """
+    The forms are letter sized. When a page is bigger than that, it's almost
+    always a scan done at a bigger size, so the text on it is bigger too and we
+    can get away with fewer pixels.
+    """
+
+    short_side = min(page.rect.width, page.rect.height)
+    if short_side <= LETTER_SHORT_SIDE:
+        return HEAD_DPI
+
+    return max(MIN_HEAD_DPI, floor(HEAD_DPI * LETTER_SHORT_SIDE / short_side))
+
 def similar(a: str, b: str):
     return SequenceMatcher(None, a.lower(), b.lower()).ratio()
 
-def __test_page_for_log(color_img: np.ndarray,
-                        ocr_bbs_texts: PaddleOCR,
+def __test_page_for_log(texts: list[ocr_result],
+                        color_img: np.ndarray | None,
                         index: int,
                         create_copy_of_image=False,
                         draw_visuals=False,
-                        visuals_folder='visuals') -> bool:
+                        visuals_folder='visuals',
+                        dpi_scale=1.0) -> bool:
+    """
+    `texts` is what OCR found in the page head `color_img`. The image is only
+    needed for the visuals
+    """
 
-    texts = ocr_bbs_texts.ocr(color_img, cls=False)[0]
     if texts == None or len(texts) == 0:
         return False
 
@@ -97,9 +212,9 @@ def __test_page_for_log(color_img: np.ndarray,
         for text in texts
     ]
 
-    blocks = join_horizontal_blocks(blocks, lateral_threshold=16)
+    blocks = join_horizontal_blocks(blocks, vertical_threshold=40 * dpi_scale, lateral_threshold=16 * dpi_scale)
 
-    if draw_visuals:
+    if draw_visuals and color_img is not None:
         path = os.path.join(visuals_folder, 'page_heads', f'page_{index}.png')
         with_text = draw_ocr_text_bounds(texts, color_img, in_place=(not create_copy_of_image))
         imsave(path, with_text)
@@ -0,0 +1,159 @@
+"""
+Scanned PDFs tend to have a pile of plan sheets, letters, and photos in front
+of the actual logs, and every one of those used to get a full OCR pass just to
+find out it isn't a log. This is a quick look at a small grayscale render of
+the page to throw out the ones that obviously aren't.
+
+What every BBS 137 page has that most other pages don't is the table. The
+column separators run most of the way down the page, so counting long vertical
+lines at a low resolution is a pretty good tell. A half table has at least 5 of
+them and a full table has around 10.
+
+Two things make that harder than it sounds
+
+ - Table lines can be as thin as a pixel or two at 300 DPI. Shrinking the page
+   averages them out to light gray, so "dark" means darker than the paper
+   around it, not a fixed gray value, and the render isn't shrunk that far.
+ - Scans are crooked by up to a degree or so. Over the height of the table
+   that moves a line sideways by more than a column, so the page gets leaned
+   over by a few small angles and whichever one stacks the lines up best
+   counts. A line only has to have one long run down its column (with small
+   breaks allowed), it doesn't have to cover the whole column.
+
+It's off by default. Run `python benchmark_log_prefilter.py` to see how many
+logs it would miss on your own PDFs before turning it on.
+"""
+
+import logging
+from math import radians, tan
+import numpy as np
+import fitz
+
+logger = logging.getLogger(__name__)
+
+PREFILTER_DPI = 100
+
+# Big plan sheets get rendered smaller than PREFILTER_DPI so the long side
+# doesn't go past this. They're scanned bigger, so their lines are too
+MAX_SIDE_PIXELS = 1400
+
+# How much darker than the paper a pixel has to be to be ink
+DARKER_THAN_PAPER = 40
+
+# The angles (degrees) the page gets leaned over by
+MAX_SKEW = 2.0
+SKEW_STEP = 0.25
+
+# A column needs an unbroken run of ink at least this much of the page height
+# to count as one of the table's vertical lines
+MIN_LINE_LENGTH = 0.5
+
+# Rows get squashed together this many at a time (a row is ink if any of them
+# are). Lines only need to be found going down, so the height can go
+ROW_POOL = 4
+
+# Breaks in a run (in squashed rows) that don't end it. Scans lose bits of
+# lines
+MAX_RUN_GAP = 1
+
+# Half tables have this many long verticals, so seeing this many is a sure
+# enough sign to not filter the page out
+EXPECTED_VERTICALS = 5
+
+
+def score_page_for_log(page: fitz.Page) -> float:
+    """
+    Between 0 and 1. How much this page looks like it has a log table on it.
+    Pages with the table score 1.
+    """
+
+    long_side = max(page.rect.width, page.rect.height)
+    dpi = min(PREFILTER_DPI, MAX_SIDE_PIXELS * 72 / max(long_side, 1))
+
+    pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    gray = np.frombuffer(pixmap.samples_mv, dtype=np.uint8).reshape(pixmap.height, pixmap.stride)[:, :pixmap.width]
+
+    return score_gray_for_log(gray)
+
+def score_gray_for_log(gray: np.ndarray) -> float:
+    """
+    score_page_for_log on an already rendered grayscale page
+    """
+
+    height, width = gray.shape
+    if height == 0 or width == 0:
+        return 0.0
+
+    paper = float(np.median(gray))
+    dark = gray.astype(np.int16) < paper - DARKER_THAN_PAPER
+
+    # A page that is mostly ink (photos, dark scans) would have every column
+    # "covered" so don't let those count at all
+    if dark.mean() > 0.5:
+        return 0.0
+
+    height = height // ROW_POOL
+    dark = dark[:height * ROW_POOL].reshape(height, ROW_POOL, width).any(axis=1)
+    if height == 0:
+        return 0.0
+
+    rows = np.arange(height)
+    columns = np.arange(width)
+    best = 0
+    for skew in np.arange(-MAX_SKEW, MAX_SKEW + SKEW_STEP / 2, SKEW_STEP):
+
+        # Slide every row over so a line crooked by `skew` stands straight up
+        shift = np.rint((rows - height / 2) * ROW_POOL * tan(radians(skew))).astype(int)
+        source = columns[None, :] + shift[:, None]
+        inside = (source >= 0) & (source < width)
+        leaned = dark[rows[:, None], np.clip(source, 0, width - 1)] & inside
+
+        # What's left of the crookedness (less than half a step) still moves a
+        # line over a column, so a column gets its neighbors' ink too
+        smeared = leaned.copy()
+        smeared[:, 1:] |= leaned[:, :-1]
+        smeared[:, :-1] |= leaned[:, 1:]
+
+        is_line = __longest_runs(smeared) >= MIN_LINE_LENGTH * height
+
+        if is_line.sum() > 0.5 * width:
+            continue
+
+        # Count runs of neighboring line columns as one line
+        lines = np.count_nonzero(is_line[1:] & ~is_line[:-1]) + int(is_line[0])
+        best = max(best, lines)
+
+        if best >= EXPECTED_VERTICALS:
+            break
+
+    return min(1.0, best / EXPECTED_VERTICALS)
+
+def __longest_runs(ink: np.ndarray) -> np.ndarray:
+    """
+    For each column, the longest run of ink going down it. Breaks of up to
+    MAX_RUN_GAP rows in the middle of a run count as part of it
+    """
+
+    height = ink.shape[0]
+    rows = np.arange(height)[:, None]
+
+    # Fill in the short breaks. A row is in a break if the ink above and below
+    # it are close enough together
+    last_ink = np.maximum.accumulate(np.where(ink, rows, -height), axis=0)
+    next_ink = np.minimum.accumulate(np.where(ink, rows, 2 * height)[::-1], axis=0)[::-1]
+    filled = ink | (next_ink - last_ink - 1 <= MAX_RUN_GAP)
+
+    # How long the run is at every row is how far back the last empty row was
+    last_empty = np.maximum.accumulate(np.where(filled, -1, rows), axis=0)
+    return (rows - last_empty).max(axis=0)
+
+def page_might_be_log(page: fitz.Page, threshold: float) -> bool:
+    """
+    False when the page clearly isn't a log. A threshold of 0 lets everything
+    through, higher thresholds filter more but risk missing a badly scanned log.
+    """
+
+    if threshold <= 0:
+        return True
+
+    return score_page_for_log(page) >= threshold
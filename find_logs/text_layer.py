@@ -0,0 +1,140 @@
+"""
+A lot of the newer PDFs weren't scanned at all. They were printed straight to
+PDF, so every word on the page is already sitting in the text layer. Running
+PaddleOCR over those is a waste of time, we can just ask PyMuPDF what's there.
+
+The words get turned into the same ocr_analysis blocks that the OCR results get
+turned into, with pixel coordinates at whatever DPI the page is being rendered
+at. That way everything downstream (finding the title, page numbers, header
+fields) doesn't have to know or care where the text came from.
+"""
+
+import logging
+from math import cos, radians, sin
+import re
+import fitz
+from xplorer_tools.types import *
+
+logger = logging.getLogger(__name__)
+
+# Needs at least this many words before I trust the text layer to have the
+# whole page in it
+MIN_WORDS = 20
+
+# Two words on the same line further apart than this (in line heights) get put
+# in separate blocks, same as PaddleOCR would
+WORD_GAP_RATIO = 0.8
+
+
+def can_use_text_layer(page: fitz.Page) -> bool:
+    """
+    Rotated pages have their words in a different coordinate space than the
+    rendered image. Not worth dealing with, so OCR them
+    """
+    return page.rotation == 0 and len(page.get_text('words')) >= MIN_WORDS
+
+def page_has_images(page: fitz.Page) -> bool:
+    return len(page.get_images(full=False)) > 0
+
+def get_text_blocks(page: fitz.Page, dpi: float, clip: fitz.Rect | None = None) -> list[ocr_analysis]:
+    """
+    Every line of words in the page (or just the `clip` of it) as ocr_analysis
+    blocks in pixel coordinates for an image rendered at `dpi`. Coordinates are
+    relative to the top left of the clip if there is one.
+    """
+
+    scale = dpi / 72
+    origin = clip if clip != None else page.rect
+
+    words = page.get_text('words', clip=clip, sort=True)
+
+    # Words come in as (x0, y0, x1, y1, text, block, line, word)
+    lines: dict[tuple[int, int], list] = {}
+    for w in words:
+        lines.setdefault((w[5], w[6]), []).append(w)
+
+    blocks: list[ocr_analysis] = []
+    for line_words in lines.values():
+        line_words.sort(key=lambda w: w[0])
+
+        chunk = [line_words[0]]
+        for w in line_words[1:]:
+            height = max(chunk[-1][3] - chunk[-1][1], 1.0)
+            if w[0] - chunk[-1][2] > WORD_GAP_RATIO * height:
+                blocks.append(__chunk_to_block(chunk, origin, scale))
+                chunk = []
+            chunk.append(w)
+
+        blocks.append(__chunk_to_block(chunk, origin, scale))
+
+    return blocks
+
+def __chunk_to_block(chunk: list, origin: fitz.Rect, scale: float) -> ocr_analysis:
+
+    x0 = (min(w[0] for w in chunk) - origin.x0) * scale
+    y0 = (min(w[1] for w in chunk) - origin.y0) * scale
+    x1 = (max(w[2] for w in chunk) - origin.x0) * scale
+    y1 = (max(w[3] for w in chunk) - origin.y0) * scale
+
+    return {
+        'coords_group': ((x0, y0), (x1, y0), (x1, y1), (x0, y1)),
+        'text': ' '.join(w[4] for w in chunk),
+        'confidence': 1.0,
+        'page_offset': { 'x': 0, 'y': 0 }
+    }
+
+def text_layer_says_log(page: fitz.Page, head_clip: fitz.Rect, similar) -> bool:
+    """
+    Is this a BBS 137 soil boring log going just off of the text layer? Needs
+    the title up in the head AND the form number somewhere on the page.
+    `similar` is the same fuzzy matcher used on the OCR results.
+    """
+
+    head_blocks = get_text_blocks(page, 72, clip=head_clip)
+    has_title = any(similar(b['text'], 'soil boring log') >= 0.95 or
+                    'soil boring log' in b['text'].lower()
+                    for b in head_blocks)
+
+    if not has_title:
+        return False
+
+    page_text = re.sub(r'\s+', ' ', page.get_text('text')).lower()
+    has_form = 'bbs' in page_text and '137' in page_text
+
+    if not has_form:
+        logger.debug('Found the title in the text layer but not the BBS 137 form number')
+
+    return has_form
+
+def rotate_blocks(blocks: list[ocr_analysis], rotate_by: float, width: float, height: float) -> list[ocr_analysis]:
+    """
+    fix_orientation turns the page `rotate_by` degrees counter clockwise about
+    its center. Do the same thing to the blocks so they still line up with the
+    image.
+    """
+
+    if rotate_by == 0:
+        return blocks
+
+    theta = radians(rotate_by)
+    c = cos(theta)
+    s = sin(theta)
+    cx = width / 2
+    cy = height / 2
+
+    def turn(p: coord_pair) -> coord_pair:
+        dx = p[0] - cx
+        dy = p[1] - cy
+        return (cx + dx * c + dy * s, cy - dx * s + dy * c)
+
+    rotated: list[ocr_analysis] = []
+    for b in blocks:
+        coords = b['coords_group']
+        rotated.append({
+            'coords_group': (turn(coords[0]), turn(coords[1]), turn(coords[2]), turn(coords[3])),
+            'text': b['text'],
+            'confidence': b['confidence'],
+            'page_offset': b['page_offset']
+        })
+
+    return rotated
@@ -11,10 +11,15 @@ from header_analysis.analyze_waters import Water_Obj, analyze_water
 from header_analysis.analyze_header import Header_Obj, analyze_header
 from detect_structure.helpers.table_structure.table_structure import Table_Structure
 from detect_structure.helpers.draw_ocr_text_bounds import draw_ocr_text_bounds
+from detect_structure.helpers.find_descriptions.block_operations import blocks_in_region, center_ocr_coords
 from detect_structure.helpers.table_structure.table_structure_half import Table_Structure_Half
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever a change here (or in analyze_header/analyze_waters) would read
+# the headers differently. See Stage_Memo
+PAGE_GROUPS_VERSION = '2'
+
 class doc_state(Enum):
     waiting_for_new = auto()
     building_but_no_limit = auto()
@@ -25,7 +30,8 @@ def find_page_groups(log_locations: list[int],
                      image_dict: dict[int, tuple[np.ndarray, np.ndarray]],
                      ocr_cls_false: PaddleOCR,
                      draw_visuals=False,
-                     visuals_folder='visuals'
+                     visuals_folder='visuals',
+                     text_block_dict: dict[int, list[ocr_analysis]] | None = None
                      ) -> tuple[dict[int, Header_Obj], dict[int, Water_Obj]]:
     """
     Right now it's just a hacky way that looks like it should work a majority of
@@ -37,6 +43,10 @@ def find_page_groups(log_locations: list[int],
     the fields that are present in the header of each soil boring log page.
     Compare them and make sure that only pages that have similarity in certain
     fields get put into the same document.
+
+    Pages in `text_block_dict` already have the text above their table (from
+    their text layer or from read_header_band), so their header info gets read
+    from that instead of being OCR'd again.
     """
 
     header_dict: dict[int, Header_Obj] = {}
@@ -51,6 +61,8 @@ def find_page_groups(log_locations: list[int],
 
     for index, loc in enumerate(log_locations):
 
+        text_blocks = text_block_dict.get(loc) if text_block_dict != None else None
+
         # structure_dict[loc].draw_structure()
         header = __get_header_info(structure_dict[loc],
                                    image_dict[loc][1],
@@ -58,12 +70,14 @@ def find_page_groups(log_locations: list[int],
                                    index,
                                    len(log_locations),
                                    draw_visuals=draw_visuals,
-                                   visuals_folder=visuals_folder)
+                                   visuals_folder=visuals_folder,
+                                   text_blocks=text_blocks)
         water = __get_water_info(structure_dict[loc],
                                  image_dict[loc][1],
                                  ocr_cls_false,
                                  draw_visuals=draw_visuals,
-                                 visuals_folder=visuals_folder)
+                                 visuals_folder=visuals_folder,
+                                 text_blocks=text_blocks)
         header_dict[loc] = header
         water_dict[loc] = water
         logger.debug(f'Found header: {header}')
@@ -154,7 +168,8 @@ def __get_water_info(structure: Table_Structure|Table_Structure_Half,
                      color_image: np.ndarray,
                      ocr_water_info: PaddleOCR,
                      draw_visuals=False,
-                     visuals_folder='visuals') -> Water_Obj:
+                     visuals_folder='visuals',
+                     text_blocks: list[ocr_analysis] | None = None) -> Water_Obj:
 
     logger.debug('Finding water')
 
@@ -175,27 +190,37 @@ def __get_water_info(structure: Table_Structure|Table_Structure_Half,
     logger.debug(f'Cropping water table to {[top_y, low_y, left_x, right_x]}')
 
     water_color = color_image[top_y:low_y, left_x:right_x]
-    
-    texts = ocr_water_info.ocr(water_color, cls=False)[0]
-    if texts == None or len(texts) == 0:
-        raise Exception('OCR could not find any text in the water section')
-    
-    # Convert these to the much nicer ocr_analysis
-    blocks: list[ocr_analysis] = [
-        {
-            'coords_group': text[0],
-            'confidence': text[1][1],
-            'page_offset': { 'x': 0, 'y': 0 },
-            'text': text[1][0].replace('_', '')
-        }
-        for text in texts
-    ]
+
+    blocks: list[ocr_analysis]
+    texts = None
+    if text_blocks != None:
+        blocks = [
+            {**b, 'text': b['text'].replace('_', '')}
+            for b in blocks_in_region(text_blocks, top_y, low_y, left_x, right_x)
+        ]
+        if len(blocks) == 0:
+            raise Exception('Header blocks had no text in the water section')
+    else:
+        texts = ocr_water_info.ocr(water_color, cls=False)[0]
+        if texts == None or len(texts) == 0:
+            raise Exception('OCR could not find any text in the water section')
+        
+        # Convert these to the much nicer ocr_analysis
+        blocks = [
+            {
+                'coords_group': text[0],
+                'confidence': text[1][1],
+                'page_offset': { 'x': 0, 'y': 0 },
+                'text': text[1][0].replace('_', '')
+            }
+            for text in texts
+        ]
 
     logger.debug('-- Found these texts --')
     for b in blocks:
         logger.debug(f'"{b["text"]}" : {b["confidence"]}')
 
-    if draw_visuals:
+    if draw_visuals and texts != None:
         with_text = draw_ocr_text_bounds(texts, water_color)
         imsave(os.path.join(visuals_folder, 'water_hedaer.png'), with_text)
 
@@ -208,7 +233,8 @@ def __get_header_info(structure: Table_Structure|Table_Structure_Half,
                       known_page: int | None,
                       known_page_limit: int | None,
                       draw_visuals=False,
-                      visuals_folder='visuals') -> Header_Obj:
+                      visuals_folder='visuals',
+                      text_blocks: list[ocr_analysis] | None = None) -> Header_Obj:
 
     logger.debug('Finding header')
     
@@ -223,26 +249,40 @@ def __get_header_info(structure: Table_Structure|Table_Structure_Half,
 
     header_color[cut_top:, cut_left:] = 255
 
-    texts = ocr_header_info.ocr(header_color, cls=False)[0]
-    if texts == None or len(texts) == 0:
-        raise Exception('OCR could not find any text in the header')
-
-    # Convert these to the much nicer ocr_analysis
-    blocks: list[ocr_analysis] = [
-        {
-            'coords_group': text[0],
-            'confidence': text[1][1],
-            'page_offset': { 'x': 0, 'y': 0 },
-            'text': text[1][0].replace('_', '')
-        }
-        for text in texts
-    ]
+    blocks: list[ocr_analysis]
+    texts = None
+    if text_blocks != None:
+        # Same crop and same blanked out corner, just with blocks that were
+        # already found
+        blocks = [
+            {**b, 'text': b['text'].replace('_', '')}
+            for b in blocks_in_region(text_blocks, 0, header_bottom, header_left, color_image.shape[1])
+            if not (center_ocr_coords(b['coords_group'])[1] >= cut_top and
+                    center_ocr_coords(b['coords_group'])[0] >= cut_left)
+        ]
+        if len(blocks) == 0:
+            raise Exception('Header blocks had no text in the header')
+    else:
+        texts = ocr_header_info.ocr(header_color, cls=False)[0]
+        if texts == None or len(texts) == 0:
+            raise Exception('OCR could not find any text in the header')
+
+        # Convert these to the much nicer ocr_analysis
+        blocks = [
+            {
+                'coords_group': text[0],
+                'confidence': text[1][1],
+                'page_offset': { 'x': 0, 'y': 0 },
+                'text': text[1][0].replace('_', '')
+            }
+            for text in texts
+        ]
 
     logger.debug('-- Found these texts --')
     for b in blocks:
         logger.debug(f'"{b["text"]}" : {b["confidence"]}')
 
-    if draw_visuals:
+    if draw_visuals and texts != None:
         with_text = draw_ocr_text_bounds(texts, header_color)
         imsave(os.path.join(visuals_folder, 'head_test.png'), with_text)
 
@@ -0,0 +1,73 @@
+"""
+The page numbers, the header fields, and the water levels are all in the strip
+of the page above the table. Each of them used to crop out its own piece of
+that strip and OCR it, so the same text got found and read up to three times a
+page.
+
+Now the strip gets OCR'd once, right after the page's structure is found, and
+the blocks come back in page coordinates just like a text layer's would. Each
+of the three then takes its region out of them with blocks_in_region, same as
+the text layer pages have been doing.
+"""
+
+import logging
+import os
+from math import floor
+import numpy as np
+from paddleocr import PaddleOCR
+from skimage.io import imsave
+from xplorer_tools.types import *
+from xplorer_tools.batched_ocr import ocr_images
+from detect_structure.helpers.draw_ocr_text_bounds import draw_ocr_text_bounds
+from detect_structure.helpers.table_structure.table_structure import Table_Structure
+from detect_structure.helpers.table_structure.table_structure_half import Table_Structure_Half
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a change here would find different text in the header. See
+# Stage_Memo
+HEADER_BAND_VERSION = '1'
+
+# The strip is about as wide as the page. Letting the detector look at it at
+# (close to) full size keeps the small print in the water box readable, the
+# default 960 would shrink it by more than half
+HEADER_DETECTION_LIMIT = 2560
+
+
+def read_header_band(ocr_cls_false: PaddleOCR,
+                     color_image: np.ndarray,
+                     structure: Table_Structure | Table_Structure_Half,
+                     draw_visuals=False,
+                     visuals_folder='visuals') -> list[ocr_analysis]:
+    """
+    Everything above the table, from the description column's left edge (or
+    the middle of the page if that's further left) over to the right edge
+    """
+
+    band_bottom = floor(structure.table_top.average_y) - 2
+    band_left = min(floor(structure.left_half['full_description'][0].average_x),
+                    floor(color_image.shape[1] / 2))
+    band_left = max(band_left, 0)
+
+    logger.debug(f'Reading header band {[0, band_bottom, band_left, color_image.shape[1]]}')
+
+    band = color_image[:band_bottom, band_left:]
+    texts = ocr_images(ocr_cls_false, [band], cls=False, limit_side_len=HEADER_DETECTION_LIMIT)[0]
+    logger.debug(f'Found {len(texts)} texts in the header band')
+
+    if draw_visuals:
+        with_text = draw_ocr_text_bounds(texts, band, in_place=False)
+        imsave(os.path.join(visuals_folder, 'header_band.png'), with_text)
+
+    # Back to page coordinates so blocks_in_region can cut it up
+    blocks: list[ocr_analysis] = [
+        {
+            'coords_group': tuple((p[0] + band_left, p[1]) for p in text[0]), # type: ignore
+            'confidence': text[1][1],
+            'page_offset': { 'x': 0, 'y': 0 },
+            'text': text[1][0]
+        }
+        for text in texts
+    ]
+
+    return blocks
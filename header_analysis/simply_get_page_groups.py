@@ -22,40 +22,58 @@ import numpy as np
 from paddleocr import PaddleOCR
 from skimage.io import imsave
 from xplorer_tools.types import *
-from detect_structure.helpers.find_descriptions.block_operations import join_horizontal_blocks
+from detect_structure.helpers.find_descriptions.block_operations import join_horizontal_blocks, blocks_in_region
 from detect_structure.helpers.draw_ocr_text_bounds import draw_ocr_text_bounds
 from header_analysis.find_pages import find_pages
 from header_analysis.find_page_groups import doc_state
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever a change here would read page numbers differently. See
+# Stage_Memo
+PAGE_NUMS_VERSION = '2'
 
-def get_page_nums(ocr_cls_false: PaddleOCR, color_image: np.ndarray, draw_visuals=False, visuals_folder='visuals') -> tuple[int | None, int | None]:
+
+def get_page_nums(ocr_cls_false: PaddleOCR,
+                  color_image: np.ndarray,
+                  draw_visuals=False,
+                  visuals_folder='visuals',
+                  text_blocks: list[ocr_analysis] | None = None) -> tuple[int | None, int | None]:
+    """
+    Pass the page's header blocks in as `text_blocks` (from its text layer, or
+    from read_header_band) and no OCR happens here at all. The top of the page
+    only gets OCR'd on its own when they aren't there
+    """
 
     # Crop to the top 30% and right 50%
     left = floor(color_image.shape[1] / 2)
     bottom = floor(color_image.shape[0]*0.13)
     crop_top = color_image[:bottom, left:]
 
-    # Get text blocks
-    texts = ocr_cls_false.ocr(crop_top, cls=False)[0]
-    if texts == None:
-        raise Exception('Second scan of page top gave no text? Is this possible?')
-
-    # Convert these to the much nicer ocr_analysis
-    blocks: list[ocr_analysis] = [
-        {
-            'coords_group': text[0],
-            'confidence': text[1][1],
-            'page_offset': { 'x': 0, 'y': 0 },
-            'text': text[1][0]
-        }
-        for text in texts
-    ]
+    blocks: list[ocr_analysis]
+    texts = None
+    if text_blocks != None:
+        blocks = blocks_in_region(text_blocks, 0, bottom, left, color_image.shape[1])
+    else:
+        # Get text blocks
+        texts = ocr_cls_false.ocr(crop_top, cls=False)[0]
+        if texts == None:
+            raise Exception('Second scan of page top gave no text? Is this possible?')
+
+        # Convert these to the much nicer ocr_analysis
+        blocks = [
+            {
+                'coords_group': text[0],
+                'confidence': text[1][1],
+                'page_offset': { 'x': 0, 'y': 0 },
+                'text': text[1][0]
+            }
+            for text in texts
+        ]
 
     blocks = join_horizontal_blocks(blocks, lateral_threshold=16)
 
-    if draw_visuals:
+    if draw_visuals and texts != None:
         path = os.path.join(visuals_folder, f'page_top_get_nums.png')
         with_text = draw_ocr_text_bounds(texts, crop_top, in_place=False)
         imsave(path, with_text)
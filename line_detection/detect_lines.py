@@ -1,5 +1,4 @@
 from functools import reduce
-import json
 import logging
 import os
 from typing import Any, Literal
@@ -8,13 +7,11 @@ from pathlib import Path
 from numpy import ndarray
 from skimage.io import imsave
 from xplorer_tools.segment_operations import Segment, segment_add
-from xplorer_tools.types import Coordinate
+from xplorer_tools.result_cache import get_result_cache
+from xplorer_tools.find_content_hash import find_content_hash_cached
 from line_detection.helpers.draw_visuals import *
 from line_detection.helpers.get_line_segments import get_line_segments
-
-CACHE_LOCATION = r'.\ProcessingReports\line_detection\lineCache.json'
-line_cache: dict[str, dict[int, tuple[list[tuple[Coordinate, Coordinate]], list[tuple[Coordinate, Coordinate]]]]]
-cache_read = False
+from line_detection.helpers.find_raw_segments import Line_Backend
 
 OFF_CONSTANT = 1/40 * np.pi
 base = 0 + np.pi/2
@@ -24,58 +21,44 @@ verticals = np.linspace(0 - OFF_CONSTANT, 0 + OFF_CONSTANT, 32, endpoint=True)
 
 logger = logging.getLogger(__name__)
 
-def check_cache(key: str, page_num: int) -> tuple[list[Segment], list[Segment]] | Literal[False]:
-    global line_cache, cache_read
+# Bump this whenever a change here (or in get_line_segments) would find
+# different lines. Old cache entries stop getting used once it changes
+LINES_VERSION = '2'
 
-    page = str(page_num)
-    
-    if not cache_read:
-        if os.path.exists(CACHE_LOCATION):
-            with open(CACHE_LOCATION) as file:
-                logger.debug('Reading line cache file')
-                line_cache = json.load(file)
-        else:
-            logger.debug('No cache file found, creating empty cache array')
-            line_cache = {}
-        
-        cache_read = True
+def lines_version(line_backend: Line_Backend, pyramid_scale: int, cache_tag='') -> str:
+    """
+    `cache_tag` is for anything that happened to the page before it got here
+    (how it was straightened) that would change what lines are on it
+    """
+    return f'{LINES_VERSION}-{line_backend}-x{pyramid_scale}-{cache_tag}'
+
+def check_cache(path: str, page_num: int, version: str) -> tuple[list[Segment], list[Segment]] | Literal[False]:
 
     logger.debug('Checking line cache')
-    
-    if key in line_cache and page in line_cache[key]:
-        # Prep the segments for return
-        h_cache =  line_cache[key][page][0]
-        v_cache =  line_cache[key][page][1]
-        
-        horizontals = [Segment(h[0], h[1]) for h in h_cache]
-        verticals = [Segment(v[0], v[1]) for v in v_cache]
-        
-        return horizontals, verticals
-    else:
+
+    hit = get_result_cache().get('lines', find_content_hash_cached(path), page_num, version)
+    if hit == None:
         return False
 
+    # Prep the segments for return
+    h_cache, v_cache = hit
 
-def update_cache(key_str: str, page: int, value: tuple[list[Segment], list[Segment]]) -> None:
+    horizontals = [Segment(h[0], h[1]) for h in h_cache]
+    verticals = [Segment(v[0], v[1]) for v in v_cache]
 
-    if not cache_read:
-        check_cache('', 0)
-    
-    # Prep the segments for file
-    # arr_str_1 = '||'.join([s.toJSON() for s in value[0]])
-    # arr_str_2 = '||'.join([s.toJSON() for s in value[1]])
-    
-    if key_str not in line_cache:
-        line_cache[key_str] = {}
-        
-    line_cache[key_str][page] = ([s.toSerializable() for s in value[0]], [s.toSerializable() for s in value[1]])
+    return horizontals, verticals
+
+
+def update_cache(path: str, page_num: int, version: str, value: tuple[list[Segment], list[Segment]]) -> None:
+
+    # Prep the segments for storage, Segment ids aren't worth keeping
+    entry = ([s.toSerializable() for s in value[0]], [s.toSerializable() for s in value[1]])
 
-    logger.debug('Writing cache, wait...')
-    with open(CACHE_LOCATION, 'w') as file:
-        json.dump(line_cache, file)
-    logger.debug('Done')
+    get_result_cache().put('lines', find_content_hash_cached(path), page_num, version, entry)
+    logger.debug('Line cache updated')
 
 
-def detect_lines(gray_image: ndarray[Any, Any], color_image: ndarray[Any, Any], use_cache=False, path='', page=-1, draw_visuals=False, visuals_folder='visuals') -> tuple[list[Segment], list[Segment]]:
+def detect_lines(gray_image: ndarray[Any, Any], color_image: ndarray[Any, Any], use_cache=False, path='', page=-1, draw_visuals=False, visuals_folder='visuals', line_backend: Line_Backend='skimage', pyramid_scale=1, cache_tag='') -> tuple[list[Segment], list[Segment]]:
 
     if draw_visuals:
         Path(visuals_folder).mkdir(parents=True, exist_ok=True)
@@ -83,8 +66,9 @@ def detect_lines(gray_image: ndarray[Any, Any], color_image: ndarray[Any, Any],
 
 
     # Check the line cache first
+    version = lines_version(line_backend, pyramid_scale, cache_tag)
     if use_cache:
-        potential_hit = check_cache(path, page)
+        potential_hit = check_cache(path, page, version)
         if potential_hit:
             logger.debug('Found cache entry, skipping line detection')
             if draw_visuals:
@@ -116,7 +100,9 @@ def detect_lines(gray_image: ndarray[Any, Any], color_image: ndarray[Any, Any],
         max_angle_difference=np.pi / 3,
         base_angle={'x': 0, 'y': 1},
         compress_maximum=280,
-        project_onto='v')
+        project_onto='v',
+        line_backend=line_backend,
+        pyramid_scale=pyramid_scale)
     
     # Sometimes (e.g. Adams County/001-0019 SOIL 2002.pdf), because weird people
     # scanned the document in weird, you get a page plus some space off to the
@@ -146,7 +132,9 @@ def detect_lines(gray_image: ndarray[Any, Any], color_image: ndarray[Any, Any],
             max_angle_difference=np.pi / 3,
             base_angle={'x': 0, 'y': 1},
             compress_maximum=280,
-            project_onto='v')
+            project_onto='v',
+            line_backend=line_backend,
+            pyramid_scale=pyramid_scale)
 
     logger.debug('Done with verticals')
 
@@ -160,7 +148,9 @@ def detect_lines(gray_image: ndarray[Any, Any], color_image: ndarray[Any, Any],
         alongside_gap=25,
         max_angle_difference=np.pi/5,
         compress_maximum=121,
-        project_onto='h')
+        project_onto='h',
+        line_backend=line_backend,
+        pyramid_scale=pyramid_scale)
     
     # Specifically for the full page, there sometimes is some text that is off
     # to the left side of the page (e.g. Adams County/001-0507 SOIL 2009.pdf
@@ -170,7 +160,7 @@ def detect_lines(gray_image: ndarray[Any, Any], color_image: ndarray[Any, Any],
     
     # Update the line cache with our new result
     if use_cache:
-        update_cache(path, page, (combined_horizontal, combined_vertical))
+        update_cache(path, page, version, (combined_horizontal, combined_vertical))
 
     if draw_visuals:
         shape = color_image.shape
@@ -1,5 +1,7 @@
 from math import pi, atan
+from typing import Sequence
 from xplorer_tools.segment_operations import Segment
+from xplorer_tools.segment_array import Segment_Array
 
 
 def create_segments(raw_segments: list[tuple[tuple[float, float], tuple[float, float]]]) -> list[Segment]:
@@ -11,4 +13,10 @@ def create_segments(raw_segments: list[tuple[tuple[float, float], tuple[float, f
             {'x': segment[1][0], 'y': segment[1][1]}
         ))
 
-    return ret
\ No newline at end of file
+    return ret
+
+def create_segment_array(raw_segments: Sequence[tuple[tuple[float, float], tuple[float, float]]]) -> Segment_Array:
+    """
+    Same thing without making a Segment for every one of them
+    """
+    return Segment_Array.from_raw(raw_segments)
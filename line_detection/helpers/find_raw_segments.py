@@ -0,0 +1,209 @@
+"""
+Where the segments going into get_line_segments come from. skimage's
+probabilistic_hough_line is what everything was built on, but it's slow on a
+full 300 DPI page and the orientation guess runs it over and over. OpenCV is
+already installed for PaddleOCR, so there are two faster ways to get the same
+kind of segments out of it
+
+'opencv_hough'
+    cv2.HoughLinesP with the same line length and gap. It doesn't take a set of
+    angles like skimage does, so anything outside of the angles asked for gets
+    thrown out afterwards.
+
+'morphology'
+    Opening the page with a long, thin kernel wipes out everything that isn't a
+    long line running that direction. Every blob that's left is a line. Only
+    works for angles right around horizontal or vertical, which is all the
+    table lines are after the page has been straightened.
+
+All of them hand back the same ((x1, y1), (x2, y2)) tuples skimage does, so
+create_segments doesn't know the difference.
+
+Any of them can also be run coarse to fine with `pyramid_scale`. The table
+lines are hundreds of pixels long, so they still show up just fine on a copy of
+the page shrunk down 2 to 4 times. Lines get found on that first, then the
+backend runs again at full size, but only on narrow strips around what it found.
+Everything else on the page (mostly text) gets blanked out for that second
+pass. Both of the Hough backends only do work for the pixels that are lit, so
+that's where the time gets saved.
+"""
+
+import logging
+from math import pi
+from typing import Literal
+import numpy as np
+from skimage.transform import probabilistic_hough_line
+
+logger = logging.getLogger(__name__)
+
+Line_Backend = Literal['skimage', 'opencv_hough', 'morphology']
+
+# skimage's default, used for HoughLinesP too so they agree on what a line is
+HOUGH_THRESHOLD = 10
+
+raw_segment_list = list[tuple[tuple[int, int], tuple[int, int]]]
+
+
+def find_raw_segments(
+        image: np.ndarray,
+        thetas: np.ndarray,
+        line_length: int,
+        line_gap: int,
+        backend: Line_Backend='skimage',
+        pyramid_scale=1) -> raw_segment_list:
+    """
+    `image` is inverted like probabilistic_hough_line wants it, anything that
+    isn't 0 is ink. `thetas` are the angles of the normals of the lines to look
+    for, same as skimage. A `pyramid_scale` above 1 looks on an image that
+    much smaller first
+    """
+
+    if pyramid_scale > 1:
+        image = __keep_strips_around_lines(image, thetas, line_length, line_gap, backend, pyramid_scale)
+
+    return __find_at_full_size(image, thetas, line_length, line_gap, backend)
+
+def __find_at_full_size(image: np.ndarray, thetas: np.ndarray, line_length: int, line_gap: int, backend: Line_Backend) -> raw_segment_list:
+
+    if backend == 'opencv_hough':
+        return __find_with_opencv_hough(image, thetas, line_length, line_gap)
+    elif backend == 'morphology':
+        return __find_with_morphology(image, thetas, line_length, line_gap)
+
+    return probabilistic_hough_line(image, line_length=line_length, theta=thetas, line_gap=line_gap)
+
+def __shrink(image: np.ndarray, scale: int) -> np.ndarray:
+    """
+    Every scale x scale block becomes its brightest pixel. Taking the max
+    instead of the average keeps 1px lines from fading out
+    """
+
+    height, width = image.shape[:2]
+    pad_h = (-height) % scale
+    pad_w = (-width) % scale
+    if pad_h or pad_w:
+        image = np.pad(image, ((0, pad_h), (0, pad_w)))
+
+    return image.reshape(image.shape[0] // scale, scale, image.shape[1] // scale, scale).max(axis=(1, 3))
+
+def __keep_strips_around_lines(image: np.ndarray,
+                               thetas: np.ndarray,
+                               line_length: int,
+                               line_gap: int,
+                               backend: Line_Backend,
+                               scale: int) -> np.ndarray:
+    """
+    The full size image with everything blanked out except narrow strips
+    around the lines found on the shrunk down one
+    """
+
+    small = __shrink(image, scale)
+    candidates = __find_at_full_size(small,
+                                     thetas,
+                                     max(line_length // scale, 1),
+                                     max(-(-line_gap // scale), 1),
+                                     backend)
+
+    height, width = image.shape[:2]
+    keep = np.zeros((height, width), dtype=bool)
+
+    # A shrunk pixel could be anywhere in its block, give it some room
+    margin = 2 * scale
+
+    # Hough on the shrunk image rarely finds a line all the way to its ends,
+    # and sometimes finds it as a couple of pieces. Strips reach this much
+    # further along the line at each end so the full size pass sees the
+    # whole thing, and the gap between two pieces of a line doesn't get
+    # blanked out
+    reach = line_gap + line_length // 2 + margin
+    for (x1, y1), (x2, y2) in candidates:
+        along_x = abs(x2 - x1) >= abs(y2 - y1)
+        left = max(min(x1, x2) * scale - (reach if along_x else margin), 0)
+        right = min((max(x1, x2) + 1) * scale + (reach if along_x else margin), width)
+        top = max(min(y1, y2) * scale - (margin if along_x else reach), 0)
+        bottom = min((max(y1, y2) + 1) * scale + (margin if along_x else reach), height)
+        keep[top:bottom, left:right] = True
+
+    logger.debug(f'{len(candidates)} candidate lines, looking at {keep.mean():.1%} of the page at full size')
+
+    return np.where(keep, image, 0).astype(image.dtype, copy=False)
+
+def __theta_step(thetas: np.ndarray) -> float:
+    if len(thetas) < 2:
+        return pi / 180
+    return float(abs(thetas[1] - thetas[0]))
+
+def __find_with_opencv_hough(image: np.ndarray, thetas: np.ndarray, line_length: int, line_gap: int) -> raw_segment_list:
+    import cv2
+
+    binary = np.ascontiguousarray((image > 0).astype(np.uint8) * 255)
+    step = __theta_step(thetas)
+
+    found = cv2.HoughLinesP(binary, rho=1, theta=step, threshold=HOUGH_THRESHOLD,
+                            minLineLength=line_length, maxLineGap=line_gap)
+
+    if found is None:
+        return []
+
+    lines = found.reshape(-1, 4)
+
+    # Angle of each line's normal, the way skimage measures it. Folded into
+    # [-pi/2, pi/2) so it can be compared against thetas no matter which way
+    # the line points
+    normals = np.arctan2(lines[:, 3] - lines[:, 1], lines[:, 2] - lines[:, 0]) + pi/2
+    normals = (normals + pi/2) % pi - pi/2
+
+    low = float(np.min(thetas)) - step
+    high = float(np.max(thetas)) + step
+
+    keep = np.zeros(len(lines), dtype=bool)
+    for shift in (-pi, 0, pi):
+        keep |= (normals + shift >= low) & (normals + shift <= high)
+
+    return [((int(l[0]), int(l[1])), (int(l[2]), int(l[3]))) for l in lines[keep]]
+
+def __find_with_morphology(image: np.ndarray, thetas: np.ndarray, line_length: int, line_gap: int) -> raw_segment_list:
+    import cv2
+
+    binary = np.ascontiguousarray((image > 0).astype(np.uint8) * 255)
+
+    # Normals around 0 are vertical lines, around pi/2 horizontal
+    middle = float(np.mean(thetas))
+    vertical = abs(np.sin(middle)) < abs(np.cos(middle))
+
+    if vertical:
+        bridge = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(line_gap, 1)))
+        keep_long = cv2.getStructuringElement(cv2.MORPH_RECT, (1, line_length))
+    else:
+        bridge = cv2.getStructuringElement(cv2.MORPH_RECT, (max(line_gap, 1), 1))
+        keep_long = cv2.getStructuringElement(cv2.MORPH_RECT, (line_length, 1))
+
+    # Close up gaps the same size Hough would have jumped, then anything that
+    # can't hold the whole kernel goes away
+    lines = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, bridge)
+    lines = cv2.morphologyEx(lines, cv2.MORPH_OPEN, keep_long)
+
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(lines, connectivity=8)
+
+    raw: raw_segment_list = []
+    for label in range(1, count):
+        x, y, w, h, _ = stats[label]
+
+        if vertical:
+            if h < line_length:
+                continue
+            # Follow the blob from top to bottom so slightly crooked lines keep
+            # their lean
+            ys, xs = np.nonzero(labels[y:y + h, x:x + w] == label)
+            top = xs[ys == ys.min()].mean() + x
+            bottom = xs[ys == ys.max()].mean() + x
+            raw.append(((int(round(top)), int(y)), (int(round(bottom)), int(y + h - 1))))
+        else:
+            if w < line_length:
+                continue
+            ys, xs = np.nonzero(labels[y:y + h, x:x + w] == label)
+            left = ys[xs == xs.min()].mean() + y
+            right = ys[xs == xs.max()].mean() + y
+            raw.append(((int(x), int(round(left))), (int(x + w - 1), int(round(right)))))
+
+    return raw
@@ -0,0 +1,613 @@
+"""
+Hough gives back a lot of little pieces of the same line, and these functions
+glue them back together.
+
+The classic merge is the original nested loop. Every segment gets compared
+against the ones after it (wrapping around to the start) until one of them is
+too far off in angle, was already compared with it, or merges with it. After
+every merge it re-sorts everything and starts back over at the beginning. A
+noisy page with a few thousand segments takes forever, and almost all of that
+time goes to comparing segments on opposite ends of the page.
+
+The bucketed merge does the exact same thing, comparison for comparison, and
+gives back the exact same lines in the same order. It just splits what the
+classic merge would look at into two buckets before looking at any of it. A
+pair can only stop the scan or merge if it was already compared, is off in
+angle, or sits close enough together for one of the merge cases to apply.
+Those get checked one at a time with the same checks the classic merge uses.
+Everything else is a failed comparison no matter what, so all of those get
+marked as failed in one go with NumPy. Which pairs have been compared is kept
+in a bit matrix instead of the compare_fails lists, and the run of segments
+after a merge that only get as far as "already compared with the next one" is
+skipped in one go too.
+"""
+
+import logging
+from math import pi, sqrt
+from copy import deepcopy
+from typing import Literal
+import numpy as np
+from xplorer_tools.angle_operations import angle_between_two_lines
+from xplorer_tools.segment_array import Segment_Array, ON_SEGMENT_SLACK
+from xplorer_tools.segment_operations import Segment, check_segments_equivalent, segments_do_intersect, segment_project_from, check_point_is_on_segment
+from xplorer_tools.vector_operations import vector_subtract, check_is_NaN
+from xplorer_tools.distance_operations import square_distance, square_length
+from xplorer_tools.types import Vector, Coordinate
+from line_detection.helpers.find_average_of_alongside_lines import find_average_of_alongside_lines
+from line_detection.helpers.find_average_of_intersecting_lines import find_average_of_intersecting_lines
+from xplorer_tools.stringify_types import str_coord
+
+logger = logging.getLogger(__name__)
+comparisons_skipped: int = 0
+
+Merge_Engine = Literal['bucketed', 'classic']
+
+# np.arctan and math.atan can disagree in the last digit, so anything this
+# close to the angle threshold gets checked the slow way
+ANGLE_SLACK = 1e-9
+
+
+def merge_segments(
+        line_segments: list[Segment],
+        angle_threshold: float,
+        compress_maximum: float,
+        alongside_gap: float,
+        max_angle_difference: float,
+        base_angle: Vector,
+        engine: Merge_Engine='bucketed') -> list[Segment]:
+
+    if engine == 'classic':
+        return merge_segments_classic(line_segments, angle_threshold, compress_maximum,
+                                      alongside_gap, max_angle_difference, base_angle)
+
+    return merge_segments_bucketed(line_segments, angle_threshold, compress_maximum,
+                                   alongside_gap, max_angle_difference, base_angle)
+
+def merge_segments_classic(
+        line_segments: list[Segment],
+        angle_threshold: float,
+        compress_maximum: float,
+        alongside_gap: float,
+        max_angle_difference: float,
+        base_angle: Vector) -> list[Segment]:
+    """
+    Merges `line_segments` in place and returns it. Expects it to already be
+    sorted how the caller wants it
+    """
+
+    global comparisons_skipped
+
+    index = 0
+    while index < len(line_segments):
+
+        offset = 1
+        advance_index = True
+
+        while offset < len(line_segments):
+
+            curr = line_segments[index]
+            next = line_segments[(index + offset) % len(line_segments)]
+
+            if curr.id in next.compare_fails:
+                comparisons_skipped += 1
+                break
+
+            logger.debug(f'Comparing {index} and {(index+offset) % len(line_segments)}')
+            logger.debug(f'Curr: {curr}')
+            logger.debug(f'Next: {next}')
+
+            # Are they close enough in angle
+            angle_dif = angle_between_two_lines(curr, next)
+            if not angle_dif <= angle_threshold:
+                # If the angle difference between them is too big, back out
+                logger.debug('Angle difference is too big')
+                curr.add_compare_fail(next.id)
+                next.add_compare_fail(curr.id)
+                break
+
+            # Check for the special case where they are the same
+            if check_segments_equivalent(curr, next):
+                # If so, get rid of the redundant one
+                line_segments.pop((index + offset) % len(line_segments))
+                logger.debug('equivalent')
+                continue
+
+            new_segment = __find_merged_segment(curr, next, compress_maximum, alongside_gap)
+
+            if new_segment != None:
+
+                # Check to see if the angle produced by this exceeds the maximum
+                # specified
+                angle_between = angle_between_two_lines(new_segment, base_angle)
+                if angle_between > max_angle_difference:
+                    logger.debug('Angle between the new segment and the base angle too big')
+                    offset += 1
+                    curr.add_compare_fail(next.id)
+                    next.add_compare_fail(curr.id)
+                    continue
+
+                # Insert it into the list
+
+                if check_is_NaN(new_segment.pt_1) or check_is_NaN(new_segment.pt_2):
+                    logger.debug(new_segment)
+                    raise Exception('Found NaN segment')
+
+                line_segments[index] = new_segment
+                removed = line_segments.pop((index + offset) % len(line_segments))
+                if not check_segments_equivalent(next, removed):
+                    logger.debug('We did not remove the right one!')
+                    raise Exception('We did not remove the right one!')
+
+                line_segments.sort(key=lambda x: x.angle)
+
+                # There may be a more efficient way to continue, but this is
+                # only being done once and the result is being cached. Bite me.
+                index = 0
+                advance_index = False
+                break
+            else:
+                curr.add_compare_fail(next.id)
+                next.add_compare_fail(curr.id)
+
+            offset += 1
+
+        if advance_index:
+            index += 1
+
+    return line_segments
+
+def merge_segments_bucketed(
+        line_segments: list[Segment],
+        angle_threshold: float,
+        compress_maximum: float,
+        alongside_gap: float,
+        max_angle_difference: float,
+        base_angle: Vector) -> list[Segment]:
+    """
+    Merges `line_segments` in place and returns it, same as
+    merge_segments_classic and with the same result. See the top of this file
+    for how it gets there quicker
+    """
+
+    global comparisons_skipped
+
+    # Every merge case needs the segments to be within this many pixels of
+    # each other. The thresholds are compared against squared distances
+    reach = sqrt(max(compress_maximum, alongside_gap, 0)) + 1
+
+    # Each segment gets a slot for its points and which segments it has been
+    # compared with. slots[i] is the slot of line_segments[i]. A merged
+    # segment takes over one of the slots of the two it came from
+    count = len(line_segments)
+    slots = list(range(count))
+    points = np.zeros((count, 4))
+    boxes = np.zeros((count, 4))
+    compared = np.zeros((count, (count + 7) // 8), dtype=np.uint8)
+
+    slot_of_id = {s.id: slot for slot, s in enumerate(line_segments)}
+    for slot, segment in enumerate(line_segments):
+        __fill_slot(points, boxes, slot, segment)
+        earlier = [slot_of_id[i] for i in segment.compare_fails if i in slot_of_id]
+        if len(earlier) > 0:
+            __mark_compared(compared, slot, np.array(earlier))
+
+    # Whether each segment was already compared with the one after it. Only
+    # good until line_segments changes
+    next_compared: np.ndarray | None = None
+
+    index = 0
+    while index < len(line_segments):
+
+        # The classic merge gives up on a segment right away if the one after
+        # it was already compared with it. After a merge that's most of them
+        if len(line_segments) > 1:
+            if next_compared is None:
+                slot_array = np.array(slots)
+                next_compared = __were_compared_pairs(compared, slot_array, np.roll(slot_array, -1))
+            not_compared = np.flatnonzero(~next_compared[index:])
+            skip = int(not_compared[0]) if len(not_compared) > 0 else len(line_segments) - index
+            if skip > 0:
+                comparisons_skipped += skip
+                index += skip
+                continue
+
+        offset = 1
+        advance_index = True
+
+        while offset < len(line_segments):
+
+            curr = line_segments[index]
+            curr_slot = slots[index]
+            count = len(line_segments)
+
+            # Only the candidates in `stops` could do anything besides fail to
+            # merge with curr. The ones in between get marked as failed in
+            # bulk, the same as the classic merge would one at a time
+            first_offset = offset
+            candidates = np.array(slots)[(index + np.arange(offset, count)) % count]
+            stops = (first_offset + np.flatnonzero(__could_stop(compared, points, boxes, curr_slot, candidates,
+                                                                reach, angle_threshold))).tolist()
+
+            rescan = False
+            for stop in stops + [count]:
+
+                if stop > offset:
+                    __mark_compared(compared, curr_slot, candidates[offset - first_offset:stop - first_offset])
+                    offset = stop
+
+                if offset >= count:
+                    break
+
+                next_position = (index + offset) % count
+                next = line_segments[next_position]
+                next_slot = slots[next_position]
+
+                if __were_compared(compared, curr_slot, next_slot):
+                    comparisons_skipped += 1
+                    break
+
+                angle_dif = angle_between_two_lines(curr, next)
+                if not angle_dif <= angle_threshold:
+                    __mark_compared(compared, curr_slot, np.array([next_slot]))
+                    break
+
+                if check_segments_equivalent(curr, next):
+                    # Everything after it moves up one, so look again from the
+                    # same offset
+                    line_segments.pop(next_position)
+                    slots.pop(next_position)
+                    __forget_slot(compared, next_slot)
+                    next_compared = None
+                    rescan = True
+                    break
+
+                new_segment = __find_merged_segment(curr, next, compress_maximum, alongside_gap)
+
+                if new_segment == None or angle_between_two_lines(new_segment, base_angle) > max_angle_difference:
+                    __mark_compared(compared, curr_slot, np.array([next_slot]))
+                    offset += 1
+                    continue
+
+                if check_is_NaN(new_segment.pt_1) or check_is_NaN(new_segment.pt_2):
+                    logger.debug(new_segment)
+                    raise Exception('Found NaN segment')
+
+                # A deepcopy of either one keeps its id, and with it everything
+                # it was compared with
+                if new_segment.id == curr.id:
+                    new_slot = curr_slot
+                    __forget_slot(compared, next_slot)
+                elif new_segment.id == next.id:
+                    new_slot = next_slot
+                    __forget_slot(compared, curr_slot)
+                else:
+                    new_slot = curr_slot
+                    __forget_slot(compared, curr_slot)
+                    __forget_slot(compared, next_slot)
+                __fill_slot(points, boxes, new_slot, new_segment)
+
+                line_segments[index] = new_segment
+                slots[index] = new_slot
+                removed = line_segments.pop(next_position)
+                slots.pop(next_position)
+                if not check_segments_equivalent(next, removed):
+                    logger.debug('We did not remove the right one!')
+                    raise Exception('We did not remove the right one!')
+
+                # Stable, so it's the same order list.sort would give
+                order = sorted(range(len(line_segments)), key=lambda i: line_segments[i].angle)
+                line_segments[:] = [line_segments[i] for i in order]
+                slots = [slots[i] for i in order]
+                next_compared = None
+
+                index = 0
+                advance_index = False
+                break
+
+            if not rescan:
+                break
+
+        if advance_index:
+            index += 1
+
+    return line_segments
+
+def __find_merged_segment(curr: Segment, next: Segment, compress_maximum: float, alongside_gap: float) -> Segment | None:
+    """
+    What `curr` and `next` turn into if they're close enough to merge
+    """
+
+    # Case 1: segments intersect at some point
+    intersecting = segments_do_intersect(curr, next)
+    # Case 2: segments are close to each other
+    alongside = not intersecting and segments_sufficiently_close(curr, next, threshold=compress_maximum)
+    # Case 3: segment ends within threshold
+    ends_together = not intersecting and not alongside and segment_ends_within_threshold(curr, next, threshold=alongside_gap)
+    # Case 4: overlapping and parallel
+    overlap_par = not intersecting and not alongside and not ends_together and segments_overlap_parallel(curr, next, alongside_gap)
+
+    if not (intersecting or ends_together or alongside or overlap_par):
+        return None
+
+    new_segment: Segment
+
+    if alongside:
+        # Default to more complicated function
+        logger.debug('Alongside')
+        new_segment = find_average_of_alongside_lines(curr, next)
+    elif intersecting:
+        # Default to more complicated function
+        logger.debug('Intersecting')
+        new_segment = find_average_of_intersecting_lines(curr, next)
+    else:
+        if alongside:
+            logger.debug('Ends together')
+        else:
+            logger.debug('Overlapping and parallel')
+        # Just pick points that are farthest apart
+        distances = (
+            square_distance(curr.pt_1, next.pt_1),
+            square_distance(curr.pt_1, next.pt_2),
+            square_distance(curr.pt_2, next.pt_2),
+            square_distance(curr.pt_2, next.pt_1)
+        )
+
+        curr_len = square_distance(curr.pt_1, curr.pt_2)
+        next_len = square_distance(next.pt_1, next.pt_2)
+
+        # Check to see if it makes sense to use the farthest points
+        max_dist = max(distances)
+        farthest_pair = distances.index(max_dist)
+        if curr_len > max_dist:
+            # Collapse everything into curr
+            new_segment = deepcopy(curr)
+        elif next_len > max_dist:
+            # Collapse everything into next
+            new_segment = deepcopy(next)
+        else:
+
+            pt_1: Coordinate
+            pt_2: Coordinate
+            match farthest_pair:
+                case 0:
+                    pt_1 = curr.pt_1
+                    pt_2 = next.pt_1
+                case 1:
+                    pt_1 = curr.pt_1
+                    pt_2 = next.pt_2
+                case 2:
+                    pt_1 = curr.pt_2
+                    pt_2 = next.pt_2
+                case _: # For linting
+                    pt_1 = curr.pt_2
+                    pt_2 = next.pt_1
+
+            new_segment = Segment(pt_1, pt_2)
+
+    return new_segment
+
+def __fill_slot(points: np.ndarray, boxes: np.ndarray, slot: int, segment: Segment) -> None:
+    """
+    The box is everywhere a merge check could find a point on `segment`.
+    check_point_is_on_segment only looks at x unless the segment is vertical,
+    so on a steep segment that can be a ways past the ends in y. Plus a pixel
+    for rounding
+    """
+
+    x1, y1 = segment.pt_1['x'], segment.pt_1['y']
+    x2, y2 = segment.pt_2['x'], segment.pt_2['y']
+    points[slot] = (x1, y1, x2, y2)
+
+    if x2 - x1 == 0:
+        slack_x = 1.0
+        slack_y = ON_SEGMENT_SLACK + 1
+    else:
+        slack_x = ON_SEGMENT_SLACK + 1
+        slack_y = ON_SEGMENT_SLACK * abs((y2 - y1) / (x2 - x1)) + 1
+
+    boxes[slot] = (min(x1, x2) - slack_x, min(y1, y2) - slack_y, max(x1, x2) + slack_x, max(y1, y2) + slack_y)
+
+def __could_stop(
+        compared: np.ndarray,
+        points: np.ndarray,
+        boxes: np.ndarray,
+        curr_slot: int,
+        candidates: np.ndarray,
+        reach: float,
+        angle_threshold: float) -> np.ndarray:
+    """
+    Which of `candidates` the classic merge might do anything with besides
+    mark as failed. Errs on the side of True, NaN included
+    """
+
+    known = __were_compared(compared, curr_slot, candidates)
+
+    angles = angles_between_batch(Segment_Array(points[curr_slot]), Segment_Array(points[candidates]))
+    # angle_between_two_lines can divide by zero at a right angle, so those
+    # get the slow check too and raise the same way
+    crooked = ~(angles <= angle_threshold - ANGLE_SLACK) | (angles >= pi/2 - ANGLE_SLACK)
+
+    box = boxes[curr_slot]
+    others = boxes[candidates]
+    near = ~((others[:, 0] > box[2] + reach) | (others[:, 2] < box[0] - reach) |
+             (others[:, 1] > box[3] + reach) | (others[:, 3] < box[1] - reach))
+
+    return known | crooked | near
+
+# Which slots have been compared with which, one bit per pair, set both ways
+
+def __were_compared(compared: np.ndarray, slot: int, others):
+    return (compared[others, slot >> 3] >> (slot & 7)) & 1 == 1
+
+def __were_compared_pairs(compared: np.ndarray, firsts: np.ndarray, seconds: np.ndarray) -> np.ndarray:
+    return (compared[firsts, seconds >> 3] >> (seconds & 7)) & 1 == 1
+
+def __mark_compared(compared: np.ndarray, slot: int, others: np.ndarray) -> None:
+    """
+    `others` can't have repeats
+    """
+    compared[others, slot >> 3] |= np.uint8(1 << (slot & 7))
+    np.bitwise_or.at(compared[slot], others >> 3, (1 << (others & 7)).astype(np.uint8))
+
+def __forget_slot(compared: np.ndarray, slot: int) -> None:
+    compared[slot] = 0
+    compared[:, slot >> 3] &= np.uint8(~(1 << (slot & 7)) & 0xFF)
+
+def segment_ends_within_threshold(segment_1: Segment, segment_2: Segment, threshold=100) -> bool:
+    distances = [
+        square_distance(segment_1.pt_1, segment_2.pt_1),
+        square_distance(segment_1.pt_1, segment_2.pt_2),
+        square_distance(segment_1.pt_2, segment_2.pt_2),
+        square_distance(segment_1.pt_2, segment_2.pt_1)
+    ]
+    return min(distances) < threshold
+
+def check_within(segment: Segment, point: Coordinate, threshold: float, count_zero: int, count_close: int):
+    projection, _ = segment_project_from(segment, point)
+    dist_squared = square_length(vector_subtract(projection, point))
+    logger.debug(str_coord(projection))
+    logger.debug(str_coord(point))
+    logger.debug(dist_squared)
+
+    count_zero += dist_squared == 0
+    count_close += dist_squared < threshold and check_point_is_on_segment(segment, projection)
+
+    return count_close, count_zero
+
+
+def segments_sufficiently_close(left: Segment, right: Segment, threshold=200):
+    """
+    Detect lines that run alongside each other within a certain distance
+    """
+    logger.debug('Testing alongside')
+
+    count_close: int = 0
+    count_zero: int  = 0
+
+    count_close, count_zero = check_within(right, left.pt_1, threshold, count_zero, count_close)
+
+    count_close, count_zero = check_within(right, left.pt_2, threshold, count_zero, count_close)
+
+    count_close, count_zero = check_within(left, right.pt_1, threshold, count_zero, count_close)
+
+    count_close, count_zero = check_within(left, right.pt_2, threshold, count_zero, count_close)
+
+    logger.debug(f'count_close: {count_close}')
+
+    if count_zero == 4:
+        return False
+    else:
+        return count_close >= 2
+
+def segments_overlap_parallel(left: Segment, right: Segment, threshold: float):
+    """
+    Detect lines that are parallel and do overlap
+    """
+    logger.debug('Testing parallel')
+
+    count_close: int = 0
+    count_zero: int  = 0
+
+    count_close, count_zero = check_within(right, left.pt_1, threshold, count_zero, count_close)
+
+    count_close, count_zero = check_within(right, left.pt_2, threshold, count_zero, count_close)
+
+    count_close, count_zero = check_within(left, right.pt_1, threshold, count_zero, count_close)
+
+    count_close, count_zero = check_within(left, right.pt_2, threshold, count_zero, count_close)
+
+    return count_zero == 4 and count_close >= 2
+
+
+# Batched versions of the checks above. Each one takes either a single Segment
+# or a Segment_Array for `left` and a Segment_Array for `right`. A single
+# Segment gets checked against every row of `right`. Two arrays get checked
+# row against row, so they have to be the same length. What comes back is a
+# mask with one entry per row, matching what the scalar version would say.
+
+def __as_array(segment: Segment | Segment_Array) -> Segment_Array:
+    if isinstance(segment, Segment_Array):
+        return segment
+    return Segment_Array(np.array([[segment.pt_1['x'], segment.pt_1['y'], segment.pt_2['x'], segment.pt_2['y']]]))
+
+def angles_between_batch(left: Segment | Segment_Array, right: Segment_Array) -> np.ndarray:
+    """
+    angle_between_two_lines for every row
+    """
+    left = __as_array(left)
+
+    l_dx, l_dy = left.dx, left.dy
+    r_dx, r_dy = right.dx, right.dy
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m1 = l_dy / l_dx
+        m2 = r_dy / r_dx
+        general = np.arctan(np.abs((m1 - m2) / (1 + m1 * m2)))
+
+        return np.where((l_dx == 0) & (r_dx == 0), 0.0,
+               np.where(l_dx == 0, pi/2 - np.arctan(np.abs(m2)),
+               np.where(r_dx == 0, pi/2 - np.arctan(np.abs(m1)), general)))
+
+def could_merge_batch(left: Segment | Segment_Array, right: Segment_Array, compress_maximum: float, alongside_gap: float) -> np.ndarray:
+    """
+    Any of the cases the merge knows how to handle
+    """
+    return (segments_equivalent_batch(left, right) |
+            segments_do_intersect_batch(left, right) |
+            segments_sufficiently_close_batch(left, right, threshold=compress_maximum) |
+            segment_ends_within_threshold_batch(left, right, threshold=alongside_gap) |
+            segments_overlap_parallel_batch(left, right, alongside_gap))
+
+def segments_equivalent_batch(left: Segment | Segment_Array, right: Segment_Array) -> np.ndarray:
+    left = __as_array(left)
+
+    directly_equal = np.all(np.abs(left.points - right.points) < 0.01, axis=1)
+    oppositely_equal = np.all(np.abs(left.points[:, [2, 3, 0, 1]] - right.points) < 0.01, axis=1)
+
+    return directly_equal | oppositely_equal
+
+def segments_do_intersect_batch(left: Segment | Segment_Array, right: Segment_Array) -> np.ndarray:
+    return right.intersects(__as_array(left))
+
+def segment_ends_within_threshold_batch(left: Segment | Segment_Array, right: Segment_Array, threshold=100) -> np.ndarray:
+    left = __as_array(left)
+
+    distances = np.stack((
+        (left.x1 - right.x1) ** 2 + (left.y1 - right.y1) ** 2,
+        (left.x1 - right.x2) ** 2 + (left.y1 - right.y2) ** 2,
+        (left.x2 - right.x2) ** 2 + (left.y2 - right.y2) ** 2,
+        (left.x2 - right.x1) ** 2 + (left.y2 - right.y1) ** 2
+    ))
+
+    return distances.min(axis=0) < threshold
+
+def __count_within_batch(left: Segment_Array, right: Segment_Array, threshold: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The four check_within calls, all at once. Gives back count_close and
+    count_zero per row
+    """
+
+    rows = max(len(left), len(right))
+    count_close = np.zeros(rows, dtype=int)
+    count_zero = np.zeros(rows, dtype=int)
+
+    for segment, px, py in ((right, left.x1, left.y1),
+                            (right, left.x2, left.y2),
+                            (left, right.x1, right.y1),
+                            (left, right.x2, right.y2)):
+
+        proj_x, proj_y = segment.project_points(px, py)
+        dist_squared = (proj_x - px) ** 2 + (proj_y - py) ** 2
+
+        count_zero += dist_squared == 0
+        count_close += (dist_squared < threshold) & segment.contains_projected(proj_x, proj_y)
+
+    return count_close, count_zero
+
+def segments_sufficiently_close_batch(left: Segment | Segment_Array, right: Segment_Array, threshold=200) -> np.ndarray:
+    count_close, count_zero = __count_within_batch(__as_array(left), right, threshold)
+    return (count_zero != 4) & (count_close >= 2)
+
+def segments_overlap_parallel_batch(left: Segment | Segment_Array, right: Segment_Array, threshold: float) -> np.ndarray:
+    count_close, count_zero = __count_within_batch(__as_array(left), right, threshold)
+    return (count_zero == 4) & (count_close >= 2)
@@ -4,16 +4,25 @@ import multiprocessing.process
 import os
 import datetime
 import time
+import collections
 import concurrent.futures
+from typing import TYPE_CHECKING, Literal, cast, get_args
 from header_analysis.simply_get_page_groups import Page_Group_Builder
 from manage_outputs.manage_outputs import Output_Manager
 from document_agenda.output_information import Header_Sheet_Entry, Lithology_Sheet_Entry, Blowcount_Sheet_Entry
-from xplorer_tools.compile_ideal_batches import compile_ideal_batches, Ideal_Batch
+from xplorer_tools.ocr_worker_pool import OCR_Worker_Pool
+from xplorer_tools.memory_budget_scheduler import Memory_Budget_Scheduler
+from xplorer_tools.find_page_count_dict import Page_Info
+from xplorer_tools.fix_orientation import ROTATION_TOLERANCE
+from manage_outputs.processing_manifest import Processing_Manifest
 import numpy as np
 
 import logging
 import sys
 
+if TYPE_CHECKING:
+    from line_detection.helpers.find_raw_segments import Line_Backend
+
 def get_pdfs(dir: str) -> list[str]:
     pdfs = []
 
@@ -29,11 +38,36 @@ def get_pdfs(dir: str) -> list[str]:
     
     return pdfs
 
-def get_page_count_dict(queue, paths: list[str]) -> None:
-    from xplorer_tools.find_page_count_dict import find_page_count_dict
-    ret = find_page_count_dict(paths)
+def get_page_info_dict(queue, paths: list[str]) -> None:
+    from xplorer_tools.find_page_count_dict import find_page_info_dict
+    ret = find_page_info_dict(paths)
     queue.put(ret)
 
+def read_line_backend(config: ConfigParser, option: str) -> 'Line_Backend':
+    """
+    One of the line backend options out of config.ini. Anything that isn't a
+    backend find_raw_segments knows about would quietly end up as skimage, so
+    typos get caught here instead
+    """
+    from line_detection.helpers.find_raw_segments import Line_Backend
+
+    backend = config['BEHAVIOR'].get(option, 'skimage')
+    if backend not in get_args(Line_Backend):
+        raise ValueError(f'{option} in config.ini is "{backend}", it has to be one of {", ".join(get_args(Line_Backend))}')
+
+    return cast('Line_Backend', backend)
+
+def read_line_pyramid_scale(config: ConfigParser) -> int:
+    """
+    LinePyramidScale out of config.ini, 1 being off. Every place that looks
+    for lines uses the same one
+    """
+    scale = int(config['BEHAVIOR'].get('LinePyramidScale', '1'))
+    if scale < 1:
+        raise ValueError(f'LinePyramidScale in config.ini is {scale}, it has to be 1 or more')
+
+    return scale
+
 
 logger = logging.getLogger(__name__)
 def main():
@@ -43,22 +77,34 @@ def main():
     config = ConfigParser()
     config.read('config.ini')
     
+    line_backends: dict[str, Line_Backend] = {
+        'orientation': read_line_backend(config, 'OrientationLineBackend'),
+        'tables': read_line_backend(config, 'TableLineBackend')
+    }
+    line_pyramid_scale = read_line_pyramid_scale(config)
+
     pdfs_folder = config['BEHAVIOR']['PDFsParentFolder']
     logger.info(f'Looking for pdfs under {pdfs_folder}')
 
     pdfs = get_pdfs(pdfs_folder)
     logger.info(f'Found {len(pdfs)} pdfs to analyze')
 
-    out_putter = Output_Manager(config)
-    if not out_putter.success:
-        raise Exception('Output Manager failed to initialize')
+    manifest = Processing_Manifest()
+    incremental = config['BEHAVIOR'].get('IncrementalMode', 'no') == 'yes'
+
+    if incremental:
+        out_putter, to_do = start_incremental_run(config, manifest, pdfs)
+    else:
+        out_putter, to_do = start_resumable_run(config, manifest, pdfs)
+
+    index_of = manifest.find_file_indexes()
 
     logger.info('Finding pdf lengths')
 
     queue = multiprocessing.Queue()
-    getting_pages = multiprocessing.Process(target=get_page_count_dict, args=(queue, pdfs,))
+    getting_pages = multiprocessing.Process(target=get_page_info_dict, args=(queue, to_do,))
     getting_pages.start()
-    page_count_dict = queue.get()
+    page_info_dict = queue.get()
     getting_pages.join()
 
 
@@ -75,12 +121,10 @@ def main():
             #  r'./AnalyzingReports/IDOT_Dist6_Borings\Hancock County\034-0066 SOIL 2002.pdf'
             #  r'./AnalyzingReports/IDOT_Dist6_Borings\Brown County\005-0500 SOIL-ROCK 2007.pdf'
 
-    logger.info('Compiling ideal batches')
-    batches = compile_ideal_batches(page_count_dict, config, max_pages_per_batch=72)
-
-    all_paths = [path for batch in batches for path in batch['paths']]
-    if len(all_paths) != len(pdfs):
-        raise Exception(f'Batcher had different number of docs: {len(all_paths)}. Should be {len(pdfs)}')
+    scheduler = build_scheduler(config, page_info_dict)
+    worker_count = scheduler.find_worker_count()
+    logger.info(f'Memory budget is {scheduler.budget_bytes / 1024**3:.1f} GiB across at most {scheduler.core_count} cores')
+    logger.info(f'Using {worker_count} OCR workers')
 
     logger.info('Start X-ploring')
 
@@ -88,51 +132,208 @@ def main():
     # # test_file_till_error(r'./AnalyzingReports/IDOT_Dist6_Borings\Morgan County\069-0521 SOIL 2007.pdf')
     # return
 
-    fail_batch: Ideal_Batch = {
-        'max_workers': 1,
-        'paths': []
-    }
-    
-    cumulative_time = 0
-    total_processed = 0
-    for batch_index, batch in enumerate(batches):
+    pool = OCR_Worker_Pool(worker_count,
+                           max_files_per_worker=int(config['BEHAVIOR'].get('MaxFilesPerWorker', '40')),
+                           max_worker_memory_mib=float(config['BEHAVIOR'].get('MaxWorkerMemoryMiB', '4096')),
+                           file_kwargs={
+                               'page_workers': int(config['BEHAVIOR'].get('PageWorkers', '1')),
+                               'page_parallel_threshold': int(config['BEHAVIOR'].get('PageParallelThreshold', '6')),
+                               'prefilter_threshold': float(config['BEHAVIOR'].get('LogPrefilterThreshold', '0')),
+                               'page_cache_mib': int(config['BEHAVIOR'].get('PageCacheMiB', '256')),
+                               'use_cache': config['BEHAVIOR'].get('UseResultCache', 'no') == 'yes',
+                               'deskewed_page_cache': config['BEHAVIOR'].get('DeskewedPageCache', 'no'),
+                               'digit_classifier': config['BEHAVIOR'].get('DigitClassifier', 'paddle'),
+                               'deskew_method': config['BEHAVIOR'].get('DeskewMethod', 'profile'),
+                               'rotation_tolerance': float(config['BEHAVIOR'].get('RotationToleranceDegrees', str(ROTATION_TOLERANCE))),
+                               'line_backends': line_backends,
+                               'line_pyramid_scale': line_pyramid_scale
+                           },
+                           on_worker_ready=scheduler.record_worker_base)
+    pool.start()
+
+    try:
+        cumulative_time, failed = handle_files(to_do, index_of, out_putter, pool, scheduler, manifest)
+
+        # Do the stuff that failed the first time
+        if len(failed) > 0:
+            logger.info(f'Trying {len(failed)} failed items')
+            new_time, failed = handle_files(failed, index_of, out_putter, pool, scheduler, manifest)
+            cumulative_time += new_time
+
+        if len(failed) > 0:
+            logger.error(f'Could not process {len(failed)} files: {failed}')
+
+        manifest.finish_run()
+    finally:
+        pool.shutdown()
+        scheduler.save_profile()
+        manifest.close()
+
+    logger.info(f'Recycled workers {pool.workers_retired} times')
+    logger.info(f'Cumulative time was {cumulative_time} seconds')
+    logger.info(f'Average time per process was {cumulative_time / max(len(to_do), 1)}')
 
-        logger.info(f'batch {batch_index+1} of {len(batches)}')
-        
-        # Handle the batch
-        new_time, failed = handle_batch(batch, total_processed, out_putter)
-        cumulative_time += new_time
-        
-        # Retry these later
-        fail_batch['paths'].extend(failed)
-        
-        # Clean up
-        total_processed += len(batch['paths'])
-        logger.info('Sleeping...')
-        time.sleep(15)
-        logger.info('Alarm alarm alarm')
+    logger.info(f'End time is {datetime.datetime.now()}')
 
-    # Do the stuff that failed the first time
-    logger.info('Trying failed items')
-    new_time, failed = handle_batch(fail_batch, total_processed, out_putter)
+def start_resumable_run(config: ConfigParser, manifest: Processing_Manifest, pdfs: list[str]) -> tuple[Output_Manager, list[str]]:
+    """
+    Either start a brand new run or, if the last one got cut off, pick it back
+    up. Returns the output manager and the pdfs that still need doing.
+    """
 
+    unfinished_run = manifest.find_unfinished_run() if config['BEHAVIOR'].get('ResumeUnfinishedRuns', 'yes') == 'yes' else None
 
-    logger.info(f'Cumulative time was {cumulative_time} seconds')
-    logger.info(f'Average time per process was {cumulative_time / len(pdfs)}')
+    if unfinished_run != None:
+        logger.info(f'Picking back up on an unfinished run, adding onto {unfinished_run["header_name"]}')
+        out_putter = Output_Manager(config, resume_names=(unfinished_run['header_name'],
+                                                          unfinished_run['blow_name'],
+                                                          unfinished_run['lithology_name']))
+        manifest.resume_run(unfinished_run['run_id'])
+    else:
+        out_putter = Output_Manager(config)
 
-    logger.info(f'End time is {datetime.datetime.now()}')
+    if not out_putter.success:
+        raise Exception('Output Manager failed to initialize')
+
+    if unfinished_run == None:
+        manifest.start_run(*out_putter.names)
+
+    logger.info('Hashing pdfs')
+    hashes = manifest.find_hashes(pdfs)
+    to_do = manifest.register_files(hashes)
+    logger.info(f'{manifest.count_done()} pdfs were already done, {len(to_do)} left to go')
+
+    # Anything that got started last time but never finished might have some
+    # of its rows in the outputs already
+    out_putter.drop_file_indexes(manifest.find_unfinished_indexes())
+
+    return out_putter, to_do
+
+def start_incremental_run(config: ConfigParser, manifest: Processing_Manifest, pdfs: list[str]) -> tuple[Output_Manager, list[str]]:
+    """
+    Incremental mode always works on the same set of output files. Only the
+    pdfs that are new or changed since last time get looked at, and rows from
+    pdfs that were deleted or replaced get taken back out.
+    """
+
+    incremental_run = manifest.find_incremental_run()
+
+    if incremental_run != None:
+        names = (incremental_run['header_name'], incremental_run['blow_name'], incremental_run['lithology_name'])
+    else:
+        names = ('headers_tabulated.csv', 'blowcounts_tabulated.csv', 'lithology_formations_tabulated.csv')
+
+    out_putter = Output_Manager(config, resume_names=names)
+    if not out_putter.success:
+        raise Exception('Output Manager failed to initialize')
 
-def handle_batch(batch: Ideal_Batch, prior_processed: int, out_putter: Output_Manager | None) -> tuple[int, list[str]]:
+    if incremental_run != None and not out_putter.appending:
+        logger.warning('The output files from last time are gone, starting incremental mode over')
+        incremental_run = None
+
+    if incremental_run == None:
+        manifest.start_run(*out_putter.names, incremental=True)
+    else:
+        manifest.resume_run(incremental_run['run_id'])
+
+    needs_registering, dropped_indexes = manifest.reconcile_folder(pdfs)
+    to_do = manifest.register_files(needs_registering)
+    logger.info(f'{len(to_do)} pdfs are new or changed')
+
+    out_putter.drop_file_indexes(dropped_indexes | manifest.find_unfinished_indexes())
+    manifest.forget_dropped()
+
+    return out_putter, to_do
+
+def build_scheduler(config: ConfigParser, page_info_dict: dict[str, Page_Info]) -> Memory_Budget_Scheduler:
+    """
+    PaddleOCR adds a lot of overhead to each process, so the number of workers
+    comes from how much memory we're allowed to use as much as the cores.
+    """
+
+    budget_gib = float(config['BEHAVIOR'].get('MemoryBudgetGiB', '10'))
+    core_setting = config['BEHAVIOR'].get('CoreCount', 'auto')
+
+    if core_setting == 'auto':
+        cpu_count = multiprocessing.cpu_count()
+        logger.info(f'CPU Core count is {cpu_count}')
+        core_count = max(1, cpu_count - 1)
+    else:
+        core_count = int(core_setting)
+
+    if config['BEHAVIOR']['UseMultiThreading'] != 'yes':
+        core_count = 1
+
+    # If put in low memory mode, want to limit the amount of memory that is
+    # used at max. This can't really be helped for longer documents, but it
+    # can at least be helped in general
+    if config['BEHAVIOR']['LowMemoryMode'] == 'yes':
+        core_count = 1
+        budget_gib /= 2
+
+    return Memory_Budget_Scheduler(budget_gib,
+                                   core_count,
+                                   page_info_dict,
+                                   max_worker_mib=float(config['BEHAVIOR'].get('MaxWorkerMemoryMiB', '4096')))
+
+def handle_files(paths: list[str],
+                 index_of: dict[str, int],
+                 out_putter: Output_Manager | None,
+                 pool: OCR_Worker_Pool,
+                 scheduler: Memory_Budget_Scheduler | None = None,
+                 manifest: Processing_Manifest | None = None) -> tuple[int, list[str]]:
+    """
+    Keep the workers in the pool fed until all the paths have been looked at.
+    If there's a scheduler, it decides which file goes next and holds files
+    back while the memory budget is used up. If there's a manifest, it gets
+    told how every file went. Returns the total time the workers spent and the
+    files that failed.
+    """
 
     cumulative_time = 0
     failed: list[str] = []
-    
-    with concurrent.futures.ProcessPoolExecutor(max_workers=batch['max_workers']) as executor:
-        futures = {executor.submit(look_at_file, fp, index+prior_processed): fp for index, fp in enumerate(batch['paths'])}
-        for future in concurrent.futures.as_completed(futures):
-            fp = futures[future]
+
+    waiting = list(paths)
+    outstanding = 0
+
+    while len(waiting) > 0 or outstanding > 0:
+
+        while len(waiting) > 0 and pool.idle_count > 0:
+            fp: str | None
+            if scheduler != None:
+                fp = scheduler.pick_next(waiting, pool.worker_memory)
+            else:
+                fp = waiting[0]
+
+            if fp == None:
+                break
+
+            waiting.remove(fp)
+            if scheduler != None:
+                scheduler.mark_started(fp)
+            if manifest != None:
+                manifest.mark_started(fp)
+            # The worker would have to read the whole file again to hash it
+            pool.dispatch(fp, index_of[fp], {'content_hash': manifest.find_content_hash(fp)} if manifest != None else None)
+            outstanding += 1
+
+        for outcome in pool.poll(timeout=1.0):
+            outstanding -= 1
+            fp = outcome['file_path']
+
+            if scheduler != None:
+                scheduler.mark_finished(fp, outcome['peak_bytes'])
+
+            if outcome['error'] != None:
+                logger.error(f'Failed to process {fp}')
+                logger.error(outcome['error'])
+                failed.append(fp)
+                if manifest != None:
+                    manifest.mark_failed(fp, outcome['error'])
+                continue
+
             try:
-                head, liths, blows, time_taken = future.result()
+                head, liths, blows, time_taken = outcome['result']
                 if head and out_putter:
                     logger.info('in recognizable format')
                     for h in head:
@@ -141,52 +342,74 @@ def handle_batch(batch: Ideal_Batch, prior_processed: int, out_putter: Output_Ma
                         out_putter.write_blow_file(b)
                     for l in liths:
                         out_putter.write_lithology_file(l)
+                    out_putter.flush()
                 cumulative_time += time_taken
+
+                if manifest != None:
+                    manifest.mark_done(fp,
+                                       time_taken,
+                                       len(head) if head else 0,
+                                       sum(len(l) for l in liths),
+                                       sum(len(b) for b in blows))
             except Exception:
-                logger.error(f'Failed to process {fp}')
+                logger.error(f'Failed to write outputs for {fp}')
                 failed.append(fp)
                 logging.exception('message')
+                if manifest != None:
+                    manifest.mark_failed(fp, 'Failed to write outputs')
 
     return cumulative_time, failed
 
 def test_file_till_error(path: str):
 
-    test_batch: Ideal_Batch = {
-        'max_workers': 1,
-        'paths': [path]
-    }
+    pool = OCR_Worker_Pool(1)
+    pool.start()
     times_tried = 0
 
-    while True:
-        new_time = handle_batch(test_batch, times_tried, None)
-        times_tried += 1
-        if new_time == 0:
-            logger.info('Found fault, ending test')
-            break
+    try:
+        while True:
+            new_time, failed = handle_files([path], {path: times_tried}, None, pool)
+            times_tried += 1
+            if len(failed) > 0:
+                logger.info('Found fault, ending test')
+                break
+    finally:
+        pool.shutdown()
 
 # def look_at_file(file_path: str, file_index: int, draw_visuals=False, visuals_folder='visuals', use_cache=False) -> tuple[list[Document_Agenda], int]:
 def look_at_file(file_path: str,
                  file_index: int,
-                #  ocr_cls_false: PaddleOCR,
-                #  ocr_cls_true: PaddleOCR,
+                 ocr_cls_false, # : PaddleOCR
+                 ocr_cls_true, # : PaddleOCR
                  draw_visuals=False,
                  visuals_folder='visuals',
-                 use_cache=False
+                 use_cache=False,
+                 page_workers=1,
+                 page_parallel_threshold=6,
+                 prefilter_threshold=0.0,
+                 page_cache_mib=256,
+                 line_backends: 'dict[str, Line_Backend] | None' = None,
+                 line_pyramid_scale=1,
+                 deskew_method='profile',
+                 rotation_tolerance=ROTATION_TOLERANCE,
+                 deskewed_page_cache='no',
+                 digit_classifier='paddle',
+                 content_hash: str | None = None
                  ) -> tuple[list[Header_Sheet_Entry]|None, list[list[Lithology_Sheet_Entry]], list[list[Blowcount_Sheet_Entry]], int]:
     
     start_time = int(time.time())
-    from paddleocr import PaddleOCR
-    from paddleocr import PaddleOCR
     from detect_structure.helpers.table_structure.table_structure import Table_Structure
     from detect_structure.helpers.table_structure.table_structure_half import Table_Structure_Half
     from labeled_sets import bbs_137_rev_8_99, page_dict
-    from xplorer_tools.fix_orientation import fix_orientation
-    from xplorer_tools.get_image_from_page import get_image_from_page
-    from line_detection.detect_lines import detect_lines
-    from detect_structure.detect_structure import detect_structure
+    import fitz
     from find_logs.find_log import find_bbs_137_rev_8_99_log_pages
+    from xplorer_tools.page_raster_cache import Page_Raster_Cache
     import log_config as log_config
-    from header_analysis.simply_get_page_groups import get_page_nums, get_empty_page_builder, build_page_group
+    from header_analysis.simply_get_page_groups import get_page_nums, get_empty_page_builder, build_page_group, PAGE_NUMS_VERSION
+    from header_analysis.header_band import read_header_band, HEADER_BAND_VERSION
+    from find_logs.find_log import LOG_PAGES_VERSION
+    from xplorer_tools.stage_memo import Stage_Memo
+    from xplorer_tools.find_content_hash import find_content_hash_cached, remember_content_hash
 
     log_config.setup(log_prefix=file_index, do_paddle=True)
     logger = logging.getLogger(__name__)
@@ -196,18 +419,34 @@ def look_at_file(file_path: str,
     lithology_sheets: list[list[Lithology_Sheet_Entry]] = []
     blow_sheets: list[list[Blowcount_Sheet_Entry]] = []
 
-    ocr_cls_false = PaddleOCR(cls=False, lang='en', ocr_version='PP-OCRv4', use_gpu=False)
-    ocr_cls_true = PaddleOCR(cls=True, lang='en', ocr_version='PP-OCRv4', use_gpu=False)
-
     logger.warning(f'Started new thread ({file_index}) for {file_path}')
     
     # Get a list of all the pages that have logs on them
     logger.info(f'Doing {file_path}')
-    log_locations = find_bbs_137_rev_8_99_log_pages(file_path, ocr_cls_false)
+    # One open document and one set of renders for the whole file
+    pdf = fitz.open(file_path)
+    raster_cache = Page_Raster_Cache(page_cache_mib * 1024 * 1024)
+
+    if content_hash != None:
+        remember_content_hash(file_path, content_hash)
+
+    # With the cache on, every stage below picks up what it came up with last
+    # time unless its code (or a stage before it) changed. Visuals only get
+    # drawn when a stage actually runs, so don't skip anything then
+    memo = Stage_Memo(find_content_hash_cached(file_path) if use_cache and not draw_visuals else None)
+    geometry_tag = _geometry_tag(line_backends, line_pyramid_scale, deskew_method, rotation_tolerance)
+
+    log_locations, text_layer_pages = memo.run('log_pages', LOG_PAGES_VERSION, -1, (prefilter_threshold,),
+                                               lambda: find_bbs_137_rev_8_99_log_pages(file_path,
+                                                                                       ocr_cls_false,
+                                                                                       prefilter_threshold=prefilter_threshold,
+                                                                                       document=pdf,
+                                                                                       raster_cache=raster_cache))
     logger.info(f'Logs found: {log_locations}')
 
     if len(log_locations) == 0:
         logger.info('Skipping file, no log locations')
+        pdf.close()
         end_time = int(time.time())
         return None, [], [], (end_time - start_time)
 
@@ -215,46 +454,50 @@ def look_at_file(file_path: str,
     logger.info('Finding structure data')
     structure_dict: dict[int, Table_Structure_Half|Table_Structure] = {}
     image_dict: dict[int, tuple[np.ndarray, np.ndarray]] = {}  # Maybe a tad irresponsible, not cause of the memory leak though
+    text_block_dict: dict[int, list] = {}
     current_builder: Page_Group_Builder = get_empty_page_builder()
-    for index, doc_page_num in enumerate(log_locations):
+    page_geometry = iterate_page_geometry(file_path,
+                                          file_index,
+                                          log_locations,
+                                          text_layer_pages,
+                                          page_workers,
+                                          page_parallel_threshold,
+                                          draw_visuals=draw_visuals,
+                                          use_cache=use_cache,
+                                          document=pdf,
+                                          raster_cache=raster_cache,
+                                          line_backends=line_backends,
+                                          line_pyramid_scale=line_pyramid_scale,
+                                          deskew_method=deskew_method,
+                                          rotation_tolerance=rotation_tolerance,
+                                          deskewed_page_cache=deskewed_page_cache)
+    for index, (doc_page_num, structure, gray_array, color_array, text_blocks) in enumerate(page_geometry):
         logger.info(f'Looking at page {doc_page_num}')
-        
-        g_gray_image, g_color_image = get_image_from_page(file_path, doc_page_num)
-        g_gray_image, g_color_image = fix_orientation(g_gray_image, g_color_image, assess_count=6)
-
-        logger.info('Fixed orientation')
-
-        gray_array = np.array(g_gray_image, dtype=np.uint8)
-        color_array = np.array(g_color_image, dtype=np.uint8)
-
-        horizontals, verticals = detect_lines(
-            gray_array,
-            color_array,
-            draw_visuals=draw_visuals,
-            use_cache=use_cache,
-            path=file_path,
-            page=doc_page_num)
-
-        logger.info('Lines detected')
-
-        structure: Table_Structure | Table_Structure_Half
-        structure = detect_structure(horizontals,
-                                     verticals,
-                                     gray_array,
-                                     color_array,
-                                     use_cache=use_cache,
-                                     path=file_path,
-                                     page=doc_page_num,
-                                     draw_visuals=draw_visuals)
-
-        logger.info('Structure found')
 
         # Update dicts
         structure_dict[doc_page_num] = structure
         image_dict[doc_page_num] = gray_array, color_array
 
+        # Pages without a text layer get the strip above their table OCR'd
+        # once here. Page numbers, the header, and the water levels all get
+        # read out of these same blocks
+        has_text_layer = text_blocks != None
+        if text_blocks == None:
+            text_blocks = memo.run('header_band', HEADER_BAND_VERSION, doc_page_num, (geometry_tag,),
+                                   lambda: read_header_band(ocr_cls_false,
+                                                            color_array,
+                                                            structure,
+                                                            draw_visuals=draw_visuals,
+                                                            visuals_folder=visuals_folder))
+        text_block_dict[doc_page_num] = text_blocks
+
         # Now add the page to the document, build it one page at a time
-        page_num, page_total = get_page_nums(ocr_cls_false, color_array, draw_visuals=draw_visuals, visuals_folder=visuals_folder)
+        page_num, page_total = memo.run('page_nums', PAGE_NUMS_VERSION, doc_page_num, (geometry_tag, has_text_layer, HEADER_BAND_VERSION),
+                                        lambda: get_page_nums(ocr_cls_false,
+                                                              color_array,
+                                                              draw_visuals=draw_visuals,
+                                                              visuals_folder=visuals_folder,
+                                                              text_blocks=text_blocks))
         logger.info(f'Found page: {page_num} and page total: {page_total}')
 
         is_last_log = index == len(log_locations) - 1
@@ -279,7 +522,12 @@ def look_at_file(file_path: str,
                                                                                                        ocr_cls_true,
                                                                                                        file_index,
                                                                                                        draw_visuals=draw_visuals,
-                                                                                                       visuals_folder=visuals_folder)
+                                                                                                       visuals_folder=visuals_folder,
+                                                                                                       text_block_dict=text_block_dict,
+                                                                                                       stage_memo=memo,
+                                                                                                       geometry_tag=geometry_tag,
+                                                                                                       digit_classifier=digit_classifier,
+                                                                                                       line_pyramid_scale=line_pyramid_scale)
                 header_sheets += part_header_sheets
                 lithology_sheets += part_lithology_sheets
                 blow_sheets += part_blow_sheets
@@ -288,14 +536,296 @@ def look_at_file(file_path: str,
                 for doc_page in document:
                     del structure_dict[doc_page]
                     del image_dict[doc_page]
+                    text_block_dict.pop(doc_page, None)
         # return header_sheets, lithology_sheets, blow_sheets, 1 # Added, remove after testing
 
+    logger.debug(f'Raster cache had {raster_cache.hits} hits and {raster_cache.misses} misses')
+    raster_cache.clear()
+    pdf.close()
+
     end_time = int(time.time())
     logger.info(f'Took {end_time - start_time} seconds')
 
     return header_sheets, lithology_sheets, blow_sheets, (end_time - start_time)
     
 
+# Everything after finding the logs works on pages rendered at this
+PAGE_DPI = 300
+
+def _straightened_tag(line_backends: 'dict[str, Line_Backend] | None', deskew_method: str, rotation_tolerance: float) -> str:
+    """
+    Anything about how a page gets straightened that would change what's on it
+    """
+    if line_backends == None:
+        line_backends = {}
+    return f'{deskew_method}-{line_backends.get("orientation", "skimage")}-{rotation_tolerance}'
+
+def _geometry_tag(line_backends: 'dict[str, Line_Backend] | None', line_pyramid_scale: int, deskew_method: str, rotation_tolerance: float) -> str:
+    """
+    Everything that decides what find_page_geometry comes up with for a page
+    """
+    from line_detection.detect_lines import lines_version
+    from detect_structure.detect_structure import STRUCTURE_VERSION
+
+    if line_backends == None:
+        line_backends = {}
+    straightened_tag = _straightened_tag(line_backends, deskew_method, rotation_tolerance)
+    return f'{STRUCTURE_VERSION}-{lines_version(line_backends.get("tables", "skimage"), line_pyramid_scale, straightened_tag)}'
+
+def find_page_geometry(file_path: str,
+                       doc_page_num: int,
+                       draw_visuals=False,
+                       use_cache=False,
+                       document=None,
+                       use_text_layer=False,
+                       raster_cache=None,
+                       line_backends: 'dict[str, Line_Backend] | None' = None,
+                       line_pyramid_scale=1,
+                       deskew_method='profile',
+                       rotation_tolerance=ROTATION_TOLERANCE,
+                       deskewed_page_cache='no'):
+    """
+    Everything about a page that doesn't need OCR. Render it, straighten it
+    out, find the lines, and figure out the table structure. None of this cares
+    about any of the other pages so it can be done wherever.
+
+    Pass in the already open `document` (a fitz.Document) when there is one so
+    the PDF isn't reopened for every page. If the page might already have
+    been rendered, pass in the document's `raster_cache` too.
+
+    With `use_text_layer`, the page's words get pulled out of the text layer
+    and turned the same way as the page. Those come back as the last item,
+    otherwise it's None.
+
+    `line_backends` picks where lines come from for the 'orientation' guess
+    and for the 'tables'. Anything left out uses skimage. The table lines get
+    found coarse to fine when `line_pyramid_scale` is over 1. `deskew_method` is
+    'hough' or 'profile', see find_orientation_fix. Pages that are crooked by
+    less than `rotation_tolerance` degrees don't get turned at all.
+
+    If `deskewed_page_cache` is 'npy' or 'npz', the straightened page gets
+    saved that way (see Deskewed_Page_Cache) and next time it gets loaded
+    instead of rendered and straightened again.
+    """
+
+    import fitz
+    from xplorer_tools.fix_orientation import find_orientation_fix, straighten_page
+    from xplorer_tools.get_image_from_page import get_image_from_page
+    from line_detection.detect_lines import detect_lines, lines_version
+    from detect_structure.detect_structure import detect_structure
+    from find_logs.text_layer import get_text_blocks, rotate_blocks
+    from xplorer_tools.deskewed_page_cache import Deskewed_Page_Cache
+    from xplorer_tools.find_content_hash import find_content_hash_cached
+
+    opened_here = document == None
+    if opened_here:
+        document = fitz.open(file_path)
+
+    if line_backends == None:
+        line_backends = {}
+
+    straightened_tag = _straightened_tag(line_backends, deskew_method, rotation_tolerance)
+
+    page_cache = None
+    cached_page = None
+    if deskewed_page_cache != 'no':
+        page_cache = Deskewed_Page_Cache(find_content_hash_cached(file_path), deskewed_page_cache)
+        cached_page = page_cache.get(doc_page_num, PAGE_DPI, straightened_tag)
+
+    if cached_page != None:
+        gray_array = cached_page['gray']
+        color_array = cached_page['color']
+        rotate_by = cached_page['rotate_by']
+        page_width, page_height = cached_page['width'], cached_page['height']
+
+        # Might have been rendered while looking for logs, not needed now
+        if raster_cache != None:
+            raster_cache.discard(doc_page_num, PAGE_DPI)
+
+        logger.info('Using cached straightened page')
+    else:
+        g_gray_image, g_color_image = get_image_from_page(document, doc_page_num, dpi=PAGE_DPI, raster_cache=raster_cache)
+        page_width, page_height = g_gray_image.width, g_gray_image.height
+
+        rotate_by = find_orientation_fix(g_gray_image,
+                                         assess_count=6,
+                                         line_backend=line_backends.get('orientation', 'skimage'),
+                                         method=deskew_method)
+
+        # Comes back as arrays already. rotate_by goes to 0 if it wasn't worth it
+        gray_array, color_array, rotate_by = straighten_page(g_gray_image, g_color_image, rotate_by, rotation_tolerance)
+
+        if page_cache != None:
+            page_cache.put(doc_page_num, PAGE_DPI, straightened_tag, {
+                'gray': gray_array,
+                'color': color_array,
+                'rotate_by': rotate_by,
+                'width': page_width,
+                'height': page_height
+            })
+
+        logger.info('Fixed orientation')
+
+    text_blocks = None
+    if use_text_layer:
+        text_blocks = get_text_blocks(document.load_page(doc_page_num), PAGE_DPI)
+        text_blocks = rotate_blocks(text_blocks, rotate_by, page_width, page_height)
+
+    if opened_here:
+        document.close()
+
+    table_backend = line_backends.get('tables', 'skimage')
+
+    horizontals, verticals = detect_lines(
+        gray_array,
+        color_array,
+        draw_visuals=draw_visuals,
+        use_cache=use_cache,
+        path=file_path,
+        page=doc_page_num,
+        line_backend=table_backend,
+        pyramid_scale=line_pyramid_scale,
+        cache_tag=straightened_tag)
+
+    logger.info('Lines detected')
+
+    structure = detect_structure(horizontals,
+                                 verticals,
+                                 gray_array,
+                                 color_array,
+                                 use_cache=use_cache,
+                                 path=file_path,
+                                 page=doc_page_num,
+                                 draw_visuals=draw_visuals,
+                                 cache_tag=lines_version(table_backend, line_pyramid_scale, straightened_tag))
+
+    logger.info('Structure found')
+
+    return structure, gray_array, color_array, text_blocks
+
+# Each page worker keeps the PDF open for as long as it's around
+_page_worker_document = None
+
+def _setup_page_worker(file_index: int, file_path: str, content_hash: str | None) -> None:
+    import fitz
+    import log_config as log_config
+    from xplorer_tools.find_content_hash import remember_content_hash
+    global _page_worker_document
+
+    log_config.setup(log_prefix=f'{file_index}_pages')
+    _page_worker_document = fitz.open(file_path)
+    if content_hash != None:
+        remember_content_hash(file_path, content_hash)
+
+def _find_page_geometry_in_worker(file_path: str, doc_page_num: int, draw_visuals=False, use_cache=False, use_text_layer=False, line_backends=None, line_pyramid_scale=1, deskew_method='profile', rotation_tolerance=ROTATION_TOLERANCE, deskewed_page_cache='no'):
+    return find_page_geometry(file_path,
+                              doc_page_num,
+                              draw_visuals,
+                              use_cache,
+                              document=_page_worker_document,
+                              use_text_layer=use_text_layer,
+                              line_backends=line_backends,
+                              line_pyramid_scale=line_pyramid_scale,
+                              deskew_method=deskew_method,
+                              rotation_tolerance=rotation_tolerance,
+                              deskewed_page_cache=deskewed_page_cache)
+
+def iterate_page_geometry(file_path: str,
+                          file_index: int,
+                          log_locations: list[int],
+                          text_layer_pages: set[int],
+                          page_workers: int,
+                          page_parallel_threshold: int,
+                          draw_visuals=False,
+                          use_cache=False,
+                          document=None,
+                          raster_cache=None,
+                          line_backends: 'dict[str, Line_Backend] | None' = None,
+                          line_pyramid_scale=1,
+                          deskew_method='profile',
+                          rotation_tolerance=ROTATION_TOLERANCE,
+                          deskewed_page_cache='no'):
+    """
+    Yields (page, structure, gray, color, text blocks) for every log page IN
+    PAGE ORDER. Text blocks are None unless the page is in `text_layer_pages`.
+
+    Big documents with a bunch of logs in them used to be the one thing left
+    running at the end of a run, going page by page on a single core. If there
+    are enough pages, the geometry gets farmed out to a few helper processes
+    instead. Only `page_workers` pages are ever ahead of the one we're waiting
+    on so we're not holding a whole document's worth of images at once.
+
+    The line and structure caches live in the result cache, which every process
+    can read and write at the same time, so caching works either way.
+    """
+
+    if page_workers < 2 or len(log_locations) < page_parallel_threshold:
+        import fitz
+        pdf = document if document != None else fitz.open(file_path)
+        for doc_page_num in log_locations:
+            geometry = find_page_geometry(file_path,
+                                          doc_page_num,
+                                          draw_visuals,
+                                          use_cache,
+                                          document=pdf,
+                                          use_text_layer=doc_page_num in text_layer_pages,
+                                          raster_cache=raster_cache,
+                                          line_backends=line_backends,
+                                          line_pyramid_scale=line_pyramid_scale,
+                                          deskew_method=deskew_method,
+                                          rotation_tolerance=rotation_tolerance,
+                                          deskewed_page_cache=deskewed_page_cache)
+            yield doc_page_num, *geometry
+        if document == None:
+            pdf.close()
+        return
+
+    # The helper processes do their own rendering, so nothing in here is going
+    # to get used
+    if raster_cache != None:
+        raster_cache.clear()
+
+    logger.info(f'Handing {len(log_locations)} pages to {page_workers} page workers')
+
+    from xplorer_tools.find_content_hash import known_content_hash
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=page_workers,
+                                                initializer=_setup_page_worker,
+                                                initargs=(file_index, file_path, known_content_hash(file_path))) as executor:
+
+        pending: collections.deque = collections.deque()
+        upcoming = iter(log_locations)
+
+        def submit_next() -> None:
+            doc_page_num = next(upcoming, None)
+            if doc_page_num != None:
+                future = executor.submit(_find_page_geometry_in_worker,
+                                         file_path,
+                                         doc_page_num,
+                                         draw_visuals,
+                                         use_cache,
+                                         doc_page_num in text_layer_pages,
+                                         line_backends,
+                                         line_pyramid_scale,
+                                         deskew_method,
+                                         rotation_tolerance,
+                                         deskewed_page_cache)
+                pending.append((doc_page_num, future))
+
+        for _ in range(page_workers):
+            submit_next()
+
+        while len(pending) > 0:
+            doc_page_num, future = pending.popleft()
+            structure, gray_array, color_array, text_blocks = future.result()
+            submit_next()
+
+            # Segment ids come from a counter in each process, so ones made
+            # over there could clash with ones made here
+            structure.refresh_all_segments()
+
+            yield doc_page_num, structure, gray_array, color_array, text_blocks
+
 def handle_actual_page_group(log_locations: list[int],
                              structure_dict, # : dict[int, Table_Structure_Half | Table_Structure]
                              image_dict: dict[int, tuple[np.ndarray, np.ndarray]],
@@ -303,31 +833,52 @@ def handle_actual_page_group(log_locations: list[int],
                              ocr_cls_true, # : PaddleOCR
                              file_index: int,
                              draw_visuals=False,
-                             visuals_folder='visuals'):
+                             visuals_folder='visuals',
+                             text_block_dict: dict[int, list] | None = None,
+                             stage_memo=None, # : Stage_Memo
+                             geometry_tag='',
+                             digit_classifier='paddle',
+                             line_pyramid_scale=1):
 
     from header_analysis.analyze_header import Header_Obj
     from header_analysis.analyze_waters import Water_Obj
     from detect_structure.helpers.find_BUM_info.blowcount import BlowCount
     from detect_structure.helpers.lithology_formation import Lithology_Formation
     from header_analysis.find_page_groups import find_page_groups
-    from detect_structure.helpers.find_descriptions.find_descriptions import find_descriptions
-    from detect_structure.helpers.find_BUM_info.find_blow_counts import find_blow_counts
+    from detect_structure.helpers.find_descriptions.find_descriptions import prepare_descriptions, finish_descriptions, Description_Job
+    from xplorer_tools.ocr_batcher import OCR_Batcher
+    from detect_structure.helpers.find_BUM_info.find_blow_counts import prepare_blow_counts, read_blow_count_cells, finish_blow_counts, Blow_Count_Job, BLOW_COUNTS_VERSION
     from document_agenda.document_agenda import Document_Agenda
     from xplorer_tools.fix_analysis_objects import take_majority_header, take_majority_water
     from detect_structure.helpers.table_structure.table_structure import Table_Structure
     from detect_structure.helpers.table_structure.table_structure_half import Table_Structure_Half
-
-
+    from header_analysis.find_page_groups import PAGE_GROUPS_VERSION
+    from header_analysis.header_band import HEADER_BAND_VERSION
+    from detect_structure.helpers.soil_depth_ruler.soil_depth_ruler import RULERS_VERSION
+    from detect_structure.helpers.find_descriptions.find_descriptions import DESCRIPTIONS_VERSION
+    from xplorer_tools.stage_memo import Stage_Memo
+    from detect_structure.helpers.find_BUM_info.digit_classifier import load_digit_classifier
+
+    if stage_memo == None:
+        stage_memo = Stage_Memo(None)
+
+    # What every stage below is working off of. Each stage also gets the
+    # versions of the stages it depends on, see Stage_Memo. The rulers,
+    # descriptions, and blow counts all look for lines of their own, so they
+    # get the pyramid scale too
+    group_key = (geometry_tag, tuple(log_locations))
                              
     # page_groups: list[list[int]]
     header_dict: dict[int, Header_Obj]
     water_dict: dict[int, Water_Obj]
-    header_dict, water_dict = find_page_groups(log_locations,
-                                               structure_dict,
-                                               image_dict,
-                                               ocr_cls_false,
-                                               draw_visuals=draw_visuals,
-                                               visuals_folder=visuals_folder)
+    header_dict, water_dict = stage_memo.run('page_groups', PAGE_GROUPS_VERSION, log_locations[0], (*group_key, HEADER_BAND_VERSION),
+                                             lambda: find_page_groups(log_locations,
+                                                                      structure_dict,
+                                                                      image_dict,
+                                                                      ocr_cls_false,
+                                                                      draw_visuals=draw_visuals,
+                                                                      visuals_folder=visuals_folder,
+                                                                      text_block_dict=text_block_dict))
 
     # logger.info(f'Found page groups {page_groups}')
 
@@ -340,7 +891,15 @@ def handle_actual_page_group(log_locations: list[int],
         right_ends = (20.0 + 40.0 * index, 40.0 + 40.0 * index)
         color_image = image_dict[page_num][1]
         gray_image  = image_dict[page_num][0]
-        structure_dict[page_num].find_rulers(left_ends, right_ends, color_image, gray_image)
+
+        def find_rulers():
+            structure_dict[page_num].find_rulers(left_ends, right_ends, color_image, gray_image, pyramid_scale=line_pyramid_scale)
+            return structure_dict[page_num]
+
+        # The rulers live on the structure, so the whole thing is what gets
+        # remembered
+        structure_dict[page_num] = stage_memo.run('rulers', RULERS_VERSION, page_num, (geometry_tag, line_pyramid_scale, index), find_rulers)
+        structure_dict[page_num].refresh_all_segments()
 
     # Now go through and find all the goodies (lithology and blow counts)
     logger.info('Resolving individual documents')
@@ -348,31 +907,42 @@ def handle_actual_page_group(log_locations: list[int],
 
     logger.info('Looking for descriptions')
     description_list: list[Lithology_Formation] = []
+
+    # Every side of every page gets handed to the batcher before any of them
+    # get looked at, so their text goes through OCR together. Sides that were
+    # remembered from last time don't need any OCR
+    description_batcher = OCR_Batcher(ocr_cls_false)
+    description_jobs: list[tuple[int, tuple, tuple | Description_Job]] = []
     for index, page_num in enumerate(log_locations):
         color_image = image_dict[page_num][1]
         gray_image  = image_dict[page_num][0]
         page_structure = structure_dict[page_num]
         
-        d1 = find_descriptions(color_image,
-                                gray_image,
-                                page_structure,
-                                'l',
-                                ocr_cls_false,
-                                draw_visuals=draw_visuals,
-                                visuals_folder=visuals_folder)
-        description_list += d1
-        logger.debug(f'Left side produced {d1}')
-
-        if isinstance(page_structure, Table_Structure):
-            d2 = find_descriptions(color_image,
-                                    gray_image,
-                                    page_structure,
-                                    'r',
-                                    ocr_cls_false,
-                                    draw_visuals=draw_visuals,
-                                    visuals_folder=visuals_folder)
-            description_list += d2
-            logger.debug(f'Right side produced {d2}')
+        sides: list[Literal['l', 'r']] = ['l', 'r'] if isinstance(page_structure, Table_Structure) else ['l']
+        for side in sides:
+            description_key = (geometry_tag, line_pyramid_scale, RULERS_VERSION, index, side)
+            hit = stage_memo.lookup('descriptions', DESCRIPTIONS_VERSION, page_num, description_key)
+            if hit == None:
+                hit = prepare_descriptions(color_image,
+                                           gray_image,
+                                           page_structure,
+                                           side,
+                                           description_batcher,
+                                           draw_visuals=draw_visuals,
+                                           visuals_folder=visuals_folder,
+                                           pyramid_scale=line_pyramid_scale)
+            description_jobs.append((page_num, description_key, hit))
+
+    for page_num, description_key, job in description_jobs:
+        if isinstance(job, tuple):
+            d = job[0]
+        else:
+            d = finish_descriptions(job)
+            stage_memo.store('descriptions', DESCRIPTIONS_VERSION, page_num, description_key, d)
+
+        description_list += d
+        logger.debug(f'Page {page_num} side {description_key[-1]} produced {d}')
+    logger.debug(f'Descriptions went through OCR in {description_batcher.batches} batches')
 
     logger.info(f'Found {len(description_list)} Lithology sections before resolving continuations')
     
@@ -403,35 +973,49 @@ def handle_actual_page_group(log_locations: list[int],
     agenda.trim_lithology()
 
     logger.info('Looking for blow counts')
-    blow_count_list: list[BlowCount] = []
-    for index, page_num in enumerate(log_locations):
-
-        color_image = image_dict[page_num][1]
-        gray_image  = image_dict[page_num][0]
-        page_structure = structure_dict[page_num]
 
-        b1 = find_blow_counts(color_image,
-                                gray_image,
-                                page_structure,
-                                'l',
-                                agenda,
-                                ocr_cls_true,
-                                draw_visuals=draw_visuals,
-                                visuals_folder=visuals_folder)
-        blow_count_list += b1
-        logger.debug(f'Left side produced {b1}')
-
-        if isinstance(page_structure, Table_Structure):
-            b2 = find_blow_counts(color_image,
-                                    gray_image,
-                                    page_structure,
-                                    'r',
-                                    agenda,
-                                    ocr_cls_true,
-                                    draw_visuals=draw_visuals,
-                                    visuals_folder=visuals_folder)
-            blow_count_list += b2
-            logger.debug(f'Right side produced {b2}')
+    def find_group_blow_counts() -> list[BlowCount]:
+        # Every side of every page gets its cells cut out first so they can
+        # all be read in one go
+        jobs: list[tuple[int, Literal['l', 'r'], Blow_Count_Job]] = []
+        for page_num in log_locations:
+            color_image = image_dict[page_num][1]
+            gray_image  = image_dict[page_num][0]
+            page_structure = structure_dict[page_num]
+
+            sides: list[Literal['l', 'r']] = ['l', 'r'] if isinstance(page_structure, Table_Structure) else ['l']
+            for side in sides:
+                job = prepare_blow_counts(color_image,
+                                          gray_image,
+                                          page_structure,
+                                          side,
+                                          draw_visuals=draw_visuals,
+                                          visuals_folder=visuals_folder,
+                                          pyramid_scale=line_pyramid_scale)
+                if job != None:
+                    jobs.append((page_num, side, job))
+
+        read_blow_count_cells([j for _, _, j in jobs],
+                              ocr_cls_true,
+                              digit_reader,
+                              collect_samples=digit_classifier == 'collect')
+
+        found: list[BlowCount] = []
+        for page_num, side, job in jobs:
+            b = finish_blow_counts(job, agenda, ocr_cls_true)
+            found += b
+            logger.debug(f'Page {page_num} side {side} produced {b}')
+
+        return found
+
+    # Whatever reads the digits could change what comes out
+    digit_reader = load_digit_classifier(digit_classifier)
+    reader_version = digit_reader.version if digit_reader != None else 'paddle'
+
+    # Blow counts get matched up with the descriptions and header of the whole
+    # group through the agenda
+    blow_key = (*group_key, line_pyramid_scale, RULERS_VERSION, DESCRIPTIONS_VERSION, PAGE_GROUPS_VERSION, reader_version)
+    blow_count_list: list[BlowCount] = stage_memo.run('blow_counts', BLOW_COUNTS_VERSION, log_locations[0], blow_key, find_group_blow_counts)
 
     logger.info(f'Found {len(blow_count_list)} Blow count sections before resolving continuations')
 
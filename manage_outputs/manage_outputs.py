@@ -1,5 +1,6 @@
 import logging
 import csv
+import os
 from datetime import datetime
 from pathlib import Path
 from document_agenda.output_information import *
@@ -10,36 +11,106 @@ logger = logging.getLogger(__name__)
 class Output_Manager:
 
 
-    def __init__(self, config: ConfigParser) -> None:
+    def __init__(self, config: ConfigParser, resume_names: tuple[str, str, str] | None = None) -> None:
+        """
+        Pass in `resume_names` (header, blow, lithology) to keep adding onto
+        the outputs of a run that got cut off instead of starting new ones
+        """
         
         try:
 
-            if config['BEHAVIOR']['UseDateInOutputFileNames'] == 'yes':
-                now = datetime.now()
-                date_str = now.strftime("%m_%d_%Y_%H_%M_%S") + '_'
+            if resume_names != None:
+                header_name, blow_name, lithology_name = resume_names
             else:
-                date_str = ''
+                if config['BEHAVIOR']['UseDateInOutputFileNames'] == 'yes':
+                    now = datetime.now()
+                    date_str = now.strftime("%m_%d_%Y_%H_%M_%S") + '_'
+                else:
+                    date_str = ''
 
-            header_name = f'{date_str}headers_tabulated.csv'
-            blow_name = f'{date_str}blowcounts_tabulated.csv'
-            lithology_name = f'{date_str}lithology_formations_tabulated.csv'
+                header_name = f'{date_str}headers_tabulated.csv'
+                blow_name = f'{date_str}blowcounts_tabulated.csv'
+                lithology_name = f'{date_str}lithology_formations_tabulated.csv'
+
+            self.names = (header_name, blow_name, lithology_name)
+
+            self.appending = resume_names != None and all(Path(n).exists() for n in self.names)
+            mode = 'a' if self.appending else 'w'
             
-            self.header_file = open(header_name, 'w', newline='')
-            self.blow_file = open(blow_name, 'w', newline='')
-            self.lithology_file = open(lithology_name, 'w', newline='')
+            self.header_file = open(header_name, mode, newline='')
+            self.blow_file = open(blow_name, mode, newline='')
+            self.lithology_file = open(lithology_name, mode, newline='')
             self.success = True
         except PermissionError:
             logger.critical('Could not interact with one of the csv files. Make sure that it is not open elsewhere')
             self.success = False
             return
 
+        self._make_writers()
+
+        if not self.appending:
+            self.header_writer.writeheader()
+            self.blow_writer.writeheader()
+            self.lithology_writer.writeheader()
+
+    def _make_writers(self) -> None:
         self.header_writer = csv.DictWriter(self.header_file, fieldnames=FULL_HEADER_LIST)
         self.blow_writer = csv.DictWriter(self.blow_file, fieldnames=FULL_BLOWCOUNT_LIST)
         self.lithology_writer = csv.DictWriter(self.lithology_file, fieldnames=FULL_LITHOLOGY_LIST)
 
-        self.header_writer.writeheader()
-        self.blow_writer.writeheader()
-        self.lithology_writer.writeheader()
+    def flush(self) -> None:
+        """
+        Make sure everything written so far actually made it to the disk. Done
+        after every file so a crash doesn't leave half a file's rows behind
+        """
+        for f in (self.header_file, self.blow_file, self.lithology_file):
+            f.flush()
+            os.fsync(f.fileno())
+
+    def drop_file_indexes(self, file_indexes: set[int]) -> None:
+        """
+        Take out every row whose API came from one of these file indexes. APIs
+        look like "{file index}_{some number}"
+        """
+
+        if len(file_indexes) == 0:
+            return
+
+        prefixes = {str(i) for i in file_indexes}
+
+        def keep(row: dict[str, str]) -> bool:
+            return row['API'].split('_')[0] not in prefixes
+
+        self._filter_rows(keep)
+
+    def _filter_rows(self, keep) -> None:
+
+        files = [self.header_file, self.blow_file, self.lithology_file]
+        field_lists = [FULL_HEADER_LIST, FULL_BLOWCOUNT_LIST, FULL_LITHOLOGY_LIST]
+        dropped = 0
+
+        for index, (name, f, fields) in enumerate(zip(self.names, files, field_lists)):
+            f.close()
+
+            with open(name, 'r', newline='') as reading:
+                rows = list(csv.DictReader(reading))
+
+            kept = [r for r in rows if keep(r)]
+            dropped += len(rows) - len(kept)
+
+            temp_name = name + '.tmp'
+            with open(temp_name, 'w', newline='') as writing:
+                writer = csv.DictWriter(writing, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(kept)
+            os.replace(temp_name, name)
+
+            files[index] = open(name, 'a', newline='')
+
+        self.header_file, self.blow_file, self.lithology_file = files
+        self._make_writers()
+
+        logger.info(f'Dropped {dropped} rows from the outputs')
 
     def write_header(self, header_obj: Header_Sheet_Entry, file_path: str) -> None:
         header_obj['FILE_PATH'] = file_path
@@ -0,0 +1,382 @@
+"""
+Keeps track of which PDFs a run has already gotten through so that if the
+program dies partway through a folder of a few thousand, it can pick up where
+it left off instead of doing hours of OCR over again.
+
+Everything lives in a little SQLite file. Files are keyed by the hash of their
+contents (per run), so moving a folder around in between doesn't confuse it.
+
+There's also an incremental mode where one run just keeps going forever. Every
+time the program starts, it figures out which PDFs are new, which changed, and
+which are gone, so only the new and changed ones get looked at. Every path a
+PDF has been seen at is kept (in file_paths), so a copy of the same PDF in two
+places is recognized at both without getting hashed every time.
+
+file_paths also remembers each path's size and modified time, so a PDF that
+hasn't changed since any run last saw it never gets read again just to find
+its hash. That goes for resumed and brand new runs too.
+
+Files that are gone get marked 'dropped' instead of being deleted right away.
+Their rows come out of the outputs first and only then does forget_dropped
+delete them, so if the program dies in between, the next start still knows
+which rows to take out.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from typing import TypedDict
+from xplorer_tools.find_content_hash import find_content_hash
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_LOCATION = './ProcessingReports/processing_manifest.sqlite'
+
+
+class Run_Record(TypedDict):
+    run_id: int
+    header_name: str
+    blow_name: str
+    lithology_name: str
+
+
+class Processing_Manifest:
+
+    def __init__(self, location=MANIFEST_LOCATION) -> None:
+
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        self.connection = sqlite3.connect(location)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self._create_tables()
+
+        self.run_id: int | None = None
+        self._hash_of: dict[str, str] = {}
+
+    def _create_tables(self) -> None:
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    header_name TEXT NOT NULL,
+                    blow_name TEXT NOT NULL,
+                    lithology_name TEXT NOT NULL,
+                    started REAL NOT NULL,
+                    finished REAL,
+                    incremental INTEGER NOT NULL DEFAULT 0
+                )''')
+
+            # Manifests made before incremental mode existed
+            columns = [c[1] for c in self.connection.execute('PRAGMA table_info(runs)')]
+            if 'incremental' not in columns:
+                self.connection.execute('ALTER TABLE runs ADD COLUMN incremental INTEGER NOT NULL DEFAULT 0')
+
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    run_id INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    file_size INTEGER NOT NULL,
+                    file_mtime REAL NOT NULL,
+                    file_index INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    started REAL,
+                    finished REAL,
+                    seconds REAL,
+                    header_rows INTEGER,
+                    lithology_rows INTEGER,
+                    blow_rows INTEGER,
+                    error TEXT,
+                    PRIMARY KEY (run_id, content_hash)
+                )''')
+
+            # Every path a file has been seen at. files.file_path only has one
+            # of them
+            had_paths = self.connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'file_paths'").fetchone() != None
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS file_paths (
+                    run_id INTEGER NOT NULL,
+                    file_path TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    file_size INTEGER NOT NULL,
+                    file_mtime REAL NOT NULL,
+                    PRIMARY KEY (run_id, file_path)
+                )''')
+
+            # Manifests made before there was a file_paths table
+            if not had_paths:
+                self.connection.execute('''
+                    INSERT OR IGNORE INTO file_paths (run_id, file_path, content_hash, file_size, file_mtime)
+                    SELECT run_id, file_path, content_hash, file_size, file_mtime FROM files''')
+
+            # Hashes get looked up by path across every run
+            self.connection.execute('CREATE INDEX IF NOT EXISTS file_paths_by_path ON file_paths (file_path)')
+
+    def find_unfinished_run(self) -> Run_Record | None:
+        row = self.connection.execute('''
+            SELECT run_id, header_name, blow_name, lithology_name FROM runs
+            WHERE finished IS NULL AND incremental = 0 ORDER BY run_id DESC LIMIT 1''').fetchone()
+
+        return self._to_run_record(row)
+
+    def find_incremental_run(self) -> Run_Record | None:
+        row = self.connection.execute('''
+            SELECT run_id, header_name, blow_name, lithology_name FROM runs
+            WHERE incremental = 1 ORDER BY run_id DESC LIMIT 1''').fetchone()
+
+        return self._to_run_record(row)
+
+    @staticmethod
+    def _to_run_record(row) -> Run_Record | None:
+
+        if row == None:
+            return None
+
+        return {
+            'run_id': row[0],
+            'header_name': row[1],
+            'blow_name': row[2],
+            'lithology_name': row[3]
+        }
+
+    def start_run(self, header_name: str, blow_name: str, lithology_name: str, incremental=False) -> int:
+        with self.connection:
+            cursor = self.connection.execute('''
+                INSERT INTO runs (header_name, blow_name, lithology_name, started, incremental)
+                VALUES (?, ?, ?, ?, ?)''', (header_name, blow_name, lithology_name, time.time(), int(incremental)))
+
+        # Always set after an INSERT, sqlite3 just can't promise that
+        assert cursor.lastrowid != None
+        self.run_id = cursor.lastrowid
+        logger.info(f'Started run {self.run_id}')
+        return cursor.lastrowid
+
+    def resume_run(self, run_id: int) -> None:
+        self.run_id = run_id
+        logger.info(f'Resuming run {self.run_id}')
+
+    def finish_run(self) -> None:
+        with self.connection:
+            self.connection.execute('UPDATE runs SET finished = ? WHERE run_id = ?', (time.time(), self.run_id))
+
+    def find_hashes(self, file_paths: list[str]) -> dict[str, str]:
+        """
+        The content hash of every path. A path that any run has seen before
+        with the same size and modified time gets the hash it had then, only
+        the rest get read.
+        """
+
+        hashes: dict[str, str] = {}
+        reused = 0
+
+        for file_path in file_paths:
+            known = self._find_known_hash(file_path, os.stat(file_path))
+            if known != None:
+                hashes[file_path] = known
+                reused += 1
+            else:
+                hashes[file_path] = find_content_hash(file_path)
+
+        logger.info(f'Hashed {len(file_paths) - reused} pdfs, {reused} were already known')
+        return hashes
+
+    def _find_known_hash(self, file_path: str, stat: os.stat_result) -> str | None:
+        row = self.connection.execute('''
+            SELECT content_hash FROM file_paths
+            WHERE file_path = ? AND file_size = ? AND file_mtime = ? LIMIT 1''',
+            (file_path, stat.st_size, stat.st_mtime)).fetchone()
+
+        return row[0] if row != None else None
+
+    def find_content_hash(self, file_path: str) -> str:
+        """
+        The hash a registered path went in under
+        """
+        return self._hash_of[file_path]
+
+    def register_files(self, hashes: dict[str, str]) -> list[str]:
+        """
+        Give the manifest every path we found along with its content hash.
+        Returns the paths that still need to be done in this run. If the same
+        PDF shows up twice under different names, only the first one counts.
+        """
+
+        to_do: list[str] = []
+        seen: set[str] = set()
+
+        next_index = self.connection.execute('SELECT COALESCE(MAX(file_index), -1) + 1 FROM files WHERE run_id = ?',
+                                             (self.run_id,)).fetchone()[0]
+
+        with self.connection:
+            for file_path, content_hash in hashes.items():
+
+                stat = os.stat(file_path)
+                self.connection.execute('''
+                    INSERT OR REPLACE INTO file_paths (run_id, file_path, content_hash, file_size, file_mtime)
+                    VALUES (?, ?, ?, ?, ?)''', (self.run_id, file_path, content_hash, stat.st_size, stat.st_mtime))
+
+                if content_hash in seen:
+                    logger.warning(f'{file_path} is a copy of another PDF, skipping it')
+                    continue
+                seen.add(content_hash)
+
+                self._hash_of[file_path] = content_hash
+
+                row = self.connection.execute('SELECT status, file_path FROM files WHERE run_id = ? AND content_hash = ?',
+                                              (self.run_id, content_hash)).fetchone()
+
+                if row == None:
+                    self.connection.execute('''
+                        INSERT INTO files (run_id, content_hash, file_path, file_size, file_mtime, file_index)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                        (self.run_id, content_hash, file_path, stat.st_size, stat.st_mtime, next_index))
+                    next_index += 1
+                    to_do.append(file_path)
+                    continue
+
+                # It might have moved since last time. A copy somewhere else
+                # doesn't count, the one that's already there stays
+                if not os.path.exists(row[1]):
+                    self.connection.execute('''
+                        UPDATE files SET file_path = ?, file_size = ?, file_mtime = ?
+                        WHERE run_id = ? AND content_hash = ?''',
+                        (file_path, stat.st_size, stat.st_mtime, self.run_id, content_hash))
+
+                # It was gone but came back before its rows got dropped. They
+                # still get dropped, so it needs doing again
+                if row[0] == 'dropped':
+                    self.connection.execute('''
+                        UPDATE files SET status = 'pending' WHERE run_id = ? AND content_hash = ?''',
+                        (self.run_id, content_hash))
+
+                if row[0] != 'done':
+                    to_do.append(file_path)
+
+        return to_do
+
+    def reconcile_folder(self, file_paths: list[str]) -> tuple[dict[str, str], set[int]]:
+        """
+        For incremental mode. Compares what's in the folder now against what
+        this run already did.
+
+        A file with the same size and modified time as last time is assumed to
+        be the same and doesn't even get hashed. Anything else gets hashed
+        (unless another run knows it, see `find_hashes`), so a file that only
+        got moved or touched is still recognized.
+
+        Returns the hashes of the files that need to go through
+        `register_files`, and the file indexes whose rows should be dropped
+        because their PDF was deleted or replaced. Once those rows are out of
+        the outputs, call `forget_dropped`.
+        """
+
+        records = self.connection.execute('''
+            SELECT content_hash, file_path, status, file_index
+            FROM files WHERE run_id = ?''', (self.run_id,)).fetchall()
+        by_hash = {r[0]: r for r in records}
+
+        known_paths = self.connection.execute('''
+            SELECT file_path, content_hash, file_size, file_mtime
+            FROM file_paths WHERE run_id = ?''', (self.run_id,)).fetchall()
+        by_path = {r[0]: r for r in known_paths}
+
+        needs_registering: dict[str, str] = {}
+        still_here: set[str] = set()
+        unchanged = 0
+
+        for file_path in file_paths:
+            stat = os.stat(file_path)
+            known = by_path.get(file_path)
+            record = by_hash.get(known[1]) if known != None else None
+
+            known_hash = known[1] if known != None and known[2] == stat.st_size and known[3] == stat.st_mtime else None
+
+            if known_hash != None and record != None and record[2] == 'done':
+                still_here.add(known_hash)
+                self._hash_of[file_path] = known_hash
+                unchanged += 1
+                continue
+
+            if known_hash == None:
+                known_hash = self._find_known_hash(file_path, stat)
+            content_hash = known_hash if known_hash != None else find_content_hash(file_path)
+            still_here.add(content_hash)
+            needs_registering[file_path] = content_hash
+
+        with self.connection:
+            # Paths that aren't around anymore. Whatever was there might still
+            # be somewhere else
+            self.connection.executemany('DELETE FROM file_paths WHERE run_id = ? AND file_path = ?',
+                                        [(self.run_id, p) for p in by_path.keys() - set(file_paths)])
+
+            # Anything we have a record of that isn't around anymore got deleted
+            # or had its contents replaced
+            for content_hash, record in by_hash.items():
+                if content_hash in still_here or record[2] == 'dropped':
+                    continue
+
+                logger.info(f'{record[1]} was deleted or changed, dropping what it produced')
+                self.connection.execute('''
+                    UPDATE files SET status = 'dropped' WHERE run_id = ? AND content_hash = ?''',
+                    (self.run_id, content_hash))
+
+        # Including any that got marked last time but never made it out of the
+        # outputs
+        dropped_indexes = {r[0] for r in self.connection.execute(
+            "SELECT file_index FROM files WHERE run_id = ? AND status = 'dropped'", (self.run_id,))}
+
+        logger.info(f'{unchanged} pdfs unchanged, {len(needs_registering)} to check, {len(dropped_indexes)} gone')
+
+        return needs_registering, dropped_indexes
+
+    def forget_dropped(self) -> None:
+        """
+        Call once the rows for the indexes reconcile_folder gave back are out of
+        the outputs
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM files WHERE run_id = ? AND status = 'dropped'", (self.run_id,))
+
+    def find_file_indexes(self) -> dict[str, int]:
+        rows = self.connection.execute('SELECT content_hash, file_index FROM files WHERE run_id = ?', (self.run_id,))
+        index_of_hash = {h: i for h, i in rows}
+        return {p: index_of_hash[h] for p, h in self._hash_of.items() if h in index_of_hash}
+
+    def find_unfinished_indexes(self) -> set[int]:
+        """
+        Files that were started but never finished. If the program died while
+        writing their rows, there could be some of them in the outputs already
+        """
+        rows = self.connection.execute('''
+            SELECT file_index FROM files
+            WHERE run_id = ? AND status != 'done' AND attempts > 0''', (self.run_id,))
+        return {r[0] for r in rows}
+
+    def count_done(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM files WHERE run_id = ? AND status = ?',
+                                       (self.run_id, 'done')).fetchone()[0]
+
+    def mark_started(self, file_path: str) -> None:
+        with self.connection:
+            self.connection.execute('''
+                UPDATE files SET status = 'running', attempts = attempts + 1, started = ?, error = NULL
+                WHERE run_id = ? AND content_hash = ?''', (time.time(), self.run_id, self._hash_of[file_path]))
+
+    def mark_done(self, file_path: str, seconds: float, header_rows: int, lithology_rows: int, blow_rows: int) -> None:
+        with self.connection:
+            self.connection.execute('''
+                UPDATE files SET status = 'done', finished = ?, seconds = ?,
+                header_rows = ?, lithology_rows = ?, blow_rows = ?
+                WHERE run_id = ? AND content_hash = ?''',
+                (time.time(), seconds, header_rows, lithology_rows, blow_rows, self.run_id, self._hash_of[file_path]))
+
+    def mark_failed(self, file_path: str, error: str) -> None:
+        with self.connection:
+            self.connection.execute('''
+                UPDATE files SET status = 'failed', finished = ?, error = ?
+                WHERE run_id = ? AND content_hash = ?''', (time.time(), error, self.run_id, self._hash_of[file_path]))
+
+    def close(self) -> None:
+        self.connection.close()
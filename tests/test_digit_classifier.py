@@ -0,0 +1,67 @@
+"""
+The digit reader has to read plain numbers and leave anything else for
+PaddleOCR. Trained and checked on cells drawn with OpenCV's font, which is
+nowhere near a real scan, but slashes and inch marks look the same either way
+"""
+
+import cv2
+import numpy as np
+from detect_structure.helpers.find_BUM_info.digit_classifier import (KNN_Digit_Classifier, REJECT_GLYPH,
+                                                                     split_glyphs, glyph_features)
+
+
+def cell(text: str, scale=1.0, thickness=2) -> np.ndarray:
+    """
+    Inverted like the blows column, ink is bright
+    """
+
+    image = np.zeros((50, 90), dtype=np.uint8)
+    cv2.putText(image, text, (8, 38), cv2.FONT_HERSHEY_SIMPLEX, scale, 255, thickness)
+    return image
+
+
+def classifier() -> KNN_Digit_Classifier:
+
+    glyphs: list[np.ndarray] = []
+    labels: list[int] = []
+    for scale in (0.9, 1.0, 1.1, 1.2):
+        for thickness in (2, 3):
+            for digit in range(10):
+                glyphs += split_glyphs(cell(str(digit), scale, thickness))
+                labels.append(digit)
+            for reject in ('/', 'H'):
+                found = split_glyphs(cell(reject, scale, thickness))
+                glyphs += found
+                labels += [REJECT_GLYPH] * len(found)
+
+    return KNN_Digit_Classifier(glyph_features(glyphs), np.array(labels))
+
+
+def test_reads_plain_numbers():
+    results = classifier().classify([cell('7'), cell('42', 1.1), cell('13', 0.9, 3)])
+
+    assert [r[0] if r != None else None for r in results] == ['7', '42', '13']
+
+def test_gives_up_past_three_digits():
+    assert classifier().classify([cell('1234', 0.8)]) == [None]
+
+def test_saved_model_reads_the_same(tmp_path):
+    location = str(tmp_path / 'model.npz')
+    cells = [cell('7'), cell('42', 1.1), cell('13', 0.9, 3)]
+
+    trained = classifier()
+    trained.save(location)
+    loaded = KNN_Digit_Classifier.load(location)
+
+    assert loaded != None
+    assert loaded.version != ''
+    assert loaded.classify(cells) == trained.classify(cells)
+
+def test_leaves_slashes_and_letters_alone():
+    assert classifier().classify([cell('/'), cell('/', 1.2, 3), cell('H')]) == [None, None, None]
+
+def test_leaves_inch_marks_alone():
+    # The inch mark is too short to be a glyph, so the 6 on its own would
+    # have been read as 6
+    assert len(split_glyphs(cell('6"'))) == 1
+    assert classifier().classify([cell('6"'), cell("12'", 1.1)]) == [None, None]
@@ -0,0 +1,78 @@
+"""
+Every backend has to find the same ruled lines skimage does, including dashed
+ones, and only at the angles that were asked for
+"""
+
+import numpy as np
+import pytest
+from line_detection.detect_lines import horizontals, verticals
+from line_detection.helpers.find_raw_segments import find_raw_segments
+
+HEIGHT = 900
+WIDTH = 700
+LINE_LENGTH = 170
+LINE_GAP = 10
+
+# x of every vertical, y of every horizontal. The last of each is dashed
+VERTICAL_XS = [60, 250, 480, 640]
+HORIZONTAL_YS = [80, 300, 610, 850]
+
+
+def ruled_page() -> np.ndarray:
+    """
+    Already inverted, with text sized specks all over
+    """
+
+    rng = np.random.default_rng(4)
+    page = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+
+    for x in VERTICAL_XS:
+        page[40:HEIGHT - 20, x:x + 3] = 255
+    for y in HORIZONTAL_YS:
+        page[y:y + 3, 20:WIDTH - 20] = 255
+
+    # Gaps shorter than LINE_GAP
+    for start in range(40, HEIGHT - 20, 60):
+        page[start:start + 6, VERTICAL_XS[-1]:VERTICAL_XS[-1] + 3] = 0
+    for start in range(20, WIDTH - 20, 60):
+        page[HORIZONTAL_YS[-1]:HORIZONTAL_YS[-1] + 3, start:start + 6] = 0
+
+    for _ in range(400):
+        speck_x, speck_y = int(rng.integers(0, WIDTH - 8)), int(rng.integers(0, HEIGHT - 10))
+        page[speck_y:speck_y + 9, speck_x:speck_x + 6] = 255
+
+    return page
+
+def covered(spans: list[tuple[float, float]], start: int, end: int) -> float:
+    """
+    How much of start to end the spans cover, 0 to 1
+    """
+
+    hit = np.zeros(end - start, dtype=bool)
+    for a, b in spans:
+        hit[max(int(min(a, b)) - start, 0):max(int(max(a, b)) - start + 1, 0)] = True
+    return hit.mean()
+
+
+@pytest.mark.parametrize('backend', ['skimage', 'opencv_hough', 'morphology'])
+def test_finds_every_vertical(backend):
+    raw = find_raw_segments(ruled_page(), verticals, LINE_LENGTH, LINE_GAP, backend)
+
+    for (x1, y1), (x2, y2) in raw:
+        # Nothing leaning more than the thetas allow, plus a pixel of rounding
+        assert abs(x2 - x1) <= abs(y2 - y1) * np.tan(np.max(np.abs(verticals))) + 1
+
+    for x in VERTICAL_XS:
+        spans = [(y1, y2) for (x1, y1), (x2, y2) in raw if abs(x1 - x - 1) <= 2 and abs(x2 - x - 1) <= 2]
+        assert covered(spans, 40, HEIGHT - 20) > 0.9
+
+@pytest.mark.parametrize('backend', ['skimage', 'opencv_hough', 'morphology'])
+def test_finds_every_horizontal(backend):
+    raw = find_raw_segments(ruled_page(), horizontals, LINE_LENGTH, LINE_GAP, backend)
+
+    for (x1, y1), (x2, y2) in raw:
+        assert abs(y2 - y1) <= abs(x2 - x1) * np.tan(np.max(np.abs(horizontals - np.pi / 2))) + 1
+
+    for y in HORIZONTAL_YS:
+        spans = [(x1, x2) for (x1, y1), (x2, y2) in raw if abs(y1 - y - 1) <= 2 and abs(y2 - y - 1) <= 2]
+        assert covered(spans, 20, WIDTH - 20) > 0.9
@@ -0,0 +1,110 @@
+"""
+Runs get_line_segments on a made up table page, the same way detect_lines
+does, and checks that every line drawn on it comes back out
+"""
+
+from functools import partial
+import numpy as np
+import pytest
+from skimage.transform import probabilistic_hough_line
+import line_detection.helpers.find_raw_segments as find_raw_segments_module
+from line_detection.detect_lines import horizontals, verticals
+from line_detection.helpers.get_line_segments import get_line_segments
+
+HEIGHT = 1100
+WIDTH = 850
+LINE_WIDTH = 3
+
+VERTICAL_XS = [60, 150, 300, 420, 560, 700, 790]
+HORIZONTAL_YS = [120, 180, 1040]
+
+
+def synthetic_page() -> np.ndarray:
+    """
+    Already inverted like detect_lines does it, so the lines are bright
+    """
+
+    page = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+    for x in VERTICAL_XS:
+        page[120:1040, x:x + LINE_WIDTH] = 255
+    for y in HORIZONTAL_YS:
+        page[y:y + LINE_WIDTH, 60:790 + LINE_WIDTH] = 255
+
+    # Some "text" that shouldn't turn into lines
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        speck_x, speck_y = int(rng.integers(80, 760)), int(rng.integers(200, 1000))
+        page[speck_y:speck_y + 8, speck_x:speck_x + 5] = 255
+
+    return page
+
+
+@pytest.fixture(autouse=True)
+def seeded_hough(monkeypatch):
+    """
+    probabilistic_hough_line picks pixels at random, and once every few
+    hundred runs a crossing line eats the end of a vertical before it's found.
+    Seeded so every run gets the same segments to merge
+    """
+
+    monkeypatch.setattr(find_raw_segments_module, 'probabilistic_hough_line',
+                        partial(probabilistic_hough_line, rng=0))
+
+@pytest.mark.parametrize('merge_engine', ['classic', 'bucketed'])
+def test_finds_every_vertical(merge_engine):
+    _, combined = get_line_segments(synthetic_page(),
+                                    thetas=verticals,
+                                    line_length=170,
+                                    line_gap=10,
+                                    alongside_gap=10,
+                                    max_angle_difference=np.pi / 3,
+                                    base_angle={'x': 0, 'y': 1},
+                                    compress_maximum=280,
+                                    project_onto='v',
+                                    merge_engine=merge_engine)
+
+    for x in VERTICAL_XS:
+        near = [s for s in combined if abs(s.average_x - (x + LINE_WIDTH / 2)) < 5]
+        assert len(near) > 0, f'No vertical found at x={x}'
+        longest = max(abs(s.pt_2['y'] - s.pt_1['y']) for s in near)
+        assert longest > 0.9 * (1040 - 120), f'Vertical at x={x} came back in pieces'
+
+@pytest.mark.parametrize('merge_engine', ['classic', 'bucketed'])
+def test_finds_every_horizontal(merge_engine):
+    _, combined = get_line_segments(synthetic_page(),
+                                    thetas=horizontals,
+                                    line_length=170,
+                                    line_gap=10,
+                                    alongside_gap=25,
+                                    max_angle_difference=np.pi / 5,
+                                    compress_maximum=121,
+                                    project_onto='h',
+                                    merge_engine=merge_engine)
+
+    for y in HORIZONTAL_YS:
+        near = [s for s in combined if abs(s.average_y - (y + LINE_WIDTH / 2)) < 5]
+        assert len(near) > 0, f'No horizontal found at y={y}'
+        longest = max(abs(s.pt_2['x'] - s.pt_1['x']) for s in near)
+        assert longest > 0.9 * (790 - 60), f'Horizontal at y={y} came back in pieces'
+
+@pytest.mark.parametrize('pyramid_scale', [2, 4])
+def test_coarse_to_fine_finds_the_same_verticals(pyramid_scale):
+    settings = dict(thetas=verticals,
+                    line_length=170,
+                    line_gap=10,
+                    alongside_gap=10,
+                    max_angle_difference=np.pi / 3,
+                    base_angle={'x': 0, 'y': 1},
+                    compress_maximum=280,
+                    project_onto='v',
+                    merge_engine='classic')
+
+    _, full_size = get_line_segments(synthetic_page(), **settings)
+    _, pyramid = get_line_segments(synthetic_page(), pyramid_scale=pyramid_scale, **settings)
+
+    # Nothing gets lost and nothing gets broken into pieces
+    assert len(pyramid) == len(full_size)
+    for x in VERTICAL_XS:
+        near = [s for s in pyramid if abs(s.average_x - (x + LINE_WIDTH / 2)) < 5]
+        assert len(near) == 1, f'Vertical at x={x} came back as {len(near)} lines'
+        assert abs(near[0].pt_2['y'] - near[0].pt_1['y']) > 0.9 * (1040 - 120)
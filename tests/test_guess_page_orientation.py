@@ -0,0 +1,47 @@
+"""
+The projection profile deskew (the default DeskewMethod) against pages turned
+by known angles, and against the Hough guess it replaced
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+from xplorer_tools.fix_orientation import find_orientation_fix
+
+# Degrees. How far the profile guess can be from the real turn, and from the
+# Hough guess. skimage's Hough is random and wanders a bit more than the
+# profile does, so that one gets more room
+TRUE_TOLERANCE = 0.1
+HOUGH_TOLERANCE = 0.2
+
+
+def ruled_page(turn_degrees: float) -> Image.Image:
+    """
+    A 300 DPI letter page with a BBS 137-ish table on it, some specks of
+    "text", turned counter clockwise by `turn_degrees`
+    """
+
+    page = np.full((3300, 2550), 255, dtype=np.uint8)
+    for x in range(250, 2400, 230):
+        page[600:2950, x:x + 3] = 0
+    for y in range(600, 2951, 160):
+        page[y:y + 3, 250:2323] = 0
+
+    rng = np.random.default_rng(7)
+    for _ in range(1500):
+        speck_x, speck_y = int(rng.integers(260, 2300)), int(rng.integers(620, 2930))
+        page[speck_y:speck_y + 18, speck_x:speck_x + 10] = np.where(rng.random((18, 10)) > 0.7, 0, 255)
+
+    return Image.fromarray(page).rotate(turn_degrees, resample=Image.Resampling.BILINEAR, fillcolor=255)
+
+
+@pytest.mark.parametrize('turn_degrees', [0.0, 0.4, -0.7, 1.0, -2.5])
+def test_profile_finds_the_turn(turn_degrees):
+    page = ruled_page(turn_degrees)
+
+    profile = find_orientation_fix(page, method='profile')
+    hough = find_orientation_fix(page, assess_count=3, method='hough')
+
+    # Turning it back is the opposite of how it was turned
+    assert abs(profile + turn_degrees) <= TRUE_TOLERANCE
+    assert abs(profile - hough) <= HOUGH_TOLERANCE
@@ -0,0 +1,64 @@
+"""
+Pages handed out to helper processes have to come back in page order, the same
+as when they get done one at a time, even when the later ones finish first
+"""
+
+import sys
+import time
+import types
+import fitz
+import numpy as np
+import pytest
+
+PAGES = 7
+
+
+class Fake_Structure:
+
+    def __init__(self, page: int) -> None:
+        self.page = page
+        self.refreshed = False
+
+    def refresh_all_segments(self) -> None:
+        self.refreshed = True
+
+def fake_geometry(file_path, doc_page_num, *args, **kwargs):
+    time.sleep(0.05 * (PAGES - doc_page_num))
+    return Fake_Structure(doc_page_num), np.full((4, 4), doc_page_num), np.full((4, 4, 3), doc_page_num), None
+
+
+@pytest.fixture
+def main_module(monkeypatch):
+    """
+    main only needs PaddleOCR for type hints, so a stand-in is enough to import
+    it. The helper processes get forked with the fake geometry in place
+    """
+
+    monkeypatch.setitem(sys.modules, 'paddleocr', types.SimpleNamespace(PaddleOCR=object))
+    import main
+    monkeypatch.setattr(main, 'find_page_geometry', fake_geometry)
+    yield main
+    # The worker pool tests bring their own main
+    sys.modules.pop('main', None)
+
+@pytest.fixture
+def pdf_path(tmp_path) -> str:
+    path = str(tmp_path / 'logs.pdf')
+    with fitz.open() as pdf:
+        for _ in range(PAGES):
+            pdf.new_page()
+        pdf.save(path)
+    return path
+
+
+@pytest.mark.parametrize('page_workers', [1, 3])
+def test_pages_come_back_in_order(main_module, pdf_path, page_workers):
+    log_locations = [0, 2, 3, 5, 6]
+
+    pages = list(main_module.iterate_page_geometry(pdf_path, 0, log_locations, set(), page_workers, 2))
+
+    assert [p[0] for p in pages] == log_locations
+    assert [p[1].page for p in pages] == log_locations
+    assert [int(p[2][0, 0]) for p in pages] == log_locations
+    # Only the ones that came from another process need new segment ids
+    assert all(p[1].refreshed == (page_workers > 1) for p in pages)
@@ -0,0 +1,32 @@
+"""
+Workers count against the budget at the size they last reported, capped at
+the size they get recycled at
+"""
+
+from xplorer_tools.memory_budget_scheduler import Memory_Budget_Scheduler, GIB, MIB
+
+
+def scheduler(tmp_path) -> Memory_Budget_Scheduler:
+    page_info = {'a.pdf': {'page_count': 2, 'max_page_pixels': 8_000_000}}
+    return Memory_Budget_Scheduler(4, 2, page_info, # type: ignore
+                                   profile_location=str(tmp_path / 'memory_profile.json'),
+                                   max_worker_mib=2048)
+
+
+def test_grown_workers_hold_the_file_back(tmp_path):
+    s = scheduler(tmp_path)
+    s.running['other.pdf'] = 100 * MIB
+    base = s.profile['worker_base_bytes']
+
+    # Fits when both workers are at their base size
+    assert s.pick_next(['a.pdf'], [base, base]) == 'a.pdf'
+
+    # Not once they've grown to where they'd get recycled
+    assert s.pick_next(['a.pdf'], [2 * GIB, 2 * GIB]) == None
+
+def test_worker_size_is_capped_and_defaults_to_base(tmp_path):
+    s = scheduler(tmp_path)
+    base = s.profile['worker_base_bytes']
+
+    assert s.committed_bytes([None, 5 * GIB]) == base + 2048 * MIB
+    assert s.committed_bytes([300 * MIB]) == 300 * MIB
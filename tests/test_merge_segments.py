@@ -0,0 +1,123 @@
+"""
+The bucketed merge has to give back exactly what the classic merge does, line
+for line and in the same order, on dense pages full of broken up lines
+"""
+
+from math import pi
+import numpy as np
+import pytest
+import line_detection.helpers.get_line_segments as get_line_segments_module
+from line_detection.detect_lines import horizontals, verticals
+from line_detection.helpers.find_raw_segments import find_raw_segments
+from line_detection.helpers.get_line_segments import get_line_segments
+from line_detection.helpers.merge_segments import merge_segments
+from xplorer_tools.segment_operations import Segment
+
+HEIGHT = 1100
+WIDTH = 850
+
+# Same settings detect_lines uses
+VERTICAL_SETTINGS = dict(thetas=verticals, line_length=170, line_gap=10, alongside_gap=10,
+                         max_angle_difference=pi / 3, base_angle={'x': 0, 'y': 1},
+                         compress_maximum=280, project_onto='v')
+HORIZONTAL_SETTINGS = dict(thetas=horizontals, line_length=170, line_gap=10, alongside_gap=25,
+                           max_angle_difference=pi / 5, compress_maximum=121, project_onto='h')
+
+
+def dense_page(seed: int, skew: float) -> np.ndarray:
+    """
+    Lots of ruled lines, some of them dashed or doubled up, leaning by `skew`
+    pixels per pixel, with text sized specks all over. Already inverted like
+    detect_lines does it
+    """
+
+    rng = np.random.default_rng(seed)
+    page = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+
+    for x in rng.integers(20, WIDTH - 40, 25):
+        dashed = rng.random() < 0.3
+        for y in range(40, HEIGHT - 40):
+            if dashed and (y // 40) % 4 == 3:
+                continue
+            lean = int(round(x + skew * y))
+            page[y, lean:lean + int(rng.integers(2, 4))] = 255
+
+    for y in rng.integers(20, HEIGHT - 40, 30):
+        dashed = rng.random() < 0.3
+        for x in range(20, WIDTH - 20):
+            if dashed and (x // 40) % 4 == 3:
+                continue
+            lean = int(round(y - skew * x))
+            page[lean:lean + int(rng.integers(2, 4)), x] = 255
+
+    for _ in range(600):
+        speck_x, speck_y = int(rng.integers(0, WIDTH - 8)), int(rng.integers(0, HEIGHT - 10))
+        page[speck_y:speck_y + 9, speck_x:speck_x + 6] = 255
+
+    return page
+
+def as_points(segments: list[Segment]) -> list[tuple]:
+    return [(s.pt_1['x'], s.pt_1['y'], s.pt_2['x'], s.pt_2['y']) for s in segments]
+
+
+def test_broken_lines_come_back_whole():
+    """
+    Verticals in pieces that overlap a little, far enough from each other that
+    there's only one way to put them together
+    """
+
+    xs = [100, 300, 500, 700]
+
+    for engine in ('classic', 'bucketed'):
+        pieces = [Segment({'x': x, 'y': y}, {'x': x, 'y': y + 110}) for x in xs for y in range(0, 1000, 100)]
+        merged = merge_segments(pieces, pi / 20, 280, 10, pi / 3, {'x': 0, 'y': 1}, engine=engine)
+
+        ends = sorted((s.pt_1['x'], min(s.pt_1['y'], s.pt_2['y']), max(s.pt_1['y'], s.pt_2['y'])) for s in merged)
+        assert ends == [(x, 0, 1010) for x in xs]
+
+@pytest.mark.parametrize('seed,skew', [(0, 0.0), (1, 0.004), (2, -0.008)])
+@pytest.mark.parametrize('settings', [VERTICAL_SETTINGS, HORIZONTAL_SETTINGS], ids=['vertical', 'horizontal'])
+def test_same_lines_on_dense_pages(seed, skew, settings, monkeypatch):
+    page = dense_page(seed, skew)
+
+    # The probabilistic Hough transform is random, so both engines get handed
+    # the same raw segments
+    raw = find_raw_segments(page, settings['thetas'], settings['line_length'], settings['line_gap'])
+    monkeypatch.setattr(get_line_segments_module, 'find_raw_segments', lambda *args, **kwargs: raw)
+
+    _, classic = get_line_segments(page, merge_engine='classic', **settings)
+    _, bucketed = get_line_segments(page, merge_engine='bucketed', **settings)
+
+    assert as_points(bucketed) == as_points(classic)
+
+def test_same_lines_from_scattered_pieces():
+    """
+    Unprojected and unsorted, with repeats, fractional points, and junk at
+    every angle
+    """
+
+    rng = np.random.default_rng(3)
+    for _ in range(10):
+        raw: list[tuple] = []
+        for _ in range(int(rng.integers(3, 12))):
+            x = rng.uniform(50, 800)
+            y = 0.0
+            while y < 1000:
+                length = rng.uniform(20, 250)
+                wobble = rng.normal(0, 1.5, 4)
+                raw.append((x + wobble[0], y + wobble[1], x + wobble[2], y + length + wobble[3]))
+                if rng.random() < 0.1:
+                    raw.append(raw[-1])
+                y += length + rng.uniform(-30, 20)
+        for _ in range(40):
+            x, y = rng.uniform(0, 850, 2)
+            angle = rng.uniform(0, pi)
+            raw.append((x, y, x + 40 * np.cos(angle), y + 40 * np.sin(angle)))
+        rng.shuffle(raw)
+
+        results = []
+        for engine in ('classic', 'bucketed'):
+            segments = [Segment({'x': a, 'y': b}, {'x': c, 'y': d}) for a, b, c, d in raw]
+            results.append(as_points(merge_segments(segments, pi / 20, 280, 10, pi / 3, {'x': 0, 'y': 1}, engine=engine)))
+
+        assert results[1] == results[0]
@@ -0,0 +1,178 @@
+"""
+A worker that retires after a file puts its 'done' on the event queue and
+exits right away. If the pool only notices after it last read the queue, the
+file must still come back with its result, not as failed.
+
+The rest run real worker processes, with main.look_at_file and PaddleOCR
+swapped out for stubs that do whatever each test needs them to
+"""
+
+import queue
+import time
+import psutil
+import pytest
+from xplorer_tools.ocr_worker_pool import File_Outcome, OCR_Worker_Pool
+
+# What the stub does depends on the file's name
+STUB_MAIN = """
+import os
+import signal
+
+ballast = []
+
+def look_at_file(file_path, file_index, ocr_cls_false, ocr_cls_true, **kwargs):
+    if file_path.startswith('killer'):
+        os.kill(os.getpid(), signal.SIGKILL)
+    if file_path.startswith('big'):
+        # Filled in so it's actually resident
+        ballast.append(bytearray(b'x' * (200 * 1024 * 1024)))
+    return file_path
+"""
+
+STUB_PADDLEOCR = """
+import os
+
+class PaddleOCR:
+    def __init__(self, **kwargs):
+        if os.environ.get('STUB_OCR_FAILS') == 'yes':
+            os._exit(1)
+"""
+
+
+class Retired_Process:
+    """
+    Already gone by the time anyone asks, and its 'done' only shows up on
+    the queue then
+    """
+
+    exitcode = 0
+
+    def __init__(self, events: queue.Queue, done: tuple) -> None:
+        self.events = events
+        self.done: tuple | None = done
+
+    def is_alive(self) -> bool:
+        if self.done != None:
+            self.events.put(self.done)
+            self.done = None
+        return False
+
+    def join(self) -> None:
+        pass
+
+
+def test_done_that_shows_up_with_the_exit_is_not_a_failure(monkeypatch):
+    pool = OCR_Worker_Pool(1)
+    started: list[int] = []
+    monkeypatch.setattr(pool, '_start_worker', lambda: started.append(0))
+
+    events: queue.Queue = queue.Queue()
+    pool._events = events # type: ignore
+    pool._workers[0] = {
+        'process': Retired_Process(events, ('done', 0, 'some.pdf', 3, 'result', None, True, 1024, 2048)),
+        'tasks': None,
+        'state': 'busy',
+        'current': ('some.pdf', 3),
+        'files_done': 0,
+        'rss': 1024
+    }
+
+    outcomes = pool.poll(timeout=0.01)
+
+    assert len(outcomes) == 1
+    assert outcomes[0]['error'] == None
+    assert outcomes[0]['result'] == 'result'
+    assert pool.workers_retired == 1
+    assert started == [0]
+
+
+@pytest.fixture
+def stubbed(tmp_path, monkeypatch):
+    """
+    Workers import main and paddleocr when they start, so the stubs just have
+    to come first on the path they get
+    """
+
+    (tmp_path / 'main.py').write_text(STUB_MAIN)
+    (tmp_path / 'paddleocr.py').write_text(STUB_PADDLEOCR)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+def run_files(pool: OCR_Worker_Pool, files: list[str], timeout=60.0) -> list[File_Outcome]:
+    """
+    One file at a time, so which worker gets what doesn't change from run to run
+    """
+
+    outcomes: list[File_Outcome] = []
+    deadline = time.time() + timeout
+
+    for index, file_path in enumerate(files):
+        while pool.idle_count == 0:
+            assert time.time() < deadline, 'No worker ever got ready'
+            outcomes += pool.poll(timeout=0.1)
+
+        pool.dispatch(file_path, index)
+        while len(outcomes) <= index:
+            assert time.time() < deadline, f'{file_path} never came back'
+            outcomes += pool.poll(timeout=0.1)
+
+    return outcomes
+
+
+def test_worker_recycled_after_max_files(stubbed):
+    pool = OCR_Worker_Pool(1, max_files_per_worker=2)
+    pool.start()
+    try:
+        outcomes = run_files(pool, ['a.pdf', 'b.pdf', 'c.pdf'])
+    finally:
+        pool.shutdown()
+
+    assert [o['result'] for o in outcomes] == ['a.pdf', 'b.pdf', 'c.pdf']
+    assert pool.workers_retired == 1
+
+def test_worker_recycled_after_max_memory(stubbed):
+    # Workers start out around where this process is, and leave room to spare
+    limit_mib = psutil.Process().memory_info().rss / 1024**2 + 100
+
+    pool = OCR_Worker_Pool(1, max_worker_memory_mib=limit_mib)
+    pool.start()
+    try:
+        small = run_files(pool, ['a.pdf'])
+        retired_after_small = pool.workers_retired
+        big = run_files(pool, ['big.pdf'])
+        retired_after_big = pool.workers_retired
+    finally:
+        pool.shutdown()
+
+    assert [o['error'] for o in small + big] == [None, None]
+    assert retired_after_small == 0
+    assert retired_after_big == 1
+
+def test_file_failed_when_worker_killed(stubbed):
+    pool = OCR_Worker_Pool(1)
+    pool.start()
+    try:
+        outcomes = run_files(pool, ['a.pdf', 'killer.pdf', 'c.pdf'])
+    finally:
+        pool.shutdown()
+
+    assert outcomes[0]['result'] == 'a.pdf'
+    assert outcomes[1]['file_path'] == 'killer.pdf'
+    assert outcomes[1]['result'] == None
+    assert 'died' in str(outcomes[1]['error'])
+    # Its replacement picks up from there
+    assert outcomes[2]['result'] == 'c.pdf'
+
+def test_workers_that_never_start_give_up(stubbed, monkeypatch):
+    monkeypatch.setenv('STUB_OCR_FAILS', 'yes')
+
+    pool = OCR_Worker_Pool(1, max_failed_starts=2)
+    pool.start()
+    try:
+        deadline = time.time() + 60
+        with pytest.raises(Exception, match='keep dying'):
+            while time.time() < deadline:
+                pool.poll(timeout=0.1)
+    finally:
+        pool.shutdown()
+
+    assert pool._failed_starts == 2
@@ -0,0 +1,62 @@
+"""
+The log prefilter on made up BBS 137 style pages. Thin table lines and
+crooked scans used to make it throw real logs out
+"""
+
+from math import cos, radians, sin
+import fitz
+import pytest
+from find_logs.prefilter import score_page_for_log
+
+LETTER = (612, 792)
+
+
+def table_page(line_pixels: float, skew_degrees: float) -> fitz.Page:
+    """
+    10 table verticals covering 68% of the page height, `line_pixels` wide at
+    300 DPI, everything turned by `skew_degrees`
+    """
+
+    document = fitz.open()
+    page = document.new_page(width=LETTER[0], height=LETTER[1])
+
+    cx, cy = LETTER[0] / 2, LETTER[1] / 2
+    angle = radians(skew_degrees)
+
+    def turn(x: float, y: float) -> fitz.Point:
+        dx, dy = x - cx, y - cy
+        return fitz.Point(cx + dx * cos(angle) - dy * sin(angle), cy + dx * sin(angle) + dy * cos(angle))
+
+    top = LETTER[1] * 0.2
+    bottom = top + LETTER[1] * 0.68
+    width = line_pixels * 72 / 300
+    for index in range(10):
+        x = 40 + index * 58
+        page.draw_line(turn(x, top), turn(x, bottom), width=width)
+    page.draw_line(turn(40, top), turn(40 + 9 * 58, top), width=width)
+    page.draw_line(turn(40, bottom), turn(40 + 9 * 58, bottom), width=width)
+
+    # Keeps the document from getting garbage collected out from under the page
+    page.__dict__['_test_document'] = document
+    return page
+
+def text_page() -> fitz.Page:
+    document = fitz.open()
+    page = document.new_page(width=LETTER[0], height=LETTER[1])
+    for line in range(45):
+        page.insert_text((50, 60 + line * 15), 'Dear sir, please find enclosed the plans for the bridge 123', fontsize=11)
+    page.__dict__['_test_document'] = document
+    return page
+
+
+@pytest.mark.parametrize('line_pixels', [1, 2, 3, 4, 6])
+@pytest.mark.parametrize('skew_degrees', [0.0, 0.5, -0.8, 1.0, -1.5])
+def test_keeps_tables(line_pixels, skew_degrees):
+    assert score_page_for_log(table_page(line_pixels, skew_degrees)) == 1.0
+
+def test_throws_out_letters():
+    assert score_page_for_log(text_page()) < 0.4
+
+def test_throws_out_blank_pages():
+    document = fitz.open()
+    assert score_page_for_log(document.new_page()) == 0.0
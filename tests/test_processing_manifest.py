@@ -0,0 +1,138 @@
+"""
+Incremental mode against a folder that changes between runs. Only the new and
+changed PDFs should get done again, and whatever the deleted and replaced ones
+produced gets dropped. Also a folder with two copies of the same PDF, a PDF
+that gets deleted while the program dies before its rows are dropped, and that
+runs don't read PDFs they already know the hash of
+"""
+
+import os
+import manage_outputs.processing_manifest as processing_manifest
+from manage_outputs.processing_manifest import Processing_Manifest
+
+
+def write(path, contents: bytes) -> str:
+    with open(path, 'wb') as f:
+        f.write(contents)
+    return str(path)
+
+def first_run(tmp_path) -> tuple[str, list[str]]:
+    location = str(tmp_path / 'manifest.sqlite')
+    folder = tmp_path / 'pdfs'
+    folder.mkdir()
+    paths = [write(folder / 'a.pdf', b'a'), write(folder / 'copy of a.pdf', b'a'), write(folder / 'c.pdf', b'c')]
+
+    manifest = Processing_Manifest(location)
+    manifest.start_run('h.csv', 'b.csv', 'l.csv', incremental=True)
+    needs_registering, _ = manifest.reconcile_folder(paths)
+    for path in manifest.register_files(needs_registering):
+        manifest.mark_started(path)
+        manifest.mark_done(path, 1.0, 1, 1, 1)
+    manifest.close()
+
+    return location, paths
+
+def reopen(location: str) -> Processing_Manifest:
+    manifest = Processing_Manifest(location)
+    run = manifest.find_incremental_run()
+    assert run != None
+    manifest.resume_run(run['run_id'])
+    return manifest
+
+
+def test_only_new_and_changed_files_get_done(tmp_path, monkeypatch):
+    location = str(tmp_path / 'manifest.sqlite')
+    folder = tmp_path / 'pdfs'
+    folder.mkdir()
+    a, b, c = write(folder / 'a.pdf', b'a'), write(folder / 'b.pdf', b'b'), write(folder / 'c.pdf', b'c')
+
+    manifest = Processing_Manifest(location)
+    manifest.start_run('h.csv', 'b.csv', 'l.csv', incremental=True)
+    needs_registering, dropped = manifest.reconcile_folder([a, b, c])
+    assert dropped == set()
+    for path in manifest.register_files(needs_registering):
+        manifest.mark_started(path)
+        manifest.mark_done(path, 1.0, 1, 1, 1)
+    index_of = manifest.find_file_indexes()
+    manifest.close()
+
+    os.remove(c)
+    write(b, b'b, but longer')
+    d = write(folder / 'd.pdf', b'd')
+
+    hashed: list[str] = []
+    real_hash = processing_manifest.find_content_hash
+    monkeypatch.setattr(processing_manifest, 'find_content_hash', lambda p: hashed.append(p) or real_hash(p))
+
+    manifest = reopen(location)
+    needs_registering, dropped = manifest.reconcile_folder([a, b, d])
+
+    # a didn't change, so it doesn't even get read
+    assert sorted(hashed) == [b, d]
+    assert sorted(needs_registering) == [b, d]
+    assert dropped == {index_of[b], index_of[c]}
+    assert sorted(manifest.register_files(needs_registering)) == [b, d]
+    manifest.close()
+
+def test_copies_settle(tmp_path, monkeypatch):
+    location, paths = first_run(tmp_path)
+
+    hashed: list[str] = []
+    real_hash = processing_manifest.find_content_hash
+    monkeypatch.setattr(processing_manifest, 'find_content_hash', lambda p: hashed.append(p) or real_hash(p))
+
+    for _ in range(3):
+        manifest = reopen(location)
+        needs_registering, dropped = manifest.reconcile_folder(paths)
+        assert manifest.register_files(needs_registering) == []
+        assert dropped == set()
+        manifest.close()
+
+    assert hashed == []
+
+def test_drops_survive_a_crash(tmp_path):
+    location, paths = first_run(tmp_path)
+    os.remove(paths[2])
+    paths = paths[:2]
+
+    manifest = reopen(location)
+    _, dropped = manifest.reconcile_folder(paths)
+    assert len(dropped) == 1
+    # Dies before the rows come out of the outputs
+    manifest.close()
+
+    manifest = reopen(location)
+    _, dropped_again = manifest.reconcile_folder(paths)
+    assert dropped_again == dropped
+    manifest.forget_dropped()
+    manifest.close()
+
+    manifest = reopen(location)
+    _, dropped = manifest.reconcile_folder(paths)
+    assert dropped == set()
+    manifest.close()
+
+def test_new_runs_only_hash_what_changed(tmp_path, monkeypatch):
+    location, paths = first_run(tmp_path)
+
+    hashed: list[str] = []
+    real_hash = processing_manifest.find_content_hash
+    monkeypatch.setattr(processing_manifest, 'find_content_hash', lambda p: hashed.append(p) or real_hash(p))
+
+    manifest = Processing_Manifest(location)
+    manifest.start_run('h2.csv', 'b2.csv', 'l2.csv')
+    hashes = manifest.find_hashes(paths)
+    assert hashed == []
+    assert hashes == {p: real_hash(p) for p in paths}
+    manifest.register_files(hashes)
+    manifest.close()
+
+    write(paths[2], b'changed')
+    manifest = Processing_Manifest(location)
+    run = manifest.find_unfinished_run()
+    assert run != None
+    manifest.resume_run(run['run_id'])
+    hashes = manifest.find_hashes(paths)
+    assert hashed == [paths[2]]
+    assert hashes[paths[2]] == real_hash(paths[2])
+    manifest.close()
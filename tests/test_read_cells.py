@@ -0,0 +1,64 @@
+"""
+Blow count cells from every side of every page in a group have to go through
+the recognizer together, and each reading has to land back on its own cell
+"""
+
+import sys
+import types
+import numpy as np
+import pytest
+
+
+class Stub_Recognizer:
+    """
+    Reads each crop as the number it's filled with
+    """
+
+    def __init__(self) -> None:
+        self.calls: list[int] = []
+
+    def __call__(self, crops: list[np.ndarray]):
+        self.calls.append(len(crops))
+        return [(str(int(c[0, 0, 0])), 0.99) for c in crops], 0.0
+
+
+@pytest.fixture
+def simple_stuff(monkeypatch):
+    # PaddleOCR is only there for type hints
+    monkeypatch.setitem(sys.modules, 'paddleocr', types.SimpleNamespace(PaddleOCR=object))
+    from detect_structure.helpers.find_BUM_info import simple_stuff
+    return simple_stuff
+
+def filled(value: int, height=30) -> np.ndarray:
+    return np.full((height, 40, 3), value, dtype=np.uint8)
+
+
+def test_every_column_in_one_call(simple_stuff):
+    recognizer = Stub_Recognizer()
+    ocr = types.SimpleNamespace(text_recognizer=recognizer, use_angle_classifier=False)
+
+    columns = [
+        {(0, 30): filled(1), (30, 60): filled(2)},
+        {(0, 30): filled(3)},
+        {(10, 40): filled(4), (40, 70): filled(5), (70, 100): filled(6)}
+    ]
+
+    readings = simple_stuff.read_cells(columns, ocr)
+
+    assert recognizer.calls == [6]
+    assert readings == [
+        {(0, 30): [('1', 0.99)], (30, 60): [('2', 0.99)]},
+        {(0, 30): [('3', 0.99)]},
+        {(10, 40): [('4', 0.99)], (40, 70): [('5', 0.99)], (70, 100): [('6', 0.99)]}
+    ]
+
+def test_empty_cells_are_not_read(simple_stuff):
+    recognizer = Stub_Recognizer()
+    ocr = types.SimpleNamespace(text_recognizer=recognizer, use_angle_classifier=False)
+
+    columns = [{(0, 30): filled(7, height=0), (30, 60): filled(8)}, {}]
+
+    readings = simple_stuff.read_cells(columns, ocr)
+
+    assert recognizer.calls == [1]
+    assert readings == [{(0, 30): None, (30, 60): [('8', 0.99)]}, {}]
@@ -0,0 +1,24 @@
+"""
+Hits shouldn't write to the database unless the entry hasn't been marked as
+used in a while
+"""
+
+from xplorer_tools.result_cache import Result_Cache
+
+
+def test_fresh_hits_do_not_write(tmp_path):
+    cache = Result_Cache(str(tmp_path / 'cache.sqlite'))
+    cache.put('lines', 'abc', 3, '1', [1, 2, 3])
+
+    changes = cache.connection.total_changes
+    assert cache.get('lines', 'abc', 3, '1') == [1, 2, 3]
+    assert cache.connection.total_changes == changes
+
+def test_stale_hits_get_marked(tmp_path):
+    cache = Result_Cache(str(tmp_path / 'cache.sqlite'))
+    cache.put('lines', 'abc', 3, '1', [1, 2, 3])
+    with cache.connection:
+        cache.connection.execute('UPDATE entries SET last_used = 0')
+
+    assert cache.get('lines', 'abc', 3, '1') == [1, 2, 3]
+    assert cache.connection.execute('SELECT last_used FROM entries').fetchone()[0] > 0
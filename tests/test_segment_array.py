@@ -0,0 +1,106 @@
+"""
+Segment_Array is supposed to give the same answers as the scalar functions in
+segment_operations, just for every row at once. These throw a pile of random
+segments (plenty of them vertical, horizontal, and crossing) at both
+"""
+
+import numpy as np
+import pytest
+from xplorer_tools.segment_array import Segment_Array
+from xplorer_tools.segment_operations import (Segment, check_point_is_on_segment, find_lines_that_intersect,
+                                              segment_project_from, segments_do_intersect)
+
+CASES = 3000
+
+
+def random_segments(rng: np.random.Generator, count: int) -> np.ndarray:
+    """
+    Int coordinates like Hough gives back, small enough that a lot of them
+    cross. A third are straight up and down and a third straight across
+    """
+
+    points = rng.integers(0, 60, size=(count, 4))
+
+    kind = rng.integers(0, 3, size=count)
+    points[kind == 1, 2] = points[kind == 1, 0]
+    points[kind == 2, 3] = points[kind == 2, 1]
+
+    # No zero length segments, the scalar functions don't handle those either
+    same = (points[:, 0] == points[:, 2]) & (points[:, 1] == points[:, 3])
+    points[same, 3] += 1
+
+    return points
+
+def to_segment(row) -> Segment:
+    return Segment({'x': row[0], 'y': row[1]}, {'x': row[2], 'y': row[3]})
+
+
+@pytest.fixture
+def pairs() -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(12)
+    return random_segments(rng, CASES), random_segments(rng, CASES)
+
+
+def test_intersects_matches_segments_do_intersect(pairs):
+    leaders, others = pairs
+
+    batched = Segment_Array(others).intersects(Segment_Array(leaders))
+    scalar = [segments_do_intersect(to_segment(l), to_segment(o)) for l, o in zip(leaders.tolist(), others.tolist())]
+
+    assert batched.tolist() == scalar
+    # Make sure the cases actually cover both answers
+    assert 0 < sum(scalar) < CASES
+
+def test_intersects_one_leader(pairs):
+    leaders, others = pairs
+    leader = to_segment(leaders[0].tolist())
+
+    batched = Segment_Array(others).intersects(leader)
+    scalar = [segments_do_intersect(leader, to_segment(o)) for o in others.tolist()]
+
+    assert batched.tolist() == scalar
+
+def test_angles_match_segment_angle(pairs):
+    _, others = pairs
+
+    batched = Segment_Array(others).angles
+    scalar = [to_segment(o).angle for o in others.tolist()]
+
+    assert batched.tolist() == pytest.approx(scalar, abs=1e-12)
+
+def test_projection_and_containment(pairs):
+    points, others = pairs
+    px = points[:, 0].astype(np.float64)
+    py = points[:, 1].astype(np.float64)
+
+    array = Segment_Array(others)
+    x, y = array.project_points(px, py)
+    contained = array.contains_projected(x, y)
+
+    for i, o in enumerate(others.tolist()):
+        segment = to_segment(o)
+        projected, _ = segment_project_from(segment, {'x': px[i], 'y': py[i]})
+
+        assert x[i] == pytest.approx(projected['x'], abs=1e-9)
+        assert y[i] == pytest.approx(projected['y'], abs=1e-9)
+        assert contained[i] == check_point_is_on_segment(segment, {'x': x[i], 'y': y[i]})
+
+def test_highest_points_match(pairs):
+    _, others = pairs
+
+    batched = Segment_Array(others).highest_points
+    for row, o in zip(batched.tolist(), others.tolist()):
+        highest = to_segment(o).highest_point
+        assert row == [highest['x'], highest['y']]
+
+def test_find_lines_that_intersect_gives_back_the_same_kind(pairs):
+    leaders, others = pairs
+    leader = to_segment(leaders[1].tolist())
+    as_list = [to_segment(o) for o in others.tolist()]
+
+    from_list = find_lines_that_intersect(leader, as_list)
+    from_array = find_lines_that_intersect(leader, Segment_Array(others))
+
+    assert isinstance(from_list, list)
+    assert isinstance(from_array, Segment_Array)
+    assert [[s.pt_1['x'], s.pt_1['y'], s.pt_2['x'], s.pt_2['y']] for s in from_list] == from_array.points.tolist()
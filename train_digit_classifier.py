@@ -0,0 +1,120 @@
+"""
+Builds the model for the digit reader the blow counts can use (see
+digit_classifier.py) out of the cells PaddleOCR already read.
+
+    1. Set DigitClassifier = collect in config.ini and run the program over a
+       good chunk of PDFs. Every cell PaddleOCR was sure about gets saved under
+       ProcessingReports/digit_classifier/samples
+    2. python train_digit_classifier.py
+    3. Set DigitClassifier = knn
+
+It holds some of the samples back and prints how the model does on those, so
+you know whether to trust it before turning it on. That's two numbers. How
+many of the plain numbers it read right, and how many of the cells that
+aren't plain numbers (/, W.O.H., 6", 50/3") it gave an answer for instead of
+leaving them for PaddleOCR. Every one of those answers is wrong, so that one
+should be 0 or really close to it.
+"""
+
+import os
+import random
+import numpy as np
+import cv2
+from detect_structure.helpers.find_BUM_info.digit_classifier import (KNN_Digit_Classifier, SAMPLES_FOLDER, MODEL_LOCATION,
+                                                                     REJECT_LABEL, MIXED_LABEL, REJECT_GLYPH,
+                                                                     split_glyphs, glyph_features)
+
+# Plenty for k-NN, and keeps every comparison quick
+MAX_PER_DIGIT = 1500
+
+HOLD_OUT = 0.1
+
+
+def load_samples() -> tuple[list[np.ndarray], list[str]]:
+
+    cells: list[np.ndarray] = []
+    labels: list[str] = []
+    for name in sorted(os.listdir(SAMPLES_FOLDER)):
+        if not name.endswith('.png'):
+            continue
+        cell = cv2.imread(os.path.join(SAMPLES_FOLDER, name), cv2.IMREAD_GRAYSCALE)
+        if cell is None:
+            continue
+        cells.append(cell)
+        labels.append(name.split('_')[0])
+
+    return cells, labels
+
+def main() -> None:
+
+    if not os.path.exists(SAMPLES_FOLDER):
+        print(f'No samples in {SAMPLES_FOLDER}, run with DigitClassifier = collect first')
+        return
+
+    cells, labels = load_samples()
+    print(f'{len(cells)} sample cells')
+
+    random.seed(0)
+    order = list(range(len(cells)))
+    random.shuffle(order)
+    held = set(order[:int(len(order) * HOLD_OUT)])
+
+    # Mixed cells can't be trained on at all, so all of them get checked
+    held |= {i for i, l in enumerate(labels) if l == MIXED_LABEL}
+
+    # Only cells that split into exactly as many glyphs as their label has
+    # digits can be trusted to line up glyph for digit. Every glyph in a
+    # reject cell is a reject
+    glyphs: list[np.ndarray] = []
+    glyph_labels: list[int] = []
+    per_class = [0] * (REJECT_GLYPH + 1)
+    skipped = 0
+    for index in order:
+        if index in held:
+            continue
+        found = split_glyphs(cells[index])
+
+        if labels[index] == REJECT_LABEL:
+            classes = [REJECT_GLYPH] * len(found)
+        elif len(found) != len(labels[index]):
+            skipped += 1
+            continue
+        else:
+            classes = [int(digit) for digit in labels[index]]
+
+        for glyph, c in zip(found, classes):
+            if per_class[c] < MAX_PER_DIGIT:
+                glyphs.append(glyph)
+                glyph_labels.append(c)
+                per_class[c] += 1
+
+    print(f'{skipped} cells did not split up cleanly and were skipped')
+    print('Glyphs per digit: ' + ', '.join(f'{d}: {c}' for d, c in enumerate(per_class[:REJECT_GLYPH])))
+    print(f'Reject glyphs: {per_class[REJECT_GLYPH]}')
+
+    classifier = KNN_Digit_Classifier(glyph_features(glyphs), np.array(glyph_labels))
+
+    held_cells = [cells[i] for i in held]
+    held_labels = [labels[i] for i in held]
+    results = classifier.classify(held_cells)
+
+    numbers = [(r, l) for r, l in zip(results, held_labels) if l not in (REJECT_LABEL, MIXED_LABEL)]
+    answered = [(r, l) for r, l in numbers if r != None]
+    right = sum(r[0] == l for r, l in answered)
+    print(f'Held out {len(numbers)} plain number cells. Sure about {len(answered)} of them, '
+          f'{right} of those were right ({right / max(len(answered), 1):.1%})')
+
+    others = [(r, l) for r, l in zip(results, held_labels) if l in (REJECT_LABEL, MIXED_LABEL)]
+    wrongly_answered = sum(r != None for r, _ in others)
+    print(f'Held out {len(others)} cells that are not plain numbers. Gave an answer for {wrongly_answered} of them '
+          f'({wrongly_answered / max(len(others), 1):.1%}), all of those would be wrong')
+    if len(others) == 0:
+        print('No cells that are not plain numbers were collected, so there is no telling how often it would read '
+              'one as a number. Collect some more before using it')
+
+    classifier.save()
+    print(f'Saved to {MODEL_LOCATION}')
+
+
+if __name__ == '__main__':
+    main()
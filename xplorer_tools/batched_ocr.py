@@ -0,0 +1,110 @@
+"""
+PaddleOCR's .ocr() goes one image at a time. For every image it finds the text
+boxes, cuts them out, and reads them, and each of those steps has its own setup
+cost. That's fine for one big image, but a lot of the program hands it lots of
+small ones (a band of a description column, one blow count cell, ...).
+
+Every PaddleOCR object has its detector and recognizer sitting right there, so
+these call them directly. The boxes from any number of images get read in one
+recognizer call, and the results come back looking just like .ocr() would have
+given them, [box, (text, confidence)].
+"""
+
+import copy
+import logging
+import numpy as np
+from xplorer_tools.types import ocr_result, simple_result
+
+logger = logging.getLogger(__name__)
+
+# What .ocr() throws out by default if the PaddleOCR object doesn't say
+DEFAULT_DROP_SCORE = 0.5
+
+
+def __paddle_helpers():
+    # Importing paddleocr puts its own folder on the path, that's where these
+    # come from
+    import paddleocr
+    from tools.infer.utility import get_rotate_crop_image
+    from tools.infer.predict_system import sorted_boxes
+    return get_rotate_crop_image, sorted_boxes
+
+def detect_text(ocr_instance, image: np.ndarray, limit_side_len: int | None = None) -> list[np.ndarray]:
+    """
+    Just the boxes, top to bottom and left to right like .ocr() orders them.
+
+    The detector shrinks anything with a side longer than det_limit_side_len
+    (960 by default). Pass `limit_side_len` to use something else for just
+    this image
+    """
+
+    _, sorted_boxes = __paddle_helpers()
+
+    # The resize is always the first thing the detector does to an image
+    resize = ocr_instance.text_detector.preprocess_op[0]
+    if limit_side_len != None and hasattr(resize, 'limit_side_len'):
+        old_limit = resize.limit_side_len
+        resize.limit_side_len = limit_side_len
+        try:
+            boxes, _ = ocr_instance.text_detector(image)
+        finally:
+            resize.limit_side_len = old_limit
+    else:
+        boxes, _ = ocr_instance.text_detector(image)
+
+    if boxes is None or len(boxes) == 0:
+        return []
+
+    return sorted_boxes(boxes)
+
+def recognize(ocr_instance, crops: list[np.ndarray], cls=False) -> list[simple_result]:
+    """
+    Read every crop, all in one call. Same as .ocr(crops, det=False)[0] except
+    the angle classifier can run too
+    """
+
+    if len(crops) == 0:
+        return []
+
+    if cls and ocr_instance.use_angle_classifier:
+        crops, _, _ = ocr_instance.text_classifier(crops)
+
+    results, _ = ocr_instance.text_recognizer(crops)
+    return [(text, confidence) for text, confidence in results]
+
+def ocr_images(ocr_instance, images: list[np.ndarray], cls=False, limit_side_len: int | None = None) -> list[list[ocr_result]]:
+    """
+    .ocr(image)[0] for every image, but everything any of them found gets read
+    at once. Each image gets its own list back, empty if nothing was there
+    (where .ocr() would give None)
+    """
+
+    get_rotate_crop_image, _ = __paddle_helpers()
+    drop_score = getattr(ocr_instance, 'drop_score', DEFAULT_DROP_SCORE)
+
+    all_boxes: list[list[np.ndarray]] = []
+    crops: list[np.ndarray] = []
+    for image in images:
+        if image.shape[0] == 0 or image.shape[1] == 0:
+            all_boxes.append([])
+            continue
+
+        boxes = detect_text(ocr_instance, image, limit_side_len=limit_side_len)
+        all_boxes.append(boxes)
+        crops.extend(get_rotate_crop_image(image, copy.deepcopy(b)) for b in boxes)
+
+    read = recognize(ocr_instance, crops, cls=cls)
+    logger.debug(f'Read {len(read)} boxes from {len(images)} images in one batch')
+
+    ret: list[list[ocr_result]] = []
+    position = 0
+    for boxes in all_boxes:
+        found: list[ocr_result] = []
+        for box in boxes:
+            text, confidence = read[position]
+            position += 1
+            if confidence >= drop_score:
+                found.append((box.tolist(), (text, confidence)))
+        ret.append(found)
+
+    return ret
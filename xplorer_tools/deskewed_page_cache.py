@@ -0,0 +1,123 @@
+"""
+Keeps the straightened gray and color images of log pages on disk between runs.
+Rendering a page at 300 DPI and figuring out how crooked it is takes a good
+chunk of the time spent on every page, and none of it changes when all that's
+being worked on is the descriptions or blow counts. With this on, the second
+run on the same PDFs picks up right where the straightening left off.
+
+Entries are keyed by the PDF's content hash, the page, the DPI, and a tag for
+how the page got straightened (deskew method and so on), and go in
+ProcessingReports/deskewed_pages/<hash>/. There are two ways to store them
+
+'npy'
+    Plain .npy files. Big (about 30 MB a page), but they get memory-mapped
+    when loaded so only the parts of the page that get looked at are read.
+
+'npz'
+    Compressed. Scanned pages squash down a lot, but the whole thing has to be
+    read and unpacked every time. Compressed files can't be memory-mapped.
+
+Every entry also has a little .json with how far the page got turned and how
+big it was before, since the text layer blocks need both to line up.
+"""
+
+import json
+import logging
+import os
+from typing import Literal, TypedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_FOLDER = './ProcessingReports/deskewed_pages'
+
+Page_Cache_Format = Literal['npy', 'npz']
+
+
+class Deskewed_Page(TypedDict):
+    gray: np.ndarray
+    color: np.ndarray
+    rotate_by: float
+    # Size of the page before it got straightened
+    width: int
+    height: int
+
+
+class Deskewed_Page_Cache:
+
+    def __init__(self, content_hash: str, store_as: Page_Cache_Format='npy', folder=CACHE_FOLDER) -> None:
+        self.folder = os.path.join(folder, content_hash)
+        self.store_as = store_as
+        self.hits = 0
+        self.misses = 0
+
+    def _base_name(self, page_num: int, dpi: int, tag: str) -> str:
+        # The tag has things like '0.05' in it, keep it file name friendly
+        safe_tag = ''.join(c if c.isalnum() or c in '-_' else '_' for c in tag)
+        return os.path.join(self.folder, f'p{page_num}_{dpi}dpi_{safe_tag}')
+
+    def get(self, page_num: int, dpi: int, tag: str) -> Deskewed_Page | None:
+
+        base = self._base_name(page_num, dpi, tag)
+
+        # The .json gets written last, so if it's there everything else is too
+        if not os.path.exists(base + '.json'):
+            self.misses += 1
+            return None
+
+        try:
+            with open(base + '.json') as file:
+                info = json.load(file)
+
+            if info['store_as'] == 'npz':
+                with np.load(base + '.npz') as arrays:
+                    gray = arrays['gray']
+                    color = arrays['color']
+            else:
+                # Copy on write, so anything downstream that draws on the page
+                # doesn't write back into the file
+                gray = np.load(base + '_gray.npy', mmap_mode='c')
+                color = np.load(base + '_color.npy', mmap_mode='c')
+
+        except (OSError, ValueError, KeyError):
+            logger.warning(f'Cached page {page_num} could not be read, making it again')
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return {
+            'gray': gray,
+            'color': color,
+            'rotate_by': info['rotate_by'],
+            'width': info['width'],
+            'height': info['height']
+        }
+
+    def put(self, page_num: int, dpi: int, tag: str, page: Deskewed_Page) -> None:
+
+        os.makedirs(self.folder, exist_ok=True)
+        base = self._base_name(page_num, dpi, tag)
+
+        # Everything gets written under a temporary name and then moved into
+        # place, so another process never sees half of a file
+        temp = f'.{os.getpid()}.tmp'
+
+        if self.store_as == 'npz':
+            with open(base + '.npz' + temp, 'wb') as file:
+                np.savez_compressed(file, gray=page['gray'], color=page['color'])
+            os.replace(base + '.npz' + temp, base + '.npz')
+        else:
+            for name in ('gray', 'color'):
+                with open(f'{base}_{name}.npy{temp}', 'wb') as file:
+                    np.save(file, page[name])
+                os.replace(f'{base}_{name}.npy{temp}', f'{base}_{name}.npy')
+
+        info = {
+            'store_as': self.store_as,
+            'rotate_by': page['rotate_by'],
+            'width': page['width'],
+            'height': page['height']
+        }
+        with open(base + '.json' + temp, 'w') as file:
+            json.dump(info, file)
+        os.replace(base + '.json' + temp, base + '.json')
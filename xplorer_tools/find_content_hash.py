@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+
+def find_content_hash(file_path: str, chunk_size=1024*1024) -> str:
+    """
+    SHA-256 of everything in the file. Paths change when people reorganize
+    folders, the bytes inside don't.
+    """
+
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+# (path, size, modified time) -> hash, so asking about the same file over and
+# over (once a page) doesn't read it over and over
+_known_hashes: dict[tuple[str, int, float], str] = {}
+
+def find_content_hash_cached(file_path: str) -> str:
+    """
+    Same as find_content_hash, but only reads the file again if it looks like
+    it changed since last time
+    """
+
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime)
+
+    if key not in _known_hashes:
+        _known_hashes[key] = find_content_hash(file_path)
+
+    return _known_hashes[key]
+
+def remember_content_hash(file_path: str, content_hash: str) -> None:
+    """
+    For when the hash is already known from somewhere else (the manifest), so
+    find_content_hash_cached doesn't have to read the file to find it
+    """
+
+    stat = os.stat(file_path)
+    _known_hashes[(os.path.abspath(file_path), stat.st_size, stat.st_mtime)] = content_hash
+
+def known_content_hash(file_path: str) -> str | None:
+    """
+    The hash find_content_hash_cached would give back, or None if it would have
+    to read the file to come up with it
+    """
+
+    stat = os.stat(file_path)
+    return _known_hashes.get((os.path.abspath(file_path), stat.st_size, stat.st_mtime))
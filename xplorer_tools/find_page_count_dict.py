@@ -1,9 +1,33 @@
-def find_page_count_dict(file_paths: list[str]) -> dict[str, int]:
+from typing import TypedDict
+
+
+class Page_Info(TypedDict):
+    page_count: int
+    max_page_pixels: int
+
+
+def find_page_info_dict(file_paths: list[str], dpi=300) -> dict[str, Page_Info]:
+    """
+    How many pages each document has, and how many pixels the biggest page in
+    it will be once it gets rendered at `dpi`. Page count alone says
+    nothing about the 11x17 scans that are twice the size of everything else.
+    """
     import fitz
 
-    ret: dict[str, int] = {}
+    scale = dpi / 72
+
+    ret: dict[str, Page_Info] = {}
     for path in file_paths:
         with fitz.open(path) as pdf:
-            ret[path] = pdf.page_count
+            max_page_pixels = 0
+            for page in pdf:
+                rect = page.rect
+                pixels = int(rect.width * scale) * int(rect.height * scale)
+                max_page_pixels = max(max_page_pixels, pixels)
+
+            ret[path] = {
+                'page_count': pdf.page_count,
+                'max_page_pixels': max_page_pixels
+            }
 
-    return ret
\ No newline at end of file
+    return ret
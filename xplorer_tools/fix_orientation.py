@@ -1,8 +1,16 @@
 from math import degrees
-from xplorer_tools.guess_page_orientation import guess_page_orientation
+from typing import Literal
+from xplorer_tools.guess_page_orientation import guess_page_orientation, guess_page_orientation_from_profile
+from line_detection.helpers.find_raw_segments import Line_Backend
+import numpy as np
 from PIL import Image
 
-def fix_orientation(grayscale_image: Image.Image, color_image: Image.Image, assess_count=3) -> tuple[Image.Image, Image.Image]:
+# Turns smaller than this (degrees) aren't worth doing. Over the whole height
+# of a 300 DPI page that's only a couple pixels of lean, which the line
+# detection doesn't care about
+ROTATION_TOLERANCE = 0.05
+
+def fix_orientation(grayscale_image: Image.Image, color_image: Image.Image, assess_count=3, line_backend: Line_Backend='skimage', method: Literal['hough', 'profile']='hough') -> tuple[Image.Image, Image.Image]:
     """
     The theory is that we can correct the image first and then try to work on it
     from there. This will specifically make things like drawing boxes a lot
@@ -18,12 +26,65 @@ def fix_orientation(grayscale_image: Image.Image, color_image: Image.Image, asse
     0.5-1 degree.
     """
 
-    initial_orientation = guess_page_orientation(grayscale_image, assess_count)
+    rotate_by = find_orientation_fix(grayscale_image, assess_count, line_backend, method)
+    return apply_orientation_fix(grayscale_image, color_image, rotate_by)
+
+def find_orientation_fix(grayscale_image: Image.Image, assess_count=3, line_backend: Line_Backend='skimage', method: Literal['hough', 'profile']='hough') -> float:
+    """
+    How many degrees counter clockwise the page needs to be turned. Split out
+    from fix_orientation for when something else (text layer blocks) needs to
+    be turned the same way as the page.
+
+    `method` 'profile' uses guess_page_orientation_from_profile, which only
+    needs one pass. assess_count and line_backend don't matter for it.
+    """
+
+    if method == 'profile':
+        initial_orientation = guess_page_orientation_from_profile(grayscale_image)
+    else:
+        initial_orientation = guess_page_orientation(grayscale_image, assess_count, line_backend)
 
     # The guess_page_orientation will always return a negative value
-    rotate_by = 90.0 + degrees(initial_orientation)
+    return 90.0 + degrees(initial_orientation)
+
+def apply_orientation_fix(grayscale_image: Image.Image, color_image: Image.Image, rotate_by: float) -> tuple[Image.Image, Image.Image]:
 
     r1 = grayscale_image.rotate(rotate_by, fillcolor=255)
     r2 = color_image.rotate(rotate_by, fillcolor=(255, 255, 255))
 
-    return r1, r2
\ No newline at end of file
+    return r1, r2
+
+def straighten_page(grayscale_image: Image.Image,
+                    color_image: Image.Image,
+                    rotate_by: float,
+                    tolerance=ROTATION_TOLERANCE) -> tuple[np.ndarray, np.ndarray, float]:
+    """
+    apply_orientation_fix, but it gives back arrays and it doesn't bother for
+    tiny angles. Only the color image actually gets turned, once, and the
+    grayscale one gets made from that.
+
+    Returns the gray and color arrays and how far they really got turned (0
+    if it was skipped) so anything else that needs to line up with the page
+    (text layer blocks) can be turned the same amount.
+    """
+
+    color_array = np.array(color_image, dtype=np.uint8)
+
+    if abs(rotate_by) < tolerance:
+        return np.array(grayscale_image, dtype=np.uint8), color_array, 0.0
+
+    import cv2
+
+    height, width = color_array.shape[:2]
+
+    # Same turn PIL's rotate does. Counter clockwise about the center, nearest
+    # pixel, white where there used to be nothing
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rotate_by, 1.0)
+    color_array = cv2.warpAffine(color_array, matrix, (width, height),
+                                 flags=cv2.INTER_NEAREST,
+                                 borderMode=cv2.BORDER_CONSTANT,
+                                 borderValue=(255, 255, 255))
+
+    gray_array = cv2.cvtColor(color_array, cv2.COLOR_RGB2GRAY)
+
+    return gray_array, color_array, rotate_by
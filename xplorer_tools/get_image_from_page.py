@@ -1,20 +1,38 @@
 from PIL import Image
 import fitz
 
-def get_image_from_page(file_path: str, page_num=0, dpi=300) -> tuple[Image.Image, Image.Image]:
-    
-    gray_pixmap: fitz.Pixmap
-    colo_pixmap: fitz.Pixmap
-    with fitz.open(file_path) as pdf:
-        page = pdf.load_page(page_num)
-        gray_pixmap = page.get_pixmap(dpi=dpi, colorspace='GRAY')
-        colo_pixmap = page.get_pixmap(dpi=dpi)
-        
-    gray_image = Image.frombytes('L', size=(gray_pixmap.width, gray_pixmap.height), data=gray_pixmap.samples)
-    colo_image = Image.frombytes('RGB', size=(colo_pixmap.width, colo_pixmap.height), data=colo_pixmap.samples)
+def get_image_from_page(source: str | fitz.Document, page_num=0, dpi=300, raster_cache=None) -> tuple[Image.Image, Image.Image]:
+    """
+    Rasterize a page and give back (grayscale, color) images of it.
+
+    The page only gets rendered once, in color. The grayscale version gets
+    converted straight from that pixmap by MuPDF instead of rendering the whole
+    page a second time.
+
+    `source` can be a path, but if you're going to look at more than one page
+    in the same PDF pass in the open document so it isn't reopened every time.
+    If there's a Page_Raster_Cache for the document, the render comes from
+    there (and gets taken out of it, this is the last time it's needed).
+    """
+
+    if isinstance(source, str):
+        with fitz.open(source) as pdf:
+            return get_image_from_page(pdf, page_num, dpi)
+
+    if raster_cache != None:
+        colo_pixmap = raster_cache.take_pixmap(source, page_num, dpi)
+    else:
+        colo_pixmap = source.load_page(page_num).get_pixmap(dpi=dpi)
+    gray_pixmap = fitz.Pixmap(fitz.csGRAY, colo_pixmap)
+
+    # samples_mv is a view into the pixmap, samples would make a copy first
+    gray_image = Image.frombytes('L', size=(gray_pixmap.width, gray_pixmap.height), data=gray_pixmap.samples_mv)
+    colo_image = Image.frombytes('RGB', size=(colo_pixmap.width, colo_pixmap.height), data=colo_pixmap.samples_mv)
+    gray_pixmap = None
+    colo_pixmap = None
 
     if gray_image.width > gray_image.height:
         gray_image = gray_image.crop((0, 0, 2500, gray_image.height))
         colo_image = colo_image.crop((0, 0, 2500, colo_image.height))
 
-    return gray_image, colo_image
\ No newline at end of file
+    return gray_image, colo_image
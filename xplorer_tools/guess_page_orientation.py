@@ -1,12 +1,12 @@
-from skimage.transform import probabilistic_hough_line
 from line_detection.helpers.create_segments import create_segments
+from line_detection.helpers.find_raw_segments import Line_Backend, find_raw_segments
 from xplorer_tools.segment_operations import zero_segment
 from xplorer_tools.vector_operations import vector_flip
 from math import atan2
 import numpy as np
 from PIL import Image
 
-def guess_page_orientation(grayscale_image: Image.Image, assess_count=1) -> float:
+def guess_page_orientation(grayscale_image: Image.Image, assess_count=1, line_backend: Line_Backend='skimage') -> float:
     """
     Guess the orientation of the page by getting long vertical lines running
     around vertical and average their slope.
@@ -17,6 +17,10 @@ def guess_page_orientation(grayscale_image: Image.Image, assess_count=1) -> floa
     has lines running up and down it.
 
     Theory for this comes from: https://www.themathdoctors.org/averaging-angles/
+
+    Only skimage's hough is random, so the other backends just run once no
+    matter what assess_count is. Running them again would find the same lines.
+    Don't use 'morphology' here, the page hasn't been straightened yet.
     """
 
     grayscale_array = np.array(grayscale_image, dtype=np.uint8)
@@ -27,8 +31,11 @@ def guess_page_orientation(grayscale_image: Image.Image, assess_count=1) -> floa
 
     raw_segments: list[tuple[tuple[float, float], tuple[float, float]]] = []
     
+    if line_backend != 'skimage':
+        assess_count = 1
+
     for _ in range(assess_count):
-        t: list[tuple[tuple[float, float], tuple[float, float]]] = probabilistic_hough_line(grayscale_array, line_length=1500, theta=verticals)
+        t: list[tuple[tuple[float, float], tuple[float, float]]] = find_raw_segments(grayscale_array, verticals, 1500, 10, backend=line_backend)
         raw_segments = t + raw_segments
     
     segments = create_segments(raw_segments)
@@ -48,3 +55,70 @@ def guess_page_orientation(grayscale_image: Image.Image, assess_count=1) -> floa
     guess = atan2(sines, cosines)
 
     return guess
+
+# Angles (radians) to try for guess_page_orientation_from_profile. A coarse
+# sweep over the same range the Hough scan covers, then a fine one around the
+# best coarse angle
+COARSE_SWEEP = np.radians(np.arange(-22.5, 22.5 + 0.25, 0.5))
+FINE_SWEEP = np.radians(np.arange(-0.5, 0.5 + 0.01, 0.02))
+
+PROFILE_SHRINK = 2
+PROFILE_MAX_POINTS = 200_000
+PROFILE_DARK_VALUE = 128
+
+def guess_page_orientation_from_profile(grayscale_image: Image.Image) -> float:
+    """
+    Same answer as guess_page_orientation (angle of the page's vertical lines,
+    -pi/2 when they're straight up and down) but without Hough, and it comes
+    out the same every time so there's nothing to average.
+
+    Lean every dark pixel over by some angle and count how many land in each
+    column. At the angle the table's lines actually run, all of a line's pixels
+    pile up in the same column or two and the counts get really spiky. So try
+    a bunch of angles and keep the spikiest. Always tries the same number of
+    angles on at most PROFILE_MAX_POINTS pixels, so it can't run away on a
+    weird page.
+
+    The grayscale image should NOT be inverted!
+    """
+
+    grayscale_array = np.array(grayscale_image, dtype=np.uint8)
+
+    # Shrink by taking the darkest pixel in each block so thin lines survive
+    height, width = grayscale_array.shape
+    height -= height % PROFILE_SHRINK
+    width -= width % PROFILE_SHRINK
+    small = grayscale_array[:height, :width].reshape(height // PROFILE_SHRINK, PROFILE_SHRINK,
+                                                     width // PROFILE_SHRINK, PROFILE_SHRINK).min(axis=(1, 3))
+
+    # Only pixels with ink right below them too. Gets rid of a lot of the text's
+    # sideways strokes without hurting the vertical lines
+    dark = small < PROFILE_DARK_VALUE
+    dark[:-1] &= dark[1:]
+    dark[-1] = False
+
+    ys, xs = np.nonzero(dark)
+    if len(ys) == 0:
+        return -np.pi / 2
+
+    if len(ys) > PROFILE_MAX_POINTS:
+        step = -(-len(ys) // PROFILE_MAX_POINTS)
+        ys = ys[::step]
+        xs = xs[::step]
+
+    ys = ys.astype(np.float64)
+    xs = xs.astype(np.float64)
+
+    def spikiness(angle: float) -> float:
+        # Lines going down the page with x changing by tan(angle) every row
+        # all land in the same column after this
+        columns = np.round(xs - ys * np.tan(angle)).astype(np.int64)
+        counts = np.bincount(columns - columns.min())
+        return float(np.dot(counts, counts))
+
+    best = max(COARSE_SWEEP, key=spikiness)
+    best = max(best + FINE_SWEEP, key=spikiness)
+
+    # A line going down and to the right by `best` points up and to the left,
+    # and that's the way guess_page_orientation measures it
+    return -np.pi / 2 - float(best)
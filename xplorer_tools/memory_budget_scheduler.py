@@ -0,0 +1,207 @@
+"""
+This replaces the old "batch of cookies" approach. Instead of chopping the
+documents into batches ahead of time and letting cores sit around at the end of
+every batch, files get handed out one at a time whenever a worker frees up AND
+the file's estimated memory footprint fits in what is left of the budget.
+
+The estimate for a file comes from two places
+  1) If we've seen the file before, how much memory it actually took last time
+  2) Otherwise, a guess based on its page count and how many pixels its biggest
+     page is. The bytes-per-pixel number used for that guess gets nudged towards
+     reality every time a file finishes
+
+Both get saved to a little JSON profile so the next run starts out smarter.
+
+Workers don't stay the size they started at. PaddleOCR holds onto more and more
+the longer a worker runs, right up until it gets recycled, so each worker counts
+as however big it was the last time it reported in (but never more than the
+size it gets recycled at).
+"""
+
+import json
+import logging
+import os
+from typing import TypedDict
+from xplorer_tools.find_page_count_dict import Page_Info
+
+logger = logging.getLogger(__name__)
+
+PROFILE_LOCATION = './ProcessingReports/memory_profile.json'
+
+MIB = 1024 ** 2
+GIB = 1024 ** 3
+
+# Never looked at a file? These are what I saw on my machine. They get replaced
+# as soon as there is something better to go off of
+DEFAULT_WORKER_BASE_BYTES = 900 * MIB
+DEFAULT_FILE_OVERHEAD_BYTES = 250 * MIB
+DEFAULT_BYTES_PER_PIXEL = 14.0
+
+# look_at_file only holds onto the pages for the page group it's working on, so
+# past a certain point more pages doesn't mean more memory
+MAX_PAGES_HELD = 8
+
+# How hard each new measurement pulls on the learned numbers
+LEARNING_RATE = 0.2
+
+
+class File_Profile(TypedDict):
+    peak_bytes: int
+    page_count: int
+    max_page_pixels: int
+
+
+class Memory_Profile(TypedDict):
+    worker_base_bytes: int
+    bytes_per_pixel: float
+    files: dict[str, File_Profile]
+
+
+class Memory_Budget_Scheduler:
+
+    def __init__(self,
+                 budget_gib: float,
+                 core_count: int,
+                 page_info: dict[str, Page_Info],
+                 profile_location=PROFILE_LOCATION,
+                 max_worker_mib: float | None = None) -> None:
+
+        self.budget_bytes = int(budget_gib * GIB)
+        # Workers get recycled once they're bigger than this, see OCR_Worker_Pool
+        self.max_worker_bytes = int(max_worker_mib * MIB) if max_worker_mib != None else None
+        self.core_count = max(1, core_count)
+        self.page_info = page_info
+        self.profile_location = profile_location
+        self.profile = self._load_profile()
+
+        # Files currently running and what we guessed they would use
+        self.running: dict[str, int] = {}
+
+    def _load_profile(self) -> Memory_Profile:
+
+        if os.path.exists(self.profile_location):
+            try:
+                with open(self.profile_location, 'r') as f:
+                    logger.debug('Reading memory profile')
+                    return json.load(f)
+            except (json.JSONDecodeError, OSError):
+                logger.warning('Memory profile could not be read, starting over')
+
+        return {
+            'worker_base_bytes': DEFAULT_WORKER_BASE_BYTES,
+            'bytes_per_pixel': DEFAULT_BYTES_PER_PIXEL,
+            'files': {}
+        }
+
+    def save_profile(self) -> None:
+        os.makedirs(os.path.dirname(self.profile_location), exist_ok=True)
+        with open(self.profile_location, 'w') as f:
+            json.dump(self.profile, f)
+
+    def _pixel_load(self, file_path: str) -> int:
+        info = self.page_info.get(file_path, {'page_count': 1, 'max_page_pixels': 0})
+        return info['max_page_pixels'] * min(info['page_count'], MAX_PAGES_HELD)
+
+    def estimate(self, file_path: str) -> int:
+        """
+        How many bytes on top of an idle worker we think this file will need
+        """
+
+        known = self.profile['files'].get(file_path)
+        info = self.page_info.get(file_path)
+        if known != None and (info == None or known['page_count'] == info['page_count']):
+            return known['peak_bytes']
+
+        return int(DEFAULT_FILE_OVERHEAD_BYTES + self.profile['bytes_per_pixel'] * self._pixel_load(file_path))
+
+    def find_worker_count(self) -> int:
+        """
+        No point starting more workers than the budget could ever keep busy.
+        Each idle worker is sitting on its OCR models, and those aren't free
+        """
+
+        base = self.profile['worker_base_bytes']
+        if len(self.page_info) > 0:
+            typical = sorted(self.estimate(p) for p in self.page_info)[len(self.page_info) // 2]
+        else:
+            typical = DEFAULT_FILE_OVERHEAD_BYTES
+
+        fits = self.budget_bytes // (base + typical)
+
+        return int(max(1, min(self.core_count, fits, max(len(self.page_info), 1))))
+
+    def worker_bytes(self, rss: int | None) -> int:
+        """
+        What one worker counts for. Its last reported size, or the usual base
+        size when it hasn't reported one yet
+        """
+
+        if rss == None:
+            return self.profile['worker_base_bytes']
+
+        if self.max_worker_bytes != None:
+            return min(rss, self.max_worker_bytes)
+        return rss
+
+    def committed_bytes(self, worker_memory: list[int | None]) -> int:
+        """
+        `worker_memory` has each worker's last reported resident memory (see
+        OCR_Worker_Pool.worker_memory)
+        """
+        return sum(self.worker_bytes(rss) for rss in worker_memory) + sum(self.running.values())
+
+    def pick_next(self, waiting: list[str], worker_memory: list[int | None]) -> str | None:
+        """
+        Take the biggest waiting file that fits in what's left of the budget.
+        When nothing is running, the biggest file goes no matter what. It has to
+        be done at some point and alone is the best shot it's got.
+        """
+
+        if len(waiting) == 0:
+            return None
+
+        remaining = self.budget_bytes - self.committed_bytes(worker_memory)
+
+        best: str | None = None
+        best_estimate = -1
+        for file_path in waiting:
+            e = self.estimate(file_path)
+            if (e <= remaining or len(self.running) == 0) and e > best_estimate:
+                best = file_path
+                best_estimate = e
+
+        return best
+
+    def mark_started(self, file_path: str) -> None:
+        self.running[file_path] = self.estimate(file_path)
+
+    def mark_finished(self, file_path: str, peak_bytes: int | None) -> None:
+        """
+        Free up the file's share of the budget and learn from how much it
+        really used. `peak_bytes` is None when the worker never got to report it
+        """
+
+        guess = self.running.pop(file_path, None)
+
+        if peak_bytes == None or peak_bytes <= 0:
+            return
+
+        info = self.page_info.get(file_path, {'page_count': 1, 'max_page_pixels': 0})
+        self.profile['files'][file_path] = {
+            'peak_bytes': int(peak_bytes),
+            'page_count': info['page_count'],
+            'max_page_pixels': info['max_page_pixels']
+        }
+
+        pixel_load = self._pixel_load(file_path)
+        if pixel_load > 0:
+            measured = max(peak_bytes - DEFAULT_FILE_OVERHEAD_BYTES, 0) / pixel_load
+            old = self.profile['bytes_per_pixel']
+            self.profile['bytes_per_pixel'] = old + LEARNING_RATE * (measured - old)
+
+        if guess != None:
+            logger.debug(f'Guessed {guess / MIB:.0f} MiB for {file_path}, it used {peak_bytes / MIB:.0f} MiB')
+
+    def record_worker_base(self, base_bytes: int) -> None:
+        old = self.profile['worker_base_bytes']
+        self.profile['worker_base_bytes'] = int(old + LEARNING_RATE * (base_bytes - old))
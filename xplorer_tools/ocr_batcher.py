@@ -0,0 +1,123 @@
+"""
+Most stages used to OCR one image, wait for it, do something with the answer,
+then OCR the next one. batched_ocr already reads everything found in a list of
+images in one recognizer call, but only when a stage has the whole list ready
+at once.
+
+This lets a stage hand images over as it comes across them and pick the
+answers up later. submit() gives back an OCR_Future right away. Nothing gets
+run until one of these happens
+
+ - `max_batch` images are waiting
+ - the oldest waiting image has been waiting longer than `max_wait` seconds
+   (checked whenever something new gets submitted)
+ - somebody asks a future for its result before it's been run
+
+and then everything waiting goes through together, so the recognizer always
+gets as much as possible at once. Everything runs on whatever thread called
+in, PaddleOCR doesn't like being used from more than one.
+
+One batcher goes with one PaddleOCR object.
+"""
+
+from __future__ import annotations
+import logging
+import time
+from typing import Any
+import numpy as np
+from xplorer_tools.types import ocr_result, simple_result
+from xplorer_tools.batched_ocr import ocr_images, recognize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH = 16
+DEFAULT_MAX_WAIT = 2.0 # seconds
+
+
+class OCR_Future:
+    """
+    What submit() gives back. result() is .ocr(image)[0] (an empty list
+    instead of None) when the image was submitted with det=True, or just the
+    (text, confidence) when it was submitted with det=False
+    """
+
+    def __init__(self, batcher: OCR_Batcher) -> None:
+        self._batcher = batcher
+        self._done = False
+        self._value: Any = None
+        self._error: BaseException | None = None
+
+    def done(self) -> bool:
+        return self._done
+
+    def result(self) -> Any:
+        if not self._done:
+            self._batcher.flush()
+
+        if self._error != None:
+            raise self._error
+        return self._value
+
+    def _finish(self, value: Any = None, error: BaseException | None = None) -> None:
+        self._value = value
+        self._error = error
+        self._done = True
+
+
+class OCR_Batcher:
+
+    def __init__(self, ocr_instance, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT) -> None:
+        self.ocr_instance = ocr_instance
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        # (det, cls) -> [(image, future)]
+        self._pending: dict[tuple[bool, bool], list[tuple[np.ndarray, OCR_Future]]] = {}
+        self._oldest: float | None = None
+
+        self.batches = 0
+        self.images = 0
+
+    def submit(self, image: np.ndarray, det=True, cls=False) -> OCR_Future:
+        future = OCR_Future(self)
+        self._pending.setdefault((det, cls), []).append((image, future))
+
+        now = time.monotonic()
+        if self._oldest == None:
+            self._oldest = now
+
+        waiting = sum(len(p) for p in self._pending.values())
+        if waiting >= self.max_batch or now - self._oldest >= self.max_wait:
+            self.flush()
+
+        return future
+
+    def flush(self) -> None:
+        """
+        Run everything that's waiting
+        """
+
+        pending = self._pending
+        self._pending = {}
+        self._oldest = None
+
+        for (det, cls), entries in pending.items():
+            images = [image for image, _ in entries]
+            try:
+                results: list[list[ocr_result]] | list[simple_result]
+                if det:
+                    results = ocr_images(self.ocr_instance, images, cls=cls)
+                else:
+                    results = recognize(self.ocr_instance, images, cls=cls)
+            except Exception as e:
+                # Everybody in the batch finds out when they ask for it
+                for _, future in entries:
+                    future._finish(error=e)
+                continue
+
+            for (_, future), value in zip(entries, results):
+                future._finish(value)
+
+            self.batches += 1
+            self.images += len(entries)
+            logger.debug(f'Ran a batch of {len(entries)} images (det={det}, cls={cls})')
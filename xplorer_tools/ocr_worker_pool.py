@@ -0,0 +1,375 @@
+"""
+PaddleOCR is expensive to get going. Importing it and building the two engines
+takes a big chunk of the time it takes to analyze a short 1-2 page PDF, and
+before this every single file paid that price all over again. On top of that,
+the old batches tore the whole process pool down after every batch and slept
+for 15 seconds to let the OS take back the memory PaddlePaddle leaks.
+
+So instead we keep a pool of long-lived workers around. Each worker builds its
+OCR engines once and then chews through files one at a time until it is told
+to stop. The "memory leak" (old tensors never get un-cached) hasn't gone
+anywhere though, so a worker retires itself once it has done a set number of
+files or once its resident memory goes past a limit. The pool notices and
+starts a fresh worker in its place. No sleeping required.
+
+Every worker gets its own task queue so the pool always knows who is working on
+what. If a worker dies in the middle of a file (the OS killing it for eating
+too much memory, for example), the file gets reported as failed and the worker
+is replaced.
+
+Workers also keep an eye on how much memory each file took at its worst, and
+send that back with the results so the scheduler can learn from it.
+"""
+
+import logging
+import multiprocessing
+import multiprocessing.queues
+import queue
+import threading
+import traceback
+from typing import Any, Callable, Literal, TypedDict
+
+logger = logging.getLogger(__name__)
+
+
+class File_Outcome(TypedDict):
+    file_path: str
+    file_index: int
+    result: Any
+    error: str | None
+    peak_bytes: int | None
+
+
+class _Worker(TypedDict):
+    process: Any
+    tasks: Any
+    state: Literal['starting', 'idle', 'busy', 'retiring']
+    current: tuple[str, int] | None
+    files_done: int
+    # Resident memory the last time it said anything. None until it's ready
+    rss: int | None
+
+
+class _Peak_RSS_Sampler:
+    """
+    Checks the process's resident memory every so often while a file is being
+    looked at. The result is how far above the starting point it got
+    """
+
+    def __init__(self, process, interval=0.25) -> None:
+        self.process = process
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.start_rss = 0
+        self.peak_rss = 0
+
+    def _total_rss(self) -> int:
+        # Page workers are children of this process, their memory counts too
+        total = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except Exception:
+                pass # It finished up between asking for it and checking on it
+        return total
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self._total_rss())
+
+    def __enter__(self):
+        self.start_rss = self._total_rss()
+        self.peak_rss = self.start_rss
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self._total_rss())
+
+    @property
+    def peak_bytes(self) -> int:
+        return self.peak_rss - self.start_rss
+
+
+def _worker_main(worker_id: int,
+                 tasks,
+                 events,
+                 max_files: int,
+                 max_memory_mib: float,
+                 file_kwargs: dict[str, Any]) -> None:
+    """
+    The loop each worker process runs. It reports back through `events` with
+    tuples whose first item says what kind of event it is.
+    """
+
+    import psutil
+    from paddleocr import PaddleOCR
+    import log_config as log_config
+    from main import look_at_file
+
+    log_config.setup(log_prefix=f'worker_{worker_id}', do_paddle=True)
+    worker_logger = logging.getLogger(__name__)
+
+    ocr_cls_false = PaddleOCR(cls=False, lang='en', ocr_version='PP-OCRv4', use_gpu=False)
+    ocr_cls_true = PaddleOCR(cls=True, lang='en', ocr_version='PP-OCRv4', use_gpu=False)
+
+    this_process = psutil.Process()
+    events.put(('ready', worker_id, this_process.memory_info().rss))
+    worker_logger.info(f'Worker {worker_id} has its OCR engines ready')
+
+    files_done = 0
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        file_path, file_index, kwargs_for_file = task
+        with _Peak_RSS_Sampler(this_process) as sampler:
+            try:
+                result = look_at_file(file_path, file_index, ocr_cls_false, ocr_cls_true, **file_kwargs, **kwargs_for_file)
+                error = None
+            except Exception:
+                result = None
+                error = traceback.format_exc()
+
+        files_done += 1
+        rss = this_process.memory_info().rss
+        retiring = files_done >= max_files or rss > max_memory_mib * 1024 * 1024
+
+        events.put(('done', worker_id, file_path, file_index, result, error, retiring, sampler.peak_bytes, rss))
+
+        if retiring:
+            break
+
+
+class OCR_Worker_Pool:
+
+    def __init__(self,
+                 worker_count: int,
+                 max_files_per_worker=40,
+                 max_worker_memory_mib=4096.0,
+                 file_kwargs: dict[str, Any] | None = None,
+                 max_failed_starts=3,
+                 on_worker_ready: Callable[[int], None] | None = None) -> None:
+
+        if worker_count < 1:
+            raise ValueError('OCR_Worker_Pool needs at least one worker')
+
+        self.worker_count = worker_count
+        self.max_files_per_worker = max_files_per_worker
+        self.max_worker_memory_mib = max_worker_memory_mib
+        self.file_kwargs = file_kwargs if file_kwargs != None else {}
+        self.max_failed_starts = max_failed_starts
+        self.on_worker_ready = on_worker_ready
+
+        self._events: multiprocessing.queues.Queue[tuple] = multiprocessing.Queue()
+        self._workers: dict[int, _Worker] = {}
+        self._next_worker_id = 0
+        self._failed_starts = 0
+        self.workers_retired = 0
+
+    def start(self) -> None:
+        for _ in range(self.worker_count):
+            self._start_worker()
+
+    def _start_worker(self) -> None:
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+
+        tasks: multiprocessing.queues.Queue[tuple[str, int, dict[str, Any]] | None] = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_worker_main,
+                                          args=(worker_id,
+                                                tasks,
+                                                self._events,
+                                                self.max_files_per_worker,
+                                                self.max_worker_memory_mib,
+                                                self.file_kwargs),
+                                          name=f'ocr_worker_{worker_id}')
+        process.start()
+
+        self._workers[worker_id] = {
+            'process': process,
+            'tasks': tasks,
+            'state': 'starting',
+            'current': None,
+            'files_done': 0,
+            'rss': None
+        }
+        logger.debug(f'Started worker {worker_id}')
+
+    @property
+    def idle_count(self) -> int:
+        return sum(1 for w in self._workers.values() if w['state'] == 'idle')
+
+    @property
+    def size(self) -> int:
+        return len(self._workers)
+
+    @property
+    def worker_memory(self) -> list[int | None]:
+        """
+        Every worker's resident memory as of the last time it reported in
+        (after it got ready or finished a file). None for the ones still
+        starting up
+        """
+        return [w['rss'] for w in self._workers.values()]
+
+    @property
+    def busy_count(self) -> int:
+        return sum(1 for w in self._workers.values() if w['state'] == 'busy')
+
+    def dispatch(self, file_path: str, file_index: int, file_kwargs: dict[str, Any] | None = None) -> int:
+        """
+        Hand a file to an idle worker. Returns the id of the worker that got it.
+        Check `idle_count` before calling this. `file_kwargs` go to look_at_file
+        along with the pool's, just for this file.
+        """
+
+        for worker_id, worker in self._workers.items():
+            if worker['state'] == 'idle':
+                worker['state'] = 'busy'
+                worker['current'] = (file_path, file_index)
+                worker['tasks'].put((file_path, file_index, file_kwargs if file_kwargs != None else {}))
+                return worker_id
+
+        raise Exception('Tried to dispatch a file with no idle workers')
+
+    def poll(self, timeout=1.0) -> list[File_Outcome]:
+        """
+        Wait up to `timeout` seconds for something to happen and return all of
+        the files that finished in the meantime. This is also where retired and
+        dead workers get replaced.
+        """
+
+        outcomes: list[File_Outcome] = []
+
+        try:
+            event = self._events.get(timeout=timeout)
+            outcome = self._handle_event(event)
+            if outcome != None:
+                outcomes.append(outcome)
+        except queue.Empty:
+            pass
+
+        outcomes += self._drain_events()
+        outcomes += self._check_for_dead_workers()
+
+        return outcomes
+
+    def _drain_events(self) -> list[File_Outcome]:
+        """
+        Handle everything that's already in the event queue without waiting
+        """
+
+        outcomes: list[File_Outcome] = []
+
+        try:
+            while True:
+                outcome = self._handle_event(self._events.get_nowait())
+                if outcome != None:
+                    outcomes.append(outcome)
+        except queue.Empty:
+            pass
+
+        return outcomes
+
+    def _handle_event(self, event: tuple) -> File_Outcome | None:
+
+        kind = event[0]
+        worker_id = event[1]
+        worker = self._workers.get(worker_id)
+
+        if worker == None:
+            logger.warning(f'Got a "{kind}" event from a worker ({worker_id}) that is not in the pool')
+            return None
+
+        if kind == 'ready':
+            worker['state'] = 'idle'
+            worker['rss'] = event[2]
+            self._failed_starts = 0
+            logger.debug(f'Worker {worker_id} is ready using {event[2] / 1024**2:.0f} MiB')
+            if self.on_worker_ready != None:
+                self.on_worker_ready(event[2])
+            return None
+
+        if kind == 'done':
+            _, _, file_path, file_index, result, error, retiring, peak_bytes, rss = event
+            worker['current'] = None
+            worker['files_done'] += 1
+            worker['rss'] = rss
+
+            if retiring:
+                logger.info(f'Recycling worker {worker_id} after {worker["files_done"]} files')
+                worker['state'] = 'retiring'
+                self._retire(worker_id)
+            else:
+                worker['state'] = 'idle'
+
+            return {
+                'file_path': file_path,
+                'file_index': file_index,
+                'result': result,
+                'error': error,
+                'peak_bytes': peak_bytes
+            }
+
+        logger.warning(f'Unknown worker event "{kind}"')
+        return None
+
+    def _retire(self, worker_id: int) -> None:
+        worker = self._workers.pop(worker_id)
+        worker['process'].join()
+        self.workers_retired += 1
+        self._start_worker()
+
+    def _check_for_dead_workers(self) -> list[File_Outcome]:
+
+        dead = [worker_id for worker_id, worker in self._workers.items() if not worker['process'].is_alive()]
+        if len(dead) == 0:
+            return []
+
+        # A worker that retires right after finishing a file puts its 'done'
+        # on the queue and exits, and that can all happen after the queue was
+        # last looked at. Those files aren't failed, so give their results a
+        # chance to come in before calling anyone dead
+        outcomes = self._drain_events()
+
+        for worker_id in dead:
+            worker = self._workers.get(worker_id)
+            if worker == None:
+                # Its 'done' just came in and it already got replaced
+                continue
+
+            logger.error(f'Worker {worker_id} died with exit code {worker["process"].exitcode}')
+            self._workers.pop(worker_id)
+
+            if worker['state'] == 'starting':
+                self._failed_starts += 1
+                if self._failed_starts >= self.max_failed_starts:
+                    raise Exception('Workers keep dying before their OCR engines are ready')
+
+            if worker['current'] != None:
+                file_path, file_index = worker['current']
+                outcomes.append({
+                    'file_path': file_path,
+                    'file_index': file_index,
+                    'result': None,
+                    'error': f'Worker died while processing (exit code {worker["process"].exitcode})',
+                    'peak_bytes': None
+                })
+
+            self._start_worker()
+
+        return outcomes
+
+    def shutdown(self) -> None:
+        for worker in self._workers.values():
+            worker['tasks'].put(None)
+
+        for worker in self._workers.values():
+            worker['process'].join()
+
+        self._workers = {}
@@ -0,0 +1,78 @@
+"""
+Holds onto the 300 DPI renders of the log pages from when they're found until
+the analysis gets to them. Only pages that turned out to be logs go in here,
+the title check renders just the top of the page on its own.
+
+It only lives as long as one document does, and it's capped at a number of
+bytes. When it's full, whatever was used longest ago gets thrown out first.
+"""
+
+import logging
+from collections import OrderedDict
+import fitz
+
+logger = logging.getLogger(__name__)
+
+
+class Page_Raster_Cache:
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._pixmaps: OrderedDict[tuple[int, int], fitz.Pixmap] = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size_of(pixmap: fitz.Pixmap) -> int:
+        return pixmap.stride * pixmap.height
+
+    def get_pixmap(self, document: fitz.Document, page_num: int, dpi=300) -> fitz.Pixmap:
+        """
+        The RGB render of the page at `dpi`. Renders it if we don't have it
+        """
+
+        key = (page_num, dpi)
+        if key in self._pixmaps:
+            self.hits += 1
+            self._pixmaps.move_to_end(key)
+            return self._pixmaps[key]
+
+        self.misses += 1
+        pixmap = document.load_page(page_num).get_pixmap(dpi=dpi)
+        self._put(key, pixmap)
+        return pixmap
+
+    def take_pixmap(self, document: fitz.Document, page_num: int, dpi=300) -> fitz.Pixmap:
+        """
+        Same as get_pixmap, except the page gets dropped from the cache. Use
+        this for the last time a page is needed
+        """
+
+        pixmap = self.get_pixmap(document, page_num, dpi)
+        self.discard(page_num, dpi)
+        return pixmap
+
+    def _put(self, key: tuple[int, int], pixmap: fitz.Pixmap) -> None:
+
+        size = self._size_of(pixmap)
+        if size > self.max_bytes:
+            # Wouldn't fit even if it was the only thing in here
+            return
+
+        self._pixmaps[key] = pixmap
+        self.current_bytes += size
+
+        while self.current_bytes > self.max_bytes:
+            old_key, old = self._pixmaps.popitem(last=False)
+            self.current_bytes -= self._size_of(old)
+            logger.debug(f'Evicted page {old_key[0]} from the raster cache')
+
+    def discard(self, page_num: int, dpi=300) -> None:
+        pixmap = self._pixmaps.pop((page_num, dpi), None)
+        if pixmap != None:
+            self.current_bytes -= self._size_of(pixmap)
+
+    def clear(self) -> None:
+        self._pixmaps.clear()
+        self.current_bytes = 0
@@ -0,0 +1,185 @@
+"""
+One place on disk for anything that's worth not working out twice (lines,
+table structures, ...). It replaces lineCache.json and structure_cache.pkl,
+which got rewritten whole on every page and were keyed by path, so workers
+running at the same time would write over each other's entries.
+
+Everything lives in a SQLite file in WAL mode, so any number of processes can
+read while one writes, and every write is just the one entry. Entries are keyed
+by
+  - a namespace (what kind of thing it is, 'lines', 'structure', ...)
+  - the hash of the PDF's contents, so moving or renaming it doesn't matter
+  - the page number
+  - a version for the code that made it. Bump it when the code changes and
+    the old entries just stop getting used (and eventually get evicted)
+
+Values are pickled. Once the whole thing gets bigger than its limit, whatever
+was used longest ago gets deleted first. Marking an entry as used is a write,
+and only one process can write at a time, so a hit only does that when the
+entry hasn't been marked in a while. Reading stays read only the rest of the
+time.
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from configparser import ConfigParser
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOCATION = './ProcessingReports/result_cache.sqlite'
+DEFAULT_MAX_MIB = 1024
+
+# Eviction needs a full scan of the sizes, don't do it on every single write
+EVICT_EVERY = 50
+
+# Other workers might be in the middle of a write
+BUSY_TIMEOUT_SECONDS = 30
+
+# A hit only updates an entry's last_used when it's older than this. Eviction
+# doesn't need to know which of two entries was used more recently when they
+# were both used within the last hour
+TOUCH_INTERVAL_SECONDS = 60 * 60
+
+
+class Result_Cache:
+
+    def __init__(self, location=CACHE_LOCATION, max_bytes=DEFAULT_MAX_MIB * 1024 * 1024) -> None:
+
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        self.location = location
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(location, timeout=BUSY_TIMEOUT_SECONDS)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+
+        self.writes_since_evict = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _create_tables(self) -> None:
+        with self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    namespace TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    version TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (namespace, content_hash, page, version)
+                )''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+
+    def get(self, namespace: str, content_hash: str, page: int, version: str) -> Any | None:
+        """
+        Whatever got put in under this key, or None if there isn't anything
+        """
+
+        key = (namespace, content_hash, page, version)
+        row = self.connection.execute('''
+            SELECT value, last_used FROM entries
+            WHERE namespace = ? AND content_hash = ? AND page = ? AND version = ?''', key).fetchone()
+
+        if row == None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        # Losing one of these to a busy database isn't a big deal, it just
+        # makes the entry look older than it is
+        now = time.time()
+        if now - row[1] >= TOUCH_INTERVAL_SECONDS:
+            try:
+                with self.connection:
+                    self.connection.execute('''
+                        UPDATE entries SET last_used = ?
+                        WHERE namespace = ? AND content_hash = ? AND page = ? AND version = ?''', (now, *key))
+            except sqlite3.OperationalError:
+                logger.debug('Could not mark cache entry as used')
+
+        try:
+            return pickle.loads(row[0])
+        except Exception:
+            logger.warning(f'Cache entry for {namespace} page {page} could not be read, ignoring it')
+            return None
+
+    def put(self, namespace: str, content_hash: str, page: int, version: str, value: Any) -> None:
+
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with self.connection:
+            self.connection.execute('''
+                INSERT OR REPLACE INTO entries (namespace, content_hash, page, version, value, size, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                (namespace, content_hash, page, version, sqlite3.Binary(blob), len(blob), time.time()))
+
+        self.writes_since_evict += 1
+        if self.writes_since_evict >= EVICT_EVERY:
+            self.evict()
+
+    def total_bytes(self) -> int:
+        return self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def evict(self) -> None:
+        """
+        Delete the least recently used entries until everything fits
+        """
+
+        self.writes_since_evict = 0
+
+        over = self.total_bytes() - self.max_bytes
+        if over <= 0:
+            return
+
+        removed = 0
+        freed = 0
+        with self.connection:
+            rows = self.connection.execute('SELECT rowid, size FROM entries ORDER BY last_used')
+            doomed: list[int] = []
+            for rowid, size in rows:
+                if freed >= over:
+                    break
+                doomed.append(rowid)
+                freed += size
+
+            self.connection.executemany('DELETE FROM entries WHERE rowid = ?', [(r,) for r in doomed])
+            removed = len(doomed)
+
+        logger.info(f'Evicted {removed} cache entries ({freed / 1024 / 1024:.1f} MiB)')
+
+    def clear(self, namespace: str | None = None) -> None:
+        with self.connection:
+            if namespace == None:
+                self.connection.execute('DELETE FROM entries')
+            else:
+                self.connection.execute('DELETE FROM entries WHERE namespace = ?', (namespace,))
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+# One per process. SQLite connections can't be shared across a fork, so a
+# worker that inherited one from its parent opens its own
+_result_cache: Result_Cache | None = None
+_result_cache_pid: int | None = None
+
+def get_result_cache() -> Result_Cache:
+
+    global _result_cache, _result_cache_pid
+
+    if _result_cache == None or _result_cache_pid != os.getpid():
+        config = ConfigParser()
+        config.read('config.ini')
+        max_mib = float(config['BEHAVIOR'].get('ResultCacheMiB', str(DEFAULT_MAX_MIB))) if config.has_section('BEHAVIOR') else DEFAULT_MAX_MIB
+
+        _result_cache = Result_Cache(max_bytes=int(max_mib * 1024 * 1024))
+        _result_cache_pid = os.getpid()
+
+    return _result_cache
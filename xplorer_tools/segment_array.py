@@ -0,0 +1,192 @@
+"""
+A whole pile of segments in one NumPy array instead of one Segment object each.
+Hough hands back thousands of segments on a noisy page and building a Segment
+(with its dicts and id) for every one of them adds up, especially when most of
+them are only going to be looked at long enough to be thrown out.
+
+Rows are (x1, y1, x2, y2). Everything here is meant to give the same answers as
+the matching function in segment_operations, just for every row at once.
+"""
+
+from __future__ import annotations
+from math import pi
+import numpy as np
+from xplorer_tools.segment_operations import Segment
+
+# Same slack check_point_is_on_segment gives
+ON_SEGMENT_SLACK = 0.005
+
+
+class Segment_Array:
+
+    def __init__(self, points: np.ndarray) -> None:
+        # Hough gives back ints. Those get left alone so that the Segments made
+        # from them have int coordinates, same as before
+        self.points = np.asarray(points).reshape(-1, 4)
+
+    @staticmethod
+    def from_raw(raw_segments) -> Segment_Array:
+        """
+        From what probabilistic_hough_line gives back, ((x1, y1), (x2, y2))
+        """
+        if len(raw_segments) == 0:
+            return Segment_Array(np.empty((0, 4)))
+        return Segment_Array(np.asarray(raw_segments).reshape(-1, 4))
+
+    @staticmethod
+    def from_segments(segments: list[Segment]) -> Segment_Array:
+        return Segment_Array(np.array([(s.pt_1['x'], s.pt_1['y'], s.pt_2['x'], s.pt_2['y']) for s in segments],
+                                      dtype=np.float64))
+
+    def to_segments(self) -> list[Segment]:
+        return [Segment({'x': r[0], 'y': r[1]}, {'x': r[2], 'y': r[3]})
+                for r in self.points.tolist()]
+
+    def __len__(self) -> int:
+        return self.points.shape[0]
+
+    def __getitem__(self, key) -> Segment_Array:
+        """
+        Index with anything NumPy would take (a mask, a list of rows, a slice)
+        """
+        return Segment_Array(self.points[key])
+
+    @property
+    def x1(self) -> np.ndarray:
+        return self.points[:, 0]
+
+    @property
+    def y1(self) -> np.ndarray:
+        return self.points[:, 1]
+
+    @property
+    def x2(self) -> np.ndarray:
+        return self.points[:, 2]
+
+    @property
+    def y2(self) -> np.ndarray:
+        return self.points[:, 3]
+
+    @property
+    def dx(self) -> np.ndarray:
+        return self.points[:, 2] - self.points[:, 0]
+
+    @property
+    def dy(self) -> np.ndarray:
+        return self.points[:, 3] - self.points[:, 1]
+
+    @property
+    def angles(self) -> np.ndarray:
+        """
+        Worked out exactly like Segment.angle (dy quirk and all) so that sorting
+        either one gives the same order
+        """
+        dx = self.dx
+        quirk_dy = self.points[:, 3] - self.points[:, 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(dx == 0, pi/2, np.arctan(quirk_dy / dx))
+
+    @property
+    def square_lengths(self) -> np.ndarray:
+        return self.dx ** 2 + self.dy ** 2
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.sqrt(self.square_lengths)
+
+    @property
+    def average_x(self) -> np.ndarray:
+        return (self.points[:, 0] + self.points[:, 2]) / 2
+
+    @property
+    def average_y(self) -> np.ndarray:
+        return (self.points[:, 1] + self.points[:, 3]) / 2
+
+    @property
+    def midpoints(self) -> np.ndarray:
+        """
+        (N, 2) of x, y
+        """
+        return np.stack((self.average_x, self.average_y), axis=1)
+
+    @property
+    def highest_points(self) -> np.ndarray:
+        """
+        (N, 2) of whichever end has the smaller y. Ties go to point 2 like
+        Segment.highest_point
+        """
+        first = self.points[:, 1] < self.points[:, 3]
+        return np.where(first[:, None], self.points[:, 0:2], self.points[:, 2:4])
+
+    def project_to_horizontal(self) -> Segment_Array:
+        average_y = self.average_y
+        return Segment_Array(np.stack((self.x1, average_y, self.x2, average_y), axis=1))
+
+    def project_to_vertical(self) -> Segment_Array:
+        average_x = self.average_x
+        return Segment_Array(np.stack((average_x, self.y1, average_x, self.y2), axis=1))
+
+    def project_points(self, px: np.ndarray | float, py: np.ndarray | float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Projection of each point onto the line through the matching segment,
+        like segment_project_from. Points broadcast against the rows, so pass
+        a (N,) for one point per segment or a (M, 1) to get (M, N) back
+        """
+        dx = self.dx
+        dy = self.dy
+        wx = px - self.x1
+        wy = py - self.y1
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (wx * dx + wy * dy) / (dx * dx + dy * dy)
+
+        return self.x1 + t * dx, self.y1 + t * dy
+
+    def contains_projected(self, px: np.ndarray | float, py: np.ndarray | float) -> np.ndarray:
+        """
+        check_point_is_on_segment for every row. Same assumption, the point
+        has to already be on the line through the segment
+        """
+        dx = self.dx
+        dy = self.dy
+        x1, y1, x2, y2 = self.x1, self.y1, self.x2, self.y2
+        s = ON_SEGMENT_SLACK
+
+        vertical = np.where(dy > 0,
+                            (py - y1 >= -s) & (y2 - py >= -s),
+                            (y1 - py >= -s) & (py - y2 >= -s))
+        other = np.where(dx > 0,
+                         (px - x1 >= -s) & (x2 - px >= -s),
+                         (x1 - px >= -s) & (px - x2 >= -s))
+
+        return np.where(dx == 0, vertical, other)
+
+    def intersects(self, leader: Segment | Segment_Array) -> np.ndarray:
+        """
+        segments_do_intersect(leader, row) for every row. `leader` can also be
+        another Segment_Array the same length, then it's row against row
+        """
+
+        if isinstance(leader, Segment):
+            leader = Segment_Array(np.array([[leader.pt_1['x'], leader.pt_1['y'], leader.pt_2['x'], leader.pt_2['y']]]))
+
+        l_vertical = leader.dx == 0
+        vertical = self.dx == 0
+        x1 = self.x1
+        l_x1 = leader.x1
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = self.dy / self.dx
+            inter = self.y1 - slope * x1
+            l_slope = leader.dy / leader.dx
+            l_inter = leader.y1 - l_slope * l_x1
+
+            parallel = (l_vertical & vertical) | (~l_vertical & ~vertical & (slope == l_slope))
+
+            # Same three cases as find_segment_intersect
+            general_x = (inter - l_inter) / (l_slope - slope)
+            x = np.where(l_vertical, l_x1, np.where(vertical, x1, general_x))
+            y = np.where(l_vertical, slope * l_x1 + inter,
+                         np.where(vertical, l_slope * x1 + l_inter, general_x * l_slope + l_inter))
+
+        return ~parallel & leader.contains_projected(x, y) & self.contains_projected(x, y)
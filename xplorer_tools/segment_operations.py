@@ -4,6 +4,9 @@ from math import atan, floor, pi, sqrt
 from xplorer_tools.types import Vector, Coordinate
 from xplorer_tools.vector_operations import vector_subtract, vector_project_from, vector_add
 from functools import cached_property
+from typing import TYPE_CHECKING, overload
+if TYPE_CHECKING:
+    from xplorer_tools.segment_array import Segment_Array
 
 class Segment:
 
@@ -329,5 +332,23 @@ def __check_valid_slope(v: Segment | Vector) -> bool:
     
     return v.pt_2['x'] - v.pt_1['x'] != 0
 
-def find_lines_that_intersect(leader: Segment, candidates: list[Segment]) -> list[Segment]:
-    return [c for c in candidates if segments_do_intersect(leader, c)]
\ No newline at end of file
+@overload
+def find_lines_that_intersect(leader: Segment, candidates: list[Segment]) -> list[Segment]: ...
+@overload
+def find_lines_that_intersect(leader: Segment, candidates: Segment_Array) -> Segment_Array: ...
+
+def find_lines_that_intersect(leader: Segment, candidates: list[Segment] | Segment_Array) -> list[Segment] | Segment_Array:
+    """
+    Gives back the same kind of thing it was handed
+    """
+    # Down here since segment_array needs Segment from this file
+    from xplorer_tools.segment_array import Segment_Array
+
+    if isinstance(candidates, Segment_Array):
+        return candidates[candidates.intersects(leader)]
+
+    if len(candidates) == 0:
+        return []
+
+    mask = Segment_Array.from_segments(candidates).intersects(leader)
+    return [c for c, keep in zip(candidates, mask) if keep]
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Remembers what each stage of the pipeline came up with (finding the log pages,
+page numbers, headers, rulers, descriptions, blow counts) so a rerun on the same
+PDFs only redoes the stages whose code changed.
+
+Every stage has a version next to its code (BLOW_COUNTS_VERSION and so on).
+An answer gets looked up by the PDF's content hash, the page, that version, and
+whatever else went into the stage. The "whatever else" includes the versions of
+the stages that came before it, since those decide what the stage was given.
+So bumping BLOW_COUNTS_VERSION makes blow counts get redone everywhere while
+descriptions and everything before them still come out of the cache, but
+bumping DESCRIPTIONS_VERSION redoes descriptions AND blow counts.
+
+The answers go in the result cache with everything else.
+"""
+
+import hashlib
+import logging
+from typing import Callable, TypeVar
+from xplorer_tools.result_cache import get_result_cache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class Stage_Memo:
+
+    def __init__(self, content_hash: str | None) -> None:
+        """
+        Pass None for `content_hash` to turn it off, everything just gets run
+        """
+        self.content_hash = content_hash
+
+    @staticmethod
+    def _key(version: str, inputs: tuple) -> str:
+        digest = hashlib.sha256(repr(inputs).encode()).hexdigest()[:16]
+        return f'{version}-{digest}'
+
+    def run(self, stage: str, version: str, page: int, inputs: tuple, compute: Callable[[], T]) -> T:
+        """
+        compute() unless there's already an answer for this stage, page,
+        version and `inputs`. `inputs` has to be made of things that repr the
+        same way every run (strings, numbers, tuples of those)
+        """
+
+        hit = self.lookup(stage, version, page, inputs)
+        if hit != None:
+            return hit[0]
+
+        value = compute()
+        self.store(stage, version, page, inputs, value)
+        return value
+
+    def lookup(self, stage: str, version: str, page: int, inputs: tuple) -> tuple | None:
+        """
+        The first half of run(), for stages that get started on a bunch of
+        pages before any of them finish. Gives back (answer,) so an answer of
+        None can be told apart from there not being one
+        """
+
+        if self.content_hash == None:
+            return None
+
+        # Stored wrapped up so that a stage that came up with None still counts
+        hit = get_result_cache().get(f'stage_{stage}', self.content_hash, page, Stage_Memo._key(version, inputs))
+        if hit != None:
+            logger.debug(f'Reusing {stage} for page {page}')
+        return hit
+
+    def store(self, stage: str, version: str, page: int, inputs: tuple, value) -> None:
+        if self.content_hash == None:
+            return
+
+        get_result_cache().put(f'stage_{stage}', self.content_hash, page, Stage_Memo._key(version, inputs), (value,))